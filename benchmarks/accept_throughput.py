@@ -0,0 +1,73 @@
+""" Measure how many connections per second the honeypot listener accepts, with and without the banner delay.
+
+Usage: python3 -m benchmarks.accept_throughput -n 200 -d 5
+"""
+import argparse
+import socket
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import honeypot
+from honeypot.objects import HoneypotSettings
+
+
+def start_server(banner: bool, delay: int, env_directory: str) -> honeypot.HoneypotServer:
+    settings = HoneypotSettings(address="127.0.0.1", port=0, banner=banner, delay=delay, env_directory=env_directory, webserver_enabled=False, connection_rate=0)
+    server = honeypot.HoneypotServer(settings)
+
+    # Only the accept path is measured, so the SSH session is replaced by a single byte.
+    def handle_client(client_socket, addr, endpoint):
+        try:
+            client_socket.send(b"\n")
+        finally:
+            client_socket.close()
+    server.handle_client = handle_client
+
+    threading.Thread(target=server.start, daemon=True, name="bench-server").start()
+    while server.server_socket is None or server.server_socket.getsockname()[1] == 0:
+        time.sleep(0.01)
+    return server
+
+
+def connect(address) -> float:
+    """ Return the seconds until the server sent its first byte. """
+    started = time.perf_counter()
+    with socket.create_connection(address, timeout=60) as client:
+        client.recv(1)
+    return time.perf_counter() - started
+
+
+def run(banner: bool, delay: int, connections: int, parallel: int) -> dict:
+    with tempfile.TemporaryDirectory() as env_directory:
+        server = start_server(banner, delay, env_directory)
+        address = server.server_socket.getsockname()
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=parallel) as executor:
+            latencies = sorted(executor.map(lambda _: connect(address), range(connections)))
+        elapsed = time.perf_counter() - started
+        server.running = False
+        server.scheduler.stop()
+        server.server_socket.close()
+
+    return {
+        "banner": banner,
+        "delay": delay if banner else 0,
+        "connections_per_second": connections / elapsed,
+        "first_byte_p50": latencies[len(latencies) // 2],
+        "first_byte_max": latencies[-1],
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--connections', type=int, default=200)
+    parser.add_argument('-c', '--parallel', type=int, default=50)
+    parser.add_argument('-d', '--delay', type=int, default=5)
+    args = parser.parse_args()
+
+    for banner in (False, True):
+        result = run(banner, args.delay, args.connections, args.parallel)
+        print(f"banner={result['banner']!s:<5} delay={result['delay']}s "
+              f"{result['connections_per_second']:8.1f} conn/s "
+              f"first byte p50={result['first_byte_p50'] * 1000:.1f}ms max={result['first_byte_max'] * 1000:.1f}ms")
@@ -0,0 +1,54 @@
+""" In-process stand-in for a paramiko.Channel, to drive the shell handler without a live SSH session. """
+import time
+
+
+class FakeChannel:
+    def __init__(self, chunks):
+        """ Feeds `chunks` to the shell one per `recv`, then reports the client as gone.
+
+        Every `recv` closes the timing of the chunk handed out before it, so `timings` holds
+        the time the shell spent on each chunk, including the sends it made for it.
+        """
+        self.__chunks = iter(chunks)
+        self.__current = None
+        self.__started = 0.0
+        # (chunk, seconds spent handling it)
+        self.timings = []
+        self.sent = []
+        self.bytes_received = 0
+        self.bytes_sent = 0
+        self.closed = False
+
+    def recv(self, size: int) -> bytes:
+        now = time.perf_counter()
+        if self.__current is not None:
+            self.timings.append((self.__current, now - self.__started))
+        chunk = next(self.__chunks, b"")
+        # A real channel never returns more than asked for, the rest arrives on the next read.
+        if len(chunk) > size:
+            self.__chunks = iter([chunk[size:], *self.__chunks])
+            chunk = chunk[:size]
+        self.__current = chunk or None
+        self.bytes_received += len(chunk)
+        self.__started = time.perf_counter()
+        return chunk
+
+    def send(self, data) -> int:
+        self.sendall(data)
+        return len(data)
+
+    def sendall(self, data):
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        self.sent.append(data)
+        self.bytes_sent += len(data)
+
+    def output(self) -> bytes:
+        return b"".join(self.sent)
+
+    def close(self):
+        # The last chunk ends when the shell closes the channel, not on another read.
+        if self.__current is not None:
+            self.timings.append((self.__current, time.perf_counter() - self.__started))
+            self.__current = None
+        self.closed = True
@@ -0,0 +1,92 @@
+""" Measure the server CPU time of one SSH handshake for each host key algorithm and key exchange.
+
+Clients run in a separate process, so the CPU time measured here is the server side only.
+
+Usage: python3 -m benchmarks.handshake_cpu -n 50
+"""
+import argparse
+import logging
+import multiprocessing
+import socket
+import tempfile
+import threading
+import time
+import paramiko
+
+# Client side host key types that select each server key.
+KEY_TYPES = {
+    "ed25519": ("ssh-ed25519",),
+    "ecdsa": ("ecdsa-sha2-nistp256",),
+    "rsa": ("rsa-sha2-512", "rsa-sha2-256", "ssh-rsa"),
+}
+
+KEX_ALGORITHMS = ("curve25519-sha256@libssh.org", "ecdh-sha2-nistp256", "diffie-hellman-group14-sha256")
+
+
+def client(address, key_types, kex, handshakes):
+    for _ in range(handshakes):
+        with socket.create_connection(address) as sock:
+            transport = paramiko.Transport(sock)
+            transport.get_security_options().key_types = key_types
+            transport.get_security_options().kex = (kex,)
+            transport.start_client(timeout=30)
+            transport.close()
+
+
+def run(algorithm: str, kex: str, handshakes: int, key_directory: str) -> dict:
+    from ssh.host_keys import HostKeyCache
+    from ssh.transport import create_transport
+
+    host_keys = HostKeyCache(key_directory=key_directory, algorithms=(algorithm,)).keys()
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.bind(("127.0.0.1", 0))
+    listener.listen(handshakes)
+    transports = []
+
+    def serve():
+        for _ in range(handshakes):
+            sock, _ = listener.accept()
+            transport = create_transport(sock, host_keys, kex_algorithms=[kex])
+            transport.start_server(server=paramiko.ServerInterface())
+            transports.append(transport)
+
+    server_thread = threading.Thread(target=serve, daemon=True)
+    server_thread.start()
+
+    process = multiprocessing.get_context("spawn").Process(target=client, args=(listener.getsockname(), KEY_TYPES[algorithm], kex, handshakes))
+    cpu_started = time.process_time()
+    started = time.perf_counter()
+    process.start()
+    process.join()
+    server_thread.join()
+    for transport in transports:
+        transport.close()
+        transport.join()
+    elapsed = time.perf_counter() - started
+    cpu = time.process_time() - cpu_started
+    listener.close()
+
+    return {
+        "algorithm": algorithm,
+        "kex": kex,
+        "cpu_ms_per_handshake": cpu / handshakes * 1000,
+        "handshakes_per_second": handshakes / elapsed,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--handshakes', type=int, default=50)
+    parser.add_argument('-k', '--host_key_algorithms', type=str, nargs='+', choices=list(KEY_TYPES), default=list(KEY_TYPES))
+    parser.add_argument('-x', '--kex_algorithms', type=str, nargs='+', default=list(KEX_ALGORITHMS))
+    args = parser.parse_args()
+    # Clients hang up right after the handshake, paramiko reports every one of them as a reset connection.
+    logging.getLogger("paramiko").setLevel(logging.CRITICAL)
+
+    with tempfile.TemporaryDirectory() as key_directory:
+        for algorithm in args.host_key_algorithms:
+            for kex in args.kex_algorithms:
+                result = run(algorithm, kex, args.handshakes, key_directory)
+                print(f"{result['algorithm']:<8} {result['kex']:<32} "
+                      f"{result['cpu_ms_per_handshake']:7.2f} ms CPU/handshake "
+                      f"{result['handshakes_per_second']:7.1f} handshakes/s")
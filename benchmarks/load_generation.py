@@ -0,0 +1,229 @@
+""" End-to-end load test of the honeypot listener with many simulated paramiko clients.
+
+Phases:
+    connect   Open a TCP connection and wait for the server's SSH version line.
+    auth      Brute force: every client logs in with wrong passwords, several attempts per connection.
+    commands  Interactive sessions: log in, open a shell and run a list of commands.
+
+The honeypot runs in its own process, so the RSS and thread count reported are the server's alone.
+Clients are spread over several processes with a thread per simulated client.
+
+Usage: python3 -m benchmarks.load_generation -n 500 -c 50
+"""
+import argparse
+import multiprocessing
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import paramiko
+
+PHASES = ("connect", "auth", "commands")
+USERNAME = "root"
+PASSWORD = "benchmark"
+COMMANDS = ("uname -a", "whoami", "ps", "date", "pwd", "echo hello", "who", "uptime")
+
+
+def serve(env_directory: str, sessions: int, ready):
+    """ Run the honeypot in this process and report its port through `ready`. """
+    # Connection errors are expected under load, keep them out of the report.
+    sys.stdout = sys.stderr = open(os.devnull, "w")
+    import honeypot
+    from honeypot.objects import HoneypotSettings
+
+    settings = HoneypotSettings(
+        address="127.0.0.1", port=0, password=PASSWORD, banner=False, env_directory=env_directory,
+        host_key_directory=env_directory, webserver_enabled=False, concurrent_connections=sessions,
+        max_queued_connections=sessions * 10, connection_rate=0, auth_rate=0,
+    )
+    server = honeypot.HoneypotServer(settings)
+    threading.Thread(target=server.start, daemon=True, name="bench-server").start()
+    while server.server_socket is None or server.server_socket.getsockname()[1] == 0:
+        time.sleep(0.01)
+    ready.put(server.server_socket.getsockname()[1])
+    threading.Event().wait()
+
+
+def process_status(pid: int) -> dict:
+    """ RSS in bytes and thread count of a process, from /proc on Linux. """
+    status = {"rss": 0, "threads": 0}
+    try:
+        with open(f"/proc/{pid}/status") as status_file:
+            for line in status_file:
+                if line.startswith("VmRSS:"):
+                    status["rss"] = int(line.split()[1]) * 1024
+                elif line.startswith("Threads:"):
+                    status["threads"] = int(line.split()[1])
+    except FileNotFoundError:
+        pass
+    return status
+
+
+class PeakSampler:
+    def __init__(self, pid: int, interval: float = 0.1):
+        """ Samples a process in the background and keeps the peak RSS and thread count. """
+        self.pid = pid
+        self.interval = interval
+        self.peak = {"rss": 0, "threads": 0}
+        self.__stopped = threading.Event()
+        self.__thread = threading.Thread(target=self.__run, daemon=True)
+
+    def __enter__(self):
+        self.__thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.__stopped.set()
+        self.__thread.join()
+
+    def __run(self):
+        while not self.__stopped.is_set():
+            status = process_status(self.pid)
+            self.peak = {key: max(self.peak[key], status[key]) for key in self.peak}
+            self.__stopped.wait(self.interval)
+
+
+def connect_client(address, _) -> list:
+    started = time.perf_counter()
+    with socket.create_connection(address, timeout=60) as sock:
+        data = b""
+        while not data.endswith(b"\n"):
+            chunk = sock.recv(256)
+            if not chunk:
+                raise ConnectionError("Connection closed before the SSH version line")
+            data += chunk
+    return [time.perf_counter() - started]
+
+
+def auth_client(address, attempts: int) -> list:
+    latencies = []
+    with socket.create_connection(address, timeout=60) as sock:
+        transport = paramiko.Transport(sock)
+        try:
+            transport.start_client(timeout=60)
+            for attempt in range(attempts):
+                started = time.perf_counter()
+                try:
+                    transport.auth_password(USERNAME, f"wrong-{attempt}")
+                except paramiko.AuthenticationException:
+                    pass
+                latencies.append(time.perf_counter() - started)
+        finally:
+            transport.close()
+    return latencies
+
+
+def read_until_prompt(channel: paramiko.Channel) -> bytes:
+    data = b""
+    while not data.endswith(b"$ "):
+        chunk = channel.recv(65536)
+        if not chunk:
+            raise ConnectionError("Channel closed before the prompt")
+        data += chunk
+    return data
+
+
+def commands_client(address, commands: int) -> list:
+    latencies = []
+    with socket.create_connection(address, timeout=60) as sock:
+        transport = paramiko.Transport(sock)
+        try:
+            transport.start_client(timeout=60)
+            transport.auth_password(USERNAME, PASSWORD)
+            channel = transport.open_session(timeout=60)
+            channel.settimeout(60)
+            channel.get_pty()
+            channel.invoke_shell()
+            read_until_prompt(channel)
+            for index in range(commands):
+                started = time.perf_counter()
+                channel.sendall(f"{COMMANDS[index % len(COMMANDS)]}\r".encode())
+                read_until_prompt(channel)
+                latencies.append(time.perf_counter() - started)
+            channel.sendall(b"exit\r")
+        finally:
+            transport.close()
+    return latencies
+
+
+CLIENTS = {"connect": connect_client, "auth": auth_client, "commands": commands_client}
+
+
+def run_clients(phase: str, address, clients: int, parallel: int, operations: int) -> tuple:
+    """ Run `clients` simulated clients, `parallel` at a time. Returns their latencies and the number that failed. """
+    latencies, errors = [], 0
+    with ThreadPoolExecutor(max_workers=parallel) as executor:
+        futures = [executor.submit(CLIENTS[phase], address, operations) for _ in range(clients)]
+        for future in futures:
+            try:
+                latencies.extend(future.result())
+            except Exception:
+                errors += 1
+    return latencies, errors
+
+
+def percentile(values: list, fraction: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+def run_phase(phase: str, address, server_pid: int, clients: int, parallel: int, processes: int, operations: int) -> dict:
+    # Clients and their parallelism are split evenly over the client processes.
+    shares = [clients // processes + (1 if index < clients % processes else 0) for index in range(processes)]
+    latencies, errors = [], 0
+    with PeakSampler(server_pid) as sampler:
+        started = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context("spawn")) as executor:
+            futures = [executor.submit(run_clients, phase, address, share, max(parallel // processes, 1), operations) for share in shares if share]
+            for future in futures:
+                result_latencies, result_errors = future.result()
+                latencies.extend(result_latencies)
+                errors += result_errors
+        elapsed = time.perf_counter() - started
+
+    return {
+        "phase": phase,
+        "operations": len(latencies),
+        "errors": errors,
+        "per_second": len(latencies) / elapsed,
+        "p50": percentile(latencies, 0.50),
+        "p99": percentile(latencies, 0.99),
+        "server_rss": sampler.peak["rss"],
+        "server_threads": sampler.peak["threads"],
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--clients', type=int, default=200, help="Simulated clients per phase.")
+    parser.add_argument('-c', '--parallel', type=int, default=50, help="Clients running at the same time.")
+    parser.add_argument('-p', '--processes', type=int, default=min(os.cpu_count() or 1, 4), help="Client processes.")
+    parser.add_argument('-a', '--attempts', type=int, default=10, help="Password attempts per connection in the auth phase.")
+    parser.add_argument('-m', '--commands', type=int, default=20, help="Commands per session in the commands phase.")
+    parser.add_argument('--phases', type=str, nargs='+', choices=PHASES, default=list(PHASES))
+    args = parser.parse_args()
+
+    operations = {"connect": 1, "auth": args.attempts, "commands": args.commands}
+    with tempfile.TemporaryDirectory() as env_directory:
+        context = multiprocessing.get_context("spawn")
+        ready = context.Queue()
+        server_process = context.Process(target=serve, args=(env_directory, args.parallel, ready), daemon=True)
+        server_process.start()
+        address = ("127.0.0.1", ready.get(timeout=60))
+        idle = process_status(server_process.pid)
+        print(f"server idle: rss={idle['rss'] / 2**20:.1f}MB threads={idle['threads']}")
+
+        try:
+            for phase in args.phases:
+                result = run_phase(phase, address, server_process.pid, args.clients, args.parallel, args.processes, operations[phase])
+                print(f"{result['phase']:<8} {result['operations']:7d} ops {result['errors']:4d} errors "
+                      f"{result['per_second']:9.1f} ops/s p50={result['p50'] * 1000:8.1f}ms p99={result['p99'] * 1000:8.1f}ms "
+                      f"server rss={result['server_rss'] / 2**20:.1f}MB threads={result['server_threads']}")
+        finally:
+            server_process.terminate()
+            server_process.join()
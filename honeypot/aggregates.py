@@ -0,0 +1,76 @@
+import json
+import os
+import threading
+from collections import Counter
+from honeypot.columnar import available as columnar_available, compacted_legacy_path, count_parquet_daily
+from honeypot.rollups import ROLLUP_DIMENSIONS, TOTAL
+from honeypot.storage import count_daily
+
+
+class AggregateCache:
+    def __init__(self, storage):
+        """ Daily counts kept in memory and brought up to date incrementally.
+
+        Groupings the storage keeps rollups for are read from the rollups. Other storage
+        counts are folded in from the position the storage last reported, a byte offset per
+        journal partition or the last SQLite row id. Legacy JSON files are only parsed again
+        when their mtime or size changed, and daily files that were compacted are read from
+        their Parquet copy instead.
+        """
+        self.storage = storage
+        self.__lock = threading.Lock()
+        # (event_type, group_by) -> [counts keyed on (day, key), storage position]
+        self.__storage_counts = {}
+        # (path, group_by) -> ((mtime, size), counts keyed on (day, key))
+        self.__file_counts = {}
+
+    def daily_counts(self, event_type: str, group_by: str | None = None) -> Counter:
+        """ Daily counts of `event_type` in the storage, keyed on (day, group). """
+        if group_by is None or group_by in ROLLUP_DIMENSIONS[event_type]:
+            rows = self.storage.rollup(event_type, group_by or TOTAL)
+            return Counter({(day, key): count for day, key, count in rows})
+        with self.__lock:
+            entry = self.__storage_counts.setdefault((event_type, group_by), [Counter(), None])
+            rows, entry[1], reset_days = self.storage.fold_daily_counts(event_type, group_by, entry[1])
+            if reset_days:
+                entry[0] = Counter({(day, key): count for (day, key), count in entry[0].items() if day not in reset_days})
+            for day, key, count in rows:
+                entry[0][(day, key)] += count
+            return entry[0].copy()
+
+    def legacy_daily_counts(self, directory: str, pattern, group_by: str | None = None) -> Counter:
+        """ Daily counts of the legacy JSON files in `directory` whose name matches `pattern`. """
+        counts = Counter()
+        if not os.path.isdir(directory):
+            return counts
+        with self.__lock:
+            for filename in os.listdir(directory):
+                if not pattern.match(filename):
+                    continue
+                path = os.path.join(directory, filename)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                version = (stat.st_mtime_ns, stat.st_size)
+                cached = self.__file_counts.get((path, group_by))
+                if cached is None or cached[0] != version:
+                    cached = (version, self.__count_file(path, group_by))
+                    self.__file_counts[(path, group_by)] = cached
+                counts.update(cached[1])
+        return counts
+
+    def clear(self):
+        with self.__lock:
+            self.__storage_counts.clear()
+            self.__file_counts.clear()
+
+    def __count_file(self, path: str, group_by: str | None) -> Counter:
+        if columnar_available():
+            parquet_path = compacted_legacy_path(path)
+            if parquet_path is not None:
+                return count_parquet_daily(parquet_path, group_by)
+        with open(path) as file:
+            data = json.load(file)
+        records = [item for item in data if isinstance(item, dict)] if isinstance(data, list) else []
+        return Counter({(day, key): count for day, key, count in count_daily(records, group_by)})
@@ -0,0 +1,178 @@
+import argparse
+import json
+import os
+import re
+from collections import Counter
+from datetime import datetime
+from honeypot.logger import server_logger
+from honeypot.storage import STORAGE_BACKENDS, create_storage
+
+# pyarrow is optional, without it nothing is compacted and the JSON sources are read as before.
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+# Column types per event type. Dictionary columns repeat the same few values across many records.
+COLUMNS = {
+    "connection": {"timestamp": "string", "ip": "dictionary", "port": "int64"},
+    "login": {"timestamp": "string", "ip": "dictionary", "username": "dictionary", "password": "dictionary", "successfull_login": "bool"},
+    "command": {"timestamp": "string", "ip": "dictionary", "username": "dictionary", "session": "dictionary", "command": "string"},
+}
+# Daily JSON files written before the storage layer, per event type.
+LEGACY_DAILY_FILES = {
+    "connection": ("connections", re.compile(r'connections_(\d{4}-\d{2}-\d{2})\.json')),
+    "login": ("logins", re.compile(r'logins_(\d{4}-\d{2}-\d{2})\.json')),
+}
+
+
+def available() -> bool:
+    return pa is not None
+
+
+def compacted_legacy_path(json_path: str) -> str | None:
+    """ Parquet copy of a legacy daily JSON file, if it exists and is not older than the file. """
+    for event_type, (_, pattern) in LEGACY_DAILY_FILES.items():
+        match = pattern.fullmatch(os.path.basename(json_path))
+        if match is None:
+            continue
+        env_directory = os.path.dirname(os.path.dirname(json_path))
+        path = os.path.join(env_directory, "columnar", event_type, "legacy", f"{match.group(1)}.parquet")
+        try:
+            if os.path.getmtime(path) >= os.path.getmtime(json_path):
+                return path
+        except FileNotFoundError:
+            pass
+    return None
+
+
+class ColumnarStore:
+    def __init__(self, env_directory: str):
+        """ Closed days compacted into one zstd-compressed Parquet file per event type and day.
+
+        Storage records go to `columnar/<type>/<day>.parquet`, legacy daily JSON files to
+        `columnar/<type>/legacy/<day>.parquet`. Both are left in place, the Parquet files are copies
+        that can be read a few columns and days at a time.
+        """
+        self.env_directory = env_directory
+        self.directory = os.path.join(env_directory, "columnar")
+
+    def path(self, event_type: str, day: str, legacy: bool = False) -> str:
+        if legacy:
+            return os.path.join(self.directory, event_type, "legacy", f"{day}.parquet")
+        return os.path.join(self.directory, event_type, f"{day}.parquet")
+
+    def compacted(self, event_type: str, day: str, source_path: str) -> str | None:
+        """ Parquet copy of a storage day, if it exists and is not older than the partition it was compacted from. """
+        path = self.path(event_type, day)
+        try:
+            if os.path.getmtime(path) >= os.path.getmtime(source_path):
+                return path
+        except FileNotFoundError:
+            pass
+        return None
+
+    def daily_counts(self, event_type: str, day: str, source_path: str, group_by: str | None = None) -> Counter | None:
+        """ Counts of a compacted storage day keyed on (day, group), or None if it has no up to date copy. """
+        path = self.compacted(event_type, day, source_path)
+        return count_parquet_daily(path, group_by) if path is not None else None
+
+    def rows(self, event_type: str, day: str) -> int | None:
+        """ Number of records in the Parquet copy of a storage day, read from its footer. None if it has no copy. """
+        try:
+            return pq.read_metadata(self.path(event_type, day)).num_rows
+        except FileNotFoundError:
+            return None
+
+    def days(self, event_type: str, legacy: bool = False) -> list:
+        directory = os.path.dirname(self.path(event_type, "", legacy))
+        if not os.path.isdir(directory):
+            return []
+        return sorted(filename[:-8] for filename in os.listdir(directory) if filename.endswith(".parquet"))
+
+    def write(self, event_type: str, day: str, records: list, legacy: bool = False) -> str:
+        columns = COLUMNS[event_type]
+        types = {"string": pa.string(), "int64": pa.int64(), "bool": pa.bool_()}
+        arrays = []
+        for column, kind in columns.items():
+            values = [record.get(column) for record in records]
+            if kind == "dictionary":
+                arrays.append(pa.array(values, type=pa.string()).dictionary_encode())
+            else:
+                arrays.append(pa.array(values, type=types[kind]))
+        table = pa.Table.from_arrays(arrays, names=list(columns))
+
+        path = self.path(event_type, day, legacy)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write to a temporary file and rename it, so readers never see a partial file.
+        temporary_path = f"{path}.tmp"
+        pq.write_table(table, temporary_path, compression="zstd", use_dictionary=[column for column, kind in columns.items() if kind == "dictionary"])
+        os.replace(temporary_path, path)
+        return path
+
+    def read(self, event_type: str, columns: list | None = None, start: str | None = None, end: str | None = None, legacy: bool = True):
+        """ pyarrow Table of the compacted days between `start` and `end` (inclusive), with only `columns`. """
+        paths = [self.path(event_type, day) for day in self.days(event_type) if (not start or day >= start) and (not end or day <= end)]
+        if legacy:
+            paths += [self.path(event_type, day, legacy=True) for day in self.days(event_type, legacy=True) if (not start or day >= start) and (not end or day <= end)]
+        tables = [pq.read_table(path, columns=columns) for path in paths]
+        if not tables:
+            return pa.table({column: pa.array([], type=pa.string()) for column in (columns or COLUMNS[event_type])})
+        return pa.concat_tables(tables)
+
+    def compact(self, storage, before: str | None = None) -> int:
+        """ Compact every closed day, before `before` (YYYY-MM-DD, defaults to today), that has no up to date Parquet copy. Returns the number of files written.
+
+        A copy is up to date while it holds as many records as the storage counts for its day. Late or
+        replayed writes to a closed day change that count, and the day is compacted again.
+        """
+        before = before or datetime.now().strftime("%Y-%m-%d")
+        written = 0
+        for event_type in COLUMNS:
+            # Records are timestamped when they are written, so days before today rarely change.
+            for day, _, count in storage.rollup(event_type, end=before):
+                if day >= before or self.rows(event_type, day) == count:
+                    continue
+                self.write(event_type, day, list(storage.read(event_type, day, day)))
+                written += 1
+
+        for event_type, (directory, pattern) in LEGACY_DAILY_FILES.items():
+            directory = os.path.join(self.env_directory, directory)
+            if not os.path.isdir(directory):
+                continue
+            for filename in sorted(os.listdir(directory)):
+                match = pattern.fullmatch(filename)
+                json_path = os.path.join(directory, filename)
+                if match is None or match.group(1) >= before or compacted_legacy_path(json_path):
+                    continue
+                with open(json_path) as json_file:
+                    data = json.load(json_file)
+                records = [item for item in data if isinstance(item, dict)] if isinstance(data, list) else []
+                self.write(event_type, match.group(1), records, legacy=True)
+                written += 1
+        if written:
+            server_logger.info(f"Compacted {written} closed days into {self.directory}")
+        return written
+
+
+def count_parquet_daily(path: str, group_by: str | None = None) -> Counter:
+    """ Daily counts of one Parquet file keyed on (day, group), reading only the columns needed. """
+    table = pq.read_table(path, columns=["timestamp"] + ([group_by] if group_by else []))
+    days = [timestamp[:10] for timestamp in table.column("timestamp").to_pylist()]
+    keys = table.column(group_by).to_pylist() if group_by else [None] * len(days)
+    return Counter(zip(days, keys))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compact closed days into Parquet files.")
+    parser.add_argument('-e', '--env_directory', type=str, default="./env")
+    parser.add_argument('-s', '--storage', type=str, choices=STORAGE_BACKENDS, default="journal")
+    parser.add_argument('--before', type=str, help="Compact days before this one (YYYY-MM-DD). (Default: today)")
+    args = parser.parse_args()
+
+    if not available():
+        parser.exit(1, "Compaction needs pyarrow: pip install pyarrow\n")
+    storage = create_storage(args.storage, args.env_directory)
+    print(f"Wrote {ColumnarStore(args.env_directory).compact(storage, args.before)} files to {os.path.join(args.env_directory, 'columnar')}")
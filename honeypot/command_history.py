@@ -0,0 +1,86 @@
+import json
+import os
+import re
+from honeypot.persistence import PersistenceWriter
+
+# Session history files, `.json` files were written before histories were appended incrementally.
+HISTORY_EXTENSIONS = (".ndjson", ".json")
+
+
+class InvalidCursor(ValueError):
+    """ A pagination cursor that was not produced by a scan, rejected before it is used. """
+
+
+def parse_position(cursor: str | None) -> int:
+    """ A cursor holding a byte offset, record index or row id. """
+    if not cursor:
+        return 0
+    if not re.fullmatch(r"\d{1,18}", cursor):
+        raise InvalidCursor("Invalid cursor.")
+    return int(cursor)
+
+
+class CommandHistory:
+    def __init__(self, path: str, persistence: PersistenceWriter, buffer_size: int = 32):
+        """ Line-delimited command history of one session, appended through the persistence writer. """
+        self.path = path
+        self.persistence = persistence
+        self.buffer_size = buffer_size
+        # Storage backends that keep command history themselves need no session file.
+        self.enabled = persistence.storage.session_files
+        self.__buffer = []
+
+    @property
+    def filename(self) -> str:
+        return os.path.basename(self.path)
+
+    def append(self, record: dict):
+        """ Buffer one record, the buffer is handed to the writer once it holds `buffer_size` records. """
+        if not self.enabled:
+            return
+        self.__buffer.append(json.dumps(record, separators=(",", ":")) + "\n")
+        if len(self.__buffer) >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        if not self.__buffer:
+            return
+        self.persistence.call(append_lines, self.path, "".join(self.__buffer))
+        self.__buffer = []
+
+
+def append_lines(path: str, lines: str):
+    with open(path, "a") as history_file:
+        history_file.write(lines)
+
+
+def scan_command_history(path: str, cursor: str | None = None):
+    """ (record, cursor) pairs of a session history file after `cursor`.
+
+    The cursor is a byte offset into `.ndjson` files and a record index into `.json` files.
+    """
+    position = parse_position(cursor)
+    if path.endswith(".json"):
+        with open(path) as history_file:
+            records = json.load(history_file)
+        for index in range(position, len(records)):
+            yield records[index], str(index + 1)
+        return
+    with open(path, "rb") as history_file:
+        history_file.seek(position)
+        for line in history_file:
+            if not line.endswith(b"\n"):
+                break
+            position += len(line)
+            yield json.loads(line), str(position)
+
+
+def read_command_history(path: str):
+    """ Yield the records of a session history file in either format. """
+    with open(path) as history_file:
+        if path.endswith(".json"):
+            yield from json.load(history_file)
+            return
+        for line in history_file:
+            if line.endswith("\n"):
+                yield json.loads(line)
@@ -0,0 +1,77 @@
+import json
+import os
+import threading
+from honeypot.logger import server_logger
+
+
+class CounterStore:
+    def __init__(self, path: str):
+        """ In-memory counters that are reloaded from and snapshotted to a JSON dict file. """
+        self.path = path
+        self.__lock = threading.Lock()
+        self.__counts = {}
+        self.__version = 0
+        self.__saved_version = 0
+        self.load()
+
+    def load(self):
+        """ Reload the counters from the last snapshot, if there is one. """
+        try:
+            with open(self.path, 'r') as json_file:
+                counts = json.load(json_file)
+        except FileNotFoundError:
+            counts = {}
+        except ValueError as error:
+            server_logger.error(f"Exception - Could not load counters from {self.path}, starting empty")
+            server_logger.error(error)
+            counts = {}
+        with self.__lock:
+            self.__counts = counts
+            self.__version = self.__saved_version = 0
+        server_logger.info(f"Loaded {len(counts)} counters from {self.path}")
+
+    def increment(self, key: str, amount: int = 1) -> int:
+        with self.__lock:
+            value = self.__counts.get(key, 0) + amount
+            self.__counts[key] = value
+            self.__version += 1
+        return value
+
+    def get(self, key: str) -> int:
+        with self.__lock:
+            return self.__counts.get(key, 0)
+
+    def __len__(self) -> int:
+        with self.__lock:
+            return len(self.__counts)
+
+    def items(self) -> dict:
+        """ Copy of the live counters. """
+        with self.__lock:
+            return dict(self.__counts)
+
+    def most_common(self, limit: int | None = None) -> list:
+        items = sorted(self.items().items(), key=lambda item: item[1], reverse=True)
+        return items if limit is None else items[:limit]
+
+    def snapshot(self) -> bool:
+        """ Atomically write the counters to disk when they changed since the last snapshot. """
+        with self.__lock:
+            if self.__version == self.__saved_version:
+                return False
+            counts = dict(self.__counts)
+            version = self.__version
+
+        # Write to a temporary file and rename it, so readers never see a partial file.
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        temporary_path = f"{self.path}.tmp"
+        with open(temporary_path, 'w') as json_file:
+            json.dump(counts, json_file, indent=4)
+            json_file.flush()
+            os.fsync(json_file.fileno())
+        os.replace(temporary_path, self.path)
+
+        with self.__lock:
+            self.__saved_version = version
+        server_logger.info(f"Saved {len(counts)} counters to {self.path}")
+        return True
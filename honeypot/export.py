@@ -0,0 +1,69 @@
+import argparse
+import json
+import os
+from honeypot.rollups import period_start
+from honeypot.storage import STORAGE_BACKENDS, create_storage
+
+# Event type -> (directory, file prefix) of the daily, weekly and monthly JSON files the honeypot used to write.
+LEGACY_LAYOUT = {
+    "connection": ("connections", "connections"),
+    "login": ("logins", "logins"),
+}
+
+
+def write_records(path: str, records: list):
+    with open(path, 'w') as json_file:
+        json.dump(records, json_file, indent=4)
+
+
+def export_legacy_layout(storage, destination: str, start: str | None = None, end: str | None = None) -> int:
+    """ Write the stored connections and logins as daily, weekly and monthly JSON files. Returns the number of files written.
+
+    Days are read one at a time, so at most one month of records is held in memory.
+    """
+    written = 0
+    for event_type, (directory, prefix) in LEGACY_LAYOUT.items():
+        directory = os.path.join(destination, directory)
+        os.makedirs(directory, exist_ok=True)
+        days = sorted({day for day, _, _ in storage.rollup(event_type, start=start, end=end)})
+        week, weekly = None, []
+        month, monthly = None, []
+        for day in days:
+            records = list(storage.read(event_type, day, day))
+            write_records(os.path.join(directory, f"{prefix}_{day}.json"), records)
+            written += 1
+
+            if period_start(day, "week") != week:
+                if weekly:
+                    write_records(os.path.join(directory, f"{prefix}_week_{week}.json"), weekly)
+                    written += 1
+                week, weekly = period_start(day, "week"), []
+            weekly.extend(records)
+
+            if period_start(day, "month") != month:
+                if monthly:
+                    write_records(os.path.join(directory, f"{prefix}_{month}.json"), monthly)
+                    written += 1
+                month, monthly = period_start(day, "month"), []
+            monthly.extend(records)
+
+        if weekly:
+            write_records(os.path.join(directory, f"{prefix}_week_{week}.json"), weekly)
+            written += 1
+        if monthly:
+            write_records(os.path.join(directory, f"{prefix}_{month}.json"), monthly)
+            written += 1
+    return written
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export stored connections and logins as daily, weekly and monthly JSON files.")
+    parser.add_argument('destination', type=str)
+    parser.add_argument('-e', '--env_directory', type=str, default="./env")
+    parser.add_argument('-s', '--storage', type=str, choices=STORAGE_BACKENDS, default="journal")
+    parser.add_argument('--start', type=str, help="First day to export (YYYY-MM-DD).")
+    parser.add_argument('--end', type=str, help="Last day to export (YYYY-MM-DD).")
+    args = parser.parse_args()
+
+    storage = create_storage(args.storage, args.env_directory)
+    print(f"Wrote {export_legacy_layout(storage, args.destination, args.start, args.end)} files to {args.destination}")
@@ -0,0 +1,121 @@
+import json
+import os
+import threading
+from datetime import datetime, timedelta
+
+# Timestamp format used by every record in the journal.
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+EVENT_TYPES = ("connection", "login", "command")
+
+
+class EventJournal:
+    def __init__(self, env_directory: str):
+        """ Append-only, line-delimited JSON journal of honeypot events, partitioned by event type and day. """
+        self.journal_directory = os.path.join(env_directory, "journal")
+        self.__lock = threading.Lock()
+        self.__files = {}
+        self.__dirty = set()
+
+    def partition_path(self, event_type: str, day: str) -> str:
+        return os.path.join(self.journal_directory, event_type, f"{day}.ndjson")
+
+    def append(self, event_type: str, record: dict) -> dict:
+        """ Append one record to its day partition and flush it. """
+        record = self.write(event_type, record)
+        with self.__lock:
+            self.__files[event_type].flush()
+        return record
+
+    def write(self, event_type: str, record: dict) -> dict:
+        """ Buffer one record for its day partition, it is durable after the next `commit`. Adds a timestamp if the record has none. """
+        if "timestamp" not in record:
+            record = {**record, "timestamp": datetime.now().strftime(TIMESTAMP_FORMAT)}
+        line = json.dumps(record, separators=(",", ":")) + "\n"
+        day = record["timestamp"][:10]
+        with self.__lock:
+            journal_file = self.__open(event_type, day)
+            journal_file.write(line)
+            self.__dirty.add(event_type)
+        return record
+
+    def commit(self):
+        """ Flush and fsync every partition written since the last commit. """
+        with self.__lock:
+            for event_type in self.__dirty:
+                journal_file = self.__files[event_type]
+                journal_file.flush()
+                os.fsync(journal_file.fileno())
+            self.__dirty.clear()
+
+    def close(self):
+        self.commit()
+        with self.__lock:
+            for journal_file in self.__files.values():
+                journal_file.close()
+            self.__files.clear()
+
+    def days(self, event_type: str) -> list:
+        """ Sorted list of days (YYYY-MM-DD) that have a partition for `event_type`. """
+        directory = os.path.join(self.journal_directory, event_type)
+        if not os.path.isdir(directory):
+            return []
+        return sorted(filename[:-7] for filename in os.listdir(directory) if filename.endswith(".ndjson"))
+
+    def read(self, event_type: str, start: str | None = None, end: str | None = None):
+        """ Yield the records of `event_type` for the days between `start` and `end` (inclusive, YYYY-MM-DD). """
+        for day in self.days(event_type):
+            if (start and day < start) or (end and day > end):
+                continue
+            try:
+                with open(self.partition_path(event_type, day)) as journal_file:
+                    for line in journal_file:
+                        # A partially written last line is skipped, it is completed by the next append.
+                        if line.endswith("\n"):
+                            yield json.loads(line)
+            except FileNotFoundError:
+                continue
+
+    def read_partition(self, event_type: str, day: str, offset: int = 0):
+        """ Records of one day partition from byte `offset` on. Returns the records and the offset after the last complete line. """
+        try:
+            with open(self.partition_path(event_type, day), "rb") as journal_file:
+                journal_file.seek(offset)
+                data = journal_file.read()
+        except FileNotFoundError:
+            return [], offset
+        # Stop at the last complete line, the rest is read once it has been written.
+        complete = data[:data.rfind(b"\n") + 1]
+        return [json.loads(line) for line in complete.splitlines()], offset + len(complete)
+
+    def daily(self, event_type: str, day: str | None = None) -> list:
+        """ Records of a single day, defaults to today. """
+        day = day or datetime.now().strftime("%Y-%m-%d")
+        return list(self.read(event_type, day, day))
+
+    def weekly(self, event_type: str, start_of_week: str | None = None) -> list:
+        """ Records of the week (Monday to Sunday) that starts on `start_of_week`, defaults to the current week. """
+        if start_of_week is None:
+            current_date = datetime.now()
+            start_of_week = (current_date - timedelta(days=current_date.weekday())).strftime("%Y-%m-%d")
+        end_of_week = (datetime.strptime(start_of_week, "%Y-%m-%d") + timedelta(days=6)).strftime("%Y-%m-%d")
+        return list(self.read(event_type, start_of_week, end_of_week))
+
+    def monthly(self, event_type: str, month: str | None = None) -> list:
+        """ Records of a month (YYYY-MM), defaults to the current month. """
+        month = month or datetime.now().strftime("%Y-%m")
+        return list(self.read(event_type, f"{month}-01", f"{month}-31"))
+
+    def __open(self, event_type: str, day: str):
+        journal_file = self.__files.get(event_type)
+        if journal_file is not None and journal_file.name.endswith(f"{day}.ndjson"):
+            return journal_file
+        # The day rolled over, close the previous partition and open the new one.
+        if journal_file is not None:
+            journal_file.flush()
+            os.fsync(journal_file.fileno())
+            journal_file.close()
+        os.makedirs(os.path.join(self.journal_directory, event_type), exist_ok=True)
+        journal_file = open(self.partition_path(event_type, day), "a")
+        self.__files[event_type] = journal_file
+        return journal_file
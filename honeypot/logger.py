@@ -1,46 +1,75 @@
+import atexit
+import json
 import logging
 import os
-from logging.handlers import RotatingFileHandler
+import queue
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from main import honeypot_settings
 
+
+class JsonFormatter(logging.Formatter):
+    """ Formats every record as a single JSON line. """
+    def format(self, record):
+        return json.dumps({
+            "timestamp": self.formatTime(record),
+            "logger": record.name,
+            "level": record.levelname,
+            "message": record.getMessage(),
+        })
+
+
 # Logging Format.
-logging_format = logging.Formatter('%(asctime)s %(message)s')
+if honeypot_settings.log_json:
+    logging_format = JsonFormatter()
+else:
+    logging_format = logging.Formatter('%(asctime)s %(message)s')
 
 # Create the logs directory if it does not exist.
 os.makedirs(f'{honeypot_settings.log_directory}', exist_ok=True)
 
+# Loggers only put records on this queue, a single listener thread writes them to the files.
+log_queue = queue.SimpleQueue()
+queue_handler = QueueHandler(log_queue)
+file_handlers = []
+
+def create_logger(name, filename):
+    """ Create a logger that writes to its own rotating file through the shared queue. """
+    file_handler = RotatingFileHandler(f'{honeypot_settings.log_directory}/{filename}', maxBytes=honeypot_settings.log_max_bytes, backupCount=honeypot_settings.log_backup_count)
+    file_handler.setFormatter(logging_format)
+    # The listener hands every record to every handler, the filter keeps only this logger's records.
+    file_handler.addFilter(logging.Filter(name))
+    file_handlers.append(file_handler)
+
+    logger = logging.getLogger(name)
+    logger.setLevel(logging.INFO)
+    logger.addHandler(queue_handler)
+    return logger
+
 # Should be catch all but transformed to a more specific command logger.
-funnel_logger = logging.getLogger('CommandLogger')
-funnel_logger.setLevel(logging.INFO)
-funnel_handler = RotatingFileHandler(f'{honeypot_settings.log_directory}/cmd_audits.log', maxBytes=2000, backupCount=5)
-funnel_handler.setFormatter(logging_format)
-funnel_logger.addHandler(funnel_handler)
+funnel_logger = create_logger('CommandLogger', 'cmd_audits.log')
 
 # Create the logger
-server_logger = logging.getLogger('ServerLogger')
-server_logger.setLevel(logging.INFO)
+server_logger = create_logger('ServerLogger', 'server_log.log')
 
-# Create handlers
-server_handler = RotatingFileHandler(f'{honeypot_settings.log_directory}/server_log.log', maxBytes=2000, backupCount=5)
-# console_handler = logging.StreamHandler()
+# Credentials Logger. Captures IP Address, Username, Password.
+creds_logger = create_logger('CredsLogger', 'creds_audits.log')
 
-# Set formatter
-server_handler.setFormatter(logging_format)
-# console_handler.setFormatter(logging_format)
+web_logger = create_logger('WebLogger', 'webserver.log')
 
-# Add handlers to the logger
-server_logger.addHandler(server_handler)
-# server_logger.addHandler(console_handler)
+log_listener = QueueListener(log_queue, *file_handlers, respect_handler_level=True)
+log_listener.start()
 
-# Credentials Logger. Captures IP Address, Username, Password.
-creds_logger = logging.getLogger('CredsLogger')
-creds_logger.setLevel(logging.INFO)
-creds_handler = RotatingFileHandler(f'{honeypot_settings.log_directory}/creds_audits.log', maxBytes=2000, backupCount=5)
-creds_handler.setFormatter(logging_format)
-creds_logger.addHandler(creds_handler)
-
-web_logger = logging.getLogger('WebLogger')
-web_logger.setLevel(logging.INFO)
-web_handler = RotatingFileHandler(f'{honeypot_settings.log_directory}/webserver.log', maxBytes=2000, backupCount=5)
-web_handler.setFormatter(logging_format)
-web_logger.addHandler(web_handler)
\ No newline at end of file
+# Write out everything still queued when the process exits.
+atexit.register(log_listener.stop)
+
+def forward_logs(target_queue):
+    """ Hand every record to the listener of another process, so only one process writes and rotates the files. """
+    atexit.unregister(log_listener.stop)
+    log_listener.stop()
+    queue_handler.queue = target_queue
+
+def receive_logs(source_queue) -> QueueListener:
+    """ Write the records forwarded by other processes with the handlers of this one. Stop the listener when done. """
+    listener = QueueListener(source_queue, *file_handlers, respect_handler_level=True)
+    listener.start()
+    return listener
@@ -0,0 +1,206 @@
+import bisect
+import threading
+
+# Upper bounds in seconds, from a fast command dispatch up to a slow handshake.
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Tarpitted connections are held from seconds up to hours.
+HOLD_BUCKETS = (1.0, 10.0, 30.0, 60.0, 300.0, 600.0, 1800.0, 3600.0, 7200.0, 14400.0)
+
+
+def format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    labels = [f'{name}="{escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        labels.append(extra)
+    return "{" + ",".join(labels) + "}" if labels else ""
+
+
+def escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class MetricsRegistry:
+    def __init__(self):
+        """ Metrics of this process, rendered in the Prometheus text exposition format.
+
+        Snapshots from other processes, the workers of a multi-process server, are added to the
+        local values when rendering, so one scrape shows the whole server.
+        """
+        self.__lock = threading.Lock()
+        self.__metrics = {}
+        # source -> {metric name -> snapshot}
+        self.__remote = {}
+
+    def register(self, metric):
+        with self.__lock:
+            return self.__metrics.setdefault(metric.name, metric)
+
+    def snapshot(self) -> dict:
+        with self.__lock:
+            metrics = list(self.__metrics.values())
+        return {metric.name: metric.snapshot() for metric in metrics}
+
+    def update_remote(self, source: str, snapshot: dict):
+        with self.__lock:
+            self.__remote[source] = snapshot
+
+    def retire_remote(self, source: str):
+        """ Forget the gauges of a source that stopped, its counters keep counting towards the totals. """
+        with self.__lock:
+            snapshot = self.__remote.get(source)
+            if snapshot is not None:
+                self.__remote[source] = {name: value for name, value in snapshot.items() if not isinstance(self.__metrics.get(name), Gauge)}
+
+    def render(self) -> str:
+        with self.__lock:
+            metrics = list(self.__metrics.values())
+            remote = list(self.__remote.values())
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.description}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples([snapshot[metric.name] for snapshot in remote if metric.name in snapshot]))
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, description: str, labels: tuple = (), registry: MetricsRegistry = REGISTRY):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self.__lock = threading.Lock()
+        self.__values = {} if labels else {(): 0}
+        registry.register(self)
+
+    def inc(self, *values, amount: float = 1):
+        with self.__lock:
+            self.__values[values] = self.__values.get(values, 0) + amount
+
+    def value(self, *values) -> float:
+        with self.__lock:
+            return self.__values.get(values, 0)
+
+    def snapshot(self) -> dict:
+        with self.__lock:
+            return dict(self.__values)
+
+    def samples(self, remote: list = ()) -> list:
+        values = self.snapshot()
+        for snapshot in remote:
+            for key, value in snapshot.items():
+                values[key] = values.get(key, 0) + value
+        return [f"{self.name}{format_labels(self.labels, key)} {format_value(value)}" for key, value in sorted(values.items())]
+
+
+class Gauge:
+    kind = "gauge"
+
+    def __init__(self, name: str, description: str, function=None, registry: MetricsRegistry = REGISTRY):
+        """ A value read from `function` when the metrics are rendered, or set directly. """
+        self.name = name
+        self.description = description
+        self.function = function
+        self.__value = 0
+        registry.register(self)
+
+    def set(self, value: float):
+        self.__value = value
+
+    def set_function(self, function):
+        self.function = function
+
+    def value(self) -> float:
+        if self.function is not None:
+            try:
+                return self.function()
+            except Exception:
+                return float("nan")
+        return self.__value
+
+    def snapshot(self) -> float:
+        return self.value()
+
+    def samples(self, remote: list = ()) -> list:
+        return [f"{self.name} {format_value(self.value() + sum(remote))}"]
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, description: str, labels: tuple = (), buckets: tuple = DEFAULT_BUCKETS, registry: MetricsRegistry = REGISTRY):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self.buckets = tuple(sorted(buckets))
+        self.__lock = threading.Lock()
+        # label values -> [count per bucket, +Inf included, sum]
+        self.__values = {}
+        registry.register(self)
+
+    def observe(self, value: float, *values):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.__lock:
+            entry = self.__values.get(values)
+            if entry is None:
+                entry = self.__values[values] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    def count(self, *values) -> int:
+        with self.__lock:
+            entry = self.__values.get(values)
+            return sum(entry[0]) if entry else 0
+
+    def snapshot(self) -> dict:
+        with self.__lock:
+            return {key: (list(counts), total) for key, (counts, total) in self.__values.items()}
+
+    def samples(self, remote: list = ()) -> list:
+        values = self.snapshot()
+        for snapshot in remote:
+            for key, (counts, total) in snapshot.items():
+                local_counts, local_total = values.get(key, ([0] * len(counts), 0.0))
+                values[key] = ([local + count for local, count in zip(local_counts, counts)], local_total + total)
+        lines = []
+        for key, (counts, total) in sorted(values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                bucket_label = 'le="' + format_value(bound) + '"'
+                lines.append(f"{self.name}_bucket{format_labels(self.labels, key, bucket_label)} {cumulative}")
+            lines.append(f"{self.name}_sum{format_labels(self.labels, key)} {format_value(total)}")
+            lines.append(f"{self.name}_count{format_labels(self.labels, key)} {cumulative}")
+        return lines
+
+
+# Hot path instrumentation, shared by the server, the sessions and the webserver of this process.
+CONNECTIONS = Counter("honeydew_connections_total", "Accepted TCP connections by what happened to them.", labels=("outcome",))
+HANDSHAKE_SECONDS = Histogram("honeydew_handshake_seconds", "Duration of the SSH transport negotiation.")
+HANDSHAKE_FAILURES = Counter("honeydew_handshake_failures_total", "Connections that did not complete the SSH negotiation.")
+AUTH_ATTEMPTS = Counter("honeydew_auth_attempts_total", "Password authentication attempts by outcome.", labels=("outcome",))
+SESSIONS = Counter("honeydew_shell_sessions_total", "Shell sessions opened.")
+COMMANDS = Counter("honeydew_commands_total", "Commands executed in shell sessions, unknown commands are counted together.", labels=("command",))
+COMMAND_SECONDS = Histogram("honeydew_command_seconds", "Duration of one command of a command line.")
+RESPONSE_CACHE = Counter("honeydew_response_cache_total", "Lookups of cacheable command responses by result, hit or miss.", labels=("result",))
+RESPONSE_CACHE_ENTRIES = Gauge("honeydew_response_cache_entries", "Command responses held in the response cache.")
+RATE_LIMIT_DECISIONS = Counter("honeydew_rate_limit_decisions_total", "Over-limit connections and auth attempts by limiter and what was done with them: slowed, sampled (let through) or dropped.", labels=("limiter", "decision"))
+RATE_LIMIT_EVICTIONS = Counter("honeydew_rate_limit_evictions_total", "Sources forgotten because the table of a rate limiter was full.", labels=("limiter",))
+TARPIT_HELD = Gauge("honeydew_tarpit_held_connections", "Connections held open by the tarpit.")
+TARPIT_BYTES_DRIPPED = Counter("honeydew_tarpit_bytes_dripped_total", "Banner bytes sent to tarpitted connections.")
+TARPIT_HOLD_SECONDS = Histogram("honeydew_tarpit_hold_seconds", "How long a tarpitted connection was held before it was released.", buckets=HOLD_BUCKETS)
+ACTIVE_SESSIONS = Gauge("honeydew_active_sessions", "Sessions running on the session pool.")
+QUEUED_SESSIONS = Gauge("honeydew_queued_sessions", "Sessions waiting for a worker of the session pool.")
+THREADS = Gauge("honeydew_threads", "Threads of the process.", function=threading.active_count)
+PERSISTENCE_QUEUE_DEPTH = Gauge("honeydew_persistence_queue_depth", "Operations waiting for the persistence writer.")
+PERSISTENCE_FLUSH_SECONDS = Histogram("honeydew_persistence_flush_seconds", "Duration of one persistence batch, commit included.")
+WEBSERVER_RENDER_SECONDS = Histogram("honeydew_webserver_render_seconds", "Time to produce a webserver response, streamed bodies excluded.", labels=("endpoint",))
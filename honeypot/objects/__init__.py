@@ -1 +1,2 @@
+from .endpoint import Endpoint
 from .honeypot_settings import HoneypotSettings
\ No newline at end of file
@@ -0,0 +1,50 @@
+class Endpoint:
+    # Settings an endpoint can override, with how they are parsed from the command line.
+    OVERRIDES = {
+        "username": str,
+        "password": str,
+        "hostname": str,
+        "banner": lambda value: value.lower() in ("1", "true", "yes", "on"),
+        "delay": float,
+        "banner_message": str,
+    }
+
+    def __init__(self, address:str="0.0.0.0", port:int=8022, username:str|None=None, password:str|None=None, hostname:str|None=None, banner:bool|None=None, delay:float|None=None, banner_message:str|None=None):
+        """ One address and port to listen on. Settings left as None are taken from the honeypot settings. """
+        self.address = address
+        self.port = port
+        self.username = username
+        self.password = password
+        self.hostname = hostname
+        self.banner = banner
+        self.delay = delay
+        self.banner_message = banner_message
+
+    @classmethod
+    def parse(cls, spec: str) -> "Endpoint":
+        """ Parse `address:port[,setting=value...]`, for example `0.0.0.0:2222,hostname=web01,banner=true` or `[::]:2222`. """
+        listen, *overrides = spec.split(",")
+        address, _, port = listen.rpartition(":")
+        if address.startswith("[") and address.endswith("]"):
+            address = address[1:-1]
+        if not address or not port.isdigit():
+            raise ValueError(f"Expected address:port, got: {listen}")
+        settings = {}
+        for override in overrides:
+            name, separator, value = override.partition("=")
+            # Settings are split on commas, a value that contains one leaves a piece without `=` behind.
+            if not separator:
+                raise ValueError(f"Expected setting=value, got: {override!r}. Endpoint values cannot contain commas.")
+            if name not in cls.OVERRIDES:
+                raise ValueError(f"Unknown endpoint setting: {name}, expected one of: {', '.join(cls.OVERRIDES)}")
+            settings[name] = cls.OVERRIDES[name](value)
+        return cls(address, int(port), **settings)
+
+    def resolve(self, settings) -> "Endpoint":
+        """ Copy of this endpoint with every unset setting taken from `settings`. """
+        return Endpoint(self.address, self.port, **{
+            name: getattr(settings, name) if getattr(self, name) is None else getattr(self, name) for name in self.OVERRIDES
+        })
+
+    def __str__(self) -> str:
+        return f"[{self.address}]:{self.port}" if ":" in self.address else f"{self.address}:{self.port}"
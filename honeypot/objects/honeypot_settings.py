@@ -1,5 +1,5 @@
 class HoneypotSettings:
-    def __init__(self, address:str="0.0.0.0", port:int=8022, username:str|None|list=None, password:str|None|list=None, concurrent_connections:int=100, banner:bool=True, delay:int=5, overwrite_arguments:bool=False, hostname:str="honeydew", log_directory:str="./logs", env_directory="./env", banner_message="Welcome to the SSH session\r\n\r\n", webserver_enabled:bool=False, webserver_port:int=5000, webserver_address:str="127.0.0.1"):
+    def __init__(self, address:str="0.0.0.0", port:int=8022, username:str|None|list=None, password:str|None|list=None, concurrent_connections:int=100, banner:bool=True, delay:int=5, overwrite_arguments:bool=False, hostname:str="honeydew", log_directory:str="./logs", env_directory="./env", banner_message="Welcome to the SSH session\r\n\r\n", webserver_enabled:bool=False, webserver_port:int=5000, webserver_address:str="127.0.0.1", max_queued_connections:int=100, overflow_policy:str="queue", tarpit_duration:int=30, persistence_batch_size:int=500, persistence_flush_interval:float=1.0, counter_snapshot_interval:int=30, host_key_directory:str=".", host_key_algorithms:list|tuple=("ed25519", "rsa"), kex_algorithms:list|None=None, ciphers:list|None=None, banner_timeout:float|None=15, auth_timeout:float|None=30, window_size:int|None=None, max_packet_size:int|None=None, log_max_bytes:int=10485760, log_backup_count:int=5, log_json:bool=False, storage_backend:str="journal", compaction_interval:int=3600, rate_limit_policy:str="slow", connection_rate:float=0, connection_burst:int=20, auth_rate:float=0, auth_burst:int=20, rate_limit_entries:int=10000, rate_limit_delay:float=5, rate_limit_sample:float=0.1, tarpit_mode:bool=False, tarpit_drip_interval:float=10, tarpit_max_connections:int=10000, tarpit_max_hold:float=0, profile_duration:float=30, profile_interval:float=0.005, workers:int=1, endpoints:list|None=None, response_cache_entries:int=1024, webserver_admin:bool=False):
         """ Configuration settings for the honeypot server. """
         self.address = address
         self.port = port
@@ -16,5 +16,51 @@ class HoneypotSettings:
         self.webserver_enabled = webserver_enabled
         self.webserver_port = webserver_port
         self.webserver_address = webserver_address
+        self.max_queued_connections = max_queued_connections
+        self.overflow_policy = overflow_policy
+        self.tarpit_duration = tarpit_duration
+        self.persistence_batch_size = persistence_batch_size
+        self.persistence_flush_interval = persistence_flush_interval
+        self.counter_snapshot_interval = counter_snapshot_interval
+        self.host_key_directory = host_key_directory
+        self.host_key_algorithms = host_key_algorithms
+        # SSH transport tuning, None keeps the paramiko default.
+        self.kex_algorithms = kex_algorithms
+        self.ciphers = ciphers
+        self.banner_timeout = banner_timeout
+        self.auth_timeout = auth_timeout
+        self.window_size = window_size
+        self.max_packet_size = max_packet_size
+        self.log_max_bytes = log_max_bytes
+        self.log_backup_count = log_backup_count
+        self.log_json = log_json
+        self.storage_backend = storage_backend
+        # Seconds between compactions of closed days into Parquet, 0 disables them. Needs pyarrow.
+        self.compaction_interval = compaction_interval
+        # Per-IP token buckets for new connections and auth attempts, off by default. A rate of 0 disables them.
+        self.rate_limit_policy = rate_limit_policy
+        self.connection_rate = connection_rate
+        self.connection_burst = connection_burst
+        self.auth_rate = auth_rate
+        self.auth_burst = auth_burst
+        self.rate_limit_entries = rate_limit_entries
+        self.rate_limit_delay = rate_limit_delay
+        self.rate_limit_sample = rate_limit_sample
+        # Tarpit mode holds every connection on a dripped banner instead of starting a session.
+        self.tarpit_mode = tarpit_mode
+        self.tarpit_drip_interval = tarpit_drip_interval
+        self.tarpit_max_connections = tarpit_max_connections
+        self.tarpit_max_hold = tarpit_max_hold
+        # Length and sampling interval of a profile started with SIGUSR1 or from the webserver.
+        self.profile_duration = profile_duration
+        self.profile_interval = profile_interval
+        # Listener processes sharing the port, more than one turns this process into their supervisor.
+        self.workers = workers
+        # Endpoints to listen on, each with its own banner, credentials and hostname. None listens on address:port only.
+        self.endpoints = endpoints
+        # Responses of deterministic commands kept per process, 0 disables the cache.
+        self.response_cache_entries = response_cache_entries
+        # Serve /admin/stages and /admin/profile, to local clients only.
+        self.webserver_admin = webserver_admin
     
     
\ No newline at end of file
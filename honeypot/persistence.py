@@ -0,0 +1,134 @@
+import queue
+import threading
+import time
+from datetime import datetime
+from honeypot import metrics, profiling
+from honeypot.journal import TIMESTAMP_FORMAT
+from honeypot.logger import server_logger
+
+
+class PersistenceWriter:
+    def __init__(self, storage, batch_size: int = 500, flush_interval: float = 1.0, max_queue_size: int = 100000):
+        """ Single writer for everything under the env directory.
+
+        Session threads only enqueue work, the writer thread applies it in order and commits
+        once per batch. Until `start` is called, operations are applied synchronously.
+        """
+        # Journal or SQLite storage, see honeypot.storage.
+        self.storage = storage
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.__queue = queue.Queue(maxsize=max_queue_size)
+        self.__thread = None
+        self.__lock = threading.Lock()
+        self.running = False
+        self.total_batches = 0
+        self.total_operations = 0
+        self.last_flush_seconds = 0.0
+
+    @property
+    def queue_depth(self) -> int:
+        return self.__queue.qsize()
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self.__thread = threading.Thread(target=self.__run, daemon=True, name="persistence-writer")
+        self.__thread.start()
+
+    def record(self, event_type: str, record: dict) -> dict:
+        """ Queue a storage record. The timestamp is taken now, not when the record is written. """
+        if "timestamp" not in record:
+            record = {**record, "timestamp": datetime.now().strftime(TIMESTAMP_FORMAT)}
+        self.__submit(("record", event_type, record))
+        return record
+
+    def call(self, function, *args):
+        """ Queue `function(*args)` to run on the writer thread, serialized with every other write. """
+        self.__submit(("call", function, args))
+
+    def stop(self):
+        """ Stop the writer thread after everything queued so far has been committed. """
+        if not self.running:
+            return
+        self.running = False
+        self.__queue.put(None)
+        self.__thread.join()
+
+    def stats(self) -> dict:
+        return {
+            "queue_depth": self.queue_depth,
+            "total_batches": self.total_batches,
+            "total_operations": self.total_operations,
+            "last_flush_seconds": self.last_flush_seconds,
+        }
+
+    def __submit(self, operation):
+        if self.running:
+            self.__queue.put(operation)
+        else:
+            with self.__lock:
+                self.__apply([operation])
+
+    def __run(self):
+        stopping = False
+        while not stopping:
+            operation = self.__queue.get()
+            if operation is None:
+                break
+            batch = [operation]
+
+            # Group everything that arrives within the flush interval, up to the batch size.
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    operation = self.__queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if operation is None:
+                    stopping = True
+                    break
+                batch.append(operation)
+
+            with self.__lock:
+                self.__apply(batch)
+
+        # Drain anything that was queued while stopping.
+        remaining = []
+        while True:
+            try:
+                operation = self.__queue.get_nowait()
+            except queue.Empty:
+                break
+            if operation is not None:
+                remaining.append(operation)
+        with self.__lock:
+            self.__apply(remaining)
+
+    def __apply(self, batch: list):
+        if not batch:
+            return
+        started = time.perf_counter()
+        for operation in batch:
+            try:
+                if operation[0] == "record":
+                    self.storage.write(operation[1], operation[2])
+                else:
+                    operation[1](*operation[2])
+            except Exception as error:
+                server_logger.error(f"Exception - Could not persist {operation[0]} operation")
+                server_logger.error(error)
+        try:
+            self.storage.commit()
+        except Exception as error:
+            server_logger.error("Exception - Could not commit the storage")
+            server_logger.error(error)
+        self.last_flush_seconds = time.perf_counter() - started
+        metrics.PERSISTENCE_FLUSH_SECONDS.observe(self.last_flush_seconds)
+        profiling.STAGE_TIMES.record("persistence", self.last_flush_seconds)
+        self.total_batches += 1
+        self.total_operations += len(batch)
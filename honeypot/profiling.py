@@ -0,0 +1,161 @@
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from datetime import datetime
+from honeypot.logger import server_logger
+
+# Stages of a connection, in the order they happen.
+STAGES = ("accept", "banner_delay", "handshake", "auth", "channel_open", "persistence")
+# Commands are timed one by one, as "command:<name>", and listed after the stages.
+COMMAND_STAGE_PREFIX = "command:"
+
+
+def stage_order(stage: str) -> tuple:
+    return (STAGES.index(stage), "") if stage in STAGES else (len(STAGES), stage)
+
+
+def percentile(values: list, fraction: float) -> float:
+    return values[min(int(len(values) * fraction), len(values) - 1)] if values else 0.0
+
+
+class StageTimes:
+    def __init__(self, window: int = 1024):
+        """ The last `window` durations of every stage, for rolling percentiles.
+
+        Snapshots from other processes, the workers of a multi-process server, are merged in when
+        the percentiles are computed, so the supervisor reports the stages of the whole server.
+        """
+        self.window = window
+        self.__lock = threading.Lock()
+        # stage -> durations, oldest first
+        self.__samples = {}
+        self.__totals = Counter()
+        # source -> snapshot
+        self.__remote = {}
+
+    def record(self, stage: str, seconds: float):
+        with self.__lock:
+            samples = self.__samples.get(stage)
+            if samples is None:
+                samples = self.__samples[stage] = deque(maxlen=self.window)
+            samples.append(seconds)
+            self.__totals[stage] += 1
+
+    @contextmanager
+    def time(self, stage: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - started)
+
+    def snapshot(self) -> dict:
+        """ stage -> (count, durations) of this process. """
+        with self.__lock:
+            return {stage: (self.__totals[stage], list(values)) for stage, values in self.__samples.items()}
+
+    def update_remote(self, source: str, snapshot: dict):
+        with self.__lock:
+            self.__remote[source] = snapshot
+
+    def retire_remote(self, source: str):
+        with self.__lock:
+            self.__remote.pop(source, None)
+
+    def percentiles(self) -> dict:
+        with self.__lock:
+            samples = {stage: list(values) for stage, values in self.__samples.items()}
+            totals = Counter(self.__totals)
+            for snapshot in self.__remote.values():
+                for stage, (count, values) in snapshot.items():
+                    samples.setdefault(stage, []).extend(values)
+                    totals[stage] += count
+        samples = {stage: sorted(values) for stage, values in samples.items()}
+        return {stage: {
+            "count": totals[stage],
+            "p50": percentile(samples[stage], 0.50),
+            "p90": percentile(samples[stage], 0.90),
+            "p99": percentile(samples[stage], 0.99),
+            "max": samples[stage][-1],
+        } for stage in sorted(samples, key=stage_order)}
+
+    def clear(self):
+        with self.__lock:
+            self.__samples.clear()
+            self.__totals.clear()
+            self.__remote.clear()
+
+
+class SamplingProfiler:
+    def __init__(self, interval: float = 0.005):
+        """ Samples the stacks of every thread every `interval` seconds for a while, then writes them
+        as folded stacks (`thread;outer;inner count` per line), the input of flamegraph.pl and speedscope.
+        """
+        self.interval = interval
+        self.__lock = threading.Lock()
+        self.__thread = None
+        self.__stopped = threading.Event()
+        self.last_profile = None
+
+    @property
+    def running(self) -> bool:
+        return self.__thread is not None and self.__thread.is_alive()
+
+    def start(self, duration: float, directory: str, name: str = "profile") -> str | None:
+        """ Profile for `duration` seconds in the background, into `<name>-<time>.folded`. Returns the output path, or None if a profile is already running. """
+        with self.__lock:
+            if self.running:
+                return None
+            os.makedirs(directory, exist_ok=True)
+            path = os.path.join(directory, f"{name}-{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}.folded")
+            self.__stopped.clear()
+            self.__thread = threading.Thread(target=self.__run, args=(duration, path), daemon=True, name="profiler")
+            self.__thread.start()
+        server_logger.info(f"Profiling every thread for {duration} seconds into {path}")
+        return path
+
+    def stop(self):
+        self.__stopped.set()
+        if self.__thread is not None:
+            self.__thread.join()
+
+    def __run(self, duration: float, path: str):
+        stacks = Counter()
+        samples = 0
+        own = threading.get_ident()
+        deadline = time.monotonic() + duration
+        while time.monotonic() < deadline and not self.__stopped.is_set():
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident != own:
+                    stacks[self.__fold(names.get(ident, str(ident)), frame)] += 1
+            samples += 1
+            self.__stopped.wait(self.interval)
+
+        temporary_path = f"{path}.tmp"
+        with open(temporary_path, "w") as profile_file:
+            for stack, count in stacks.most_common():
+                profile_file.write(f"{stack} {count}\n")
+        os.replace(temporary_path, path)
+        self.last_profile = path
+        server_logger.info(f"Wrote {samples} profile samples to {path}")
+
+    @staticmethod
+    def __fold(thread_name: str, frame) -> str:
+        frames = []
+        while frame is not None:
+            code = frame.f_code
+            frames.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+            frame = frame.f_back
+        # Pool threads are merged into one root, "session_3" becomes "session".
+        frames.append(re.sub(r"[_-]\d+$", "", thread_name))
+        return ";".join(reversed(frames))
+
+
+# Shared by the server, the sessions and the webserver of this process.
+STAGE_TIMES = StageTimes()
+PROFILER = SamplingProfiler()
@@ -0,0 +1,74 @@
+import random
+import threading
+import time
+from collections import OrderedDict
+from honeypot import metrics
+
+RATE_LIMIT_POLICIES = ("slow", "sample", "drop")
+
+
+class RateLimiter:
+    def __init__(self, rate: float, burst: float, policy: str = "slow", max_entries: int = 10000, sample_rate: float = 0.1, name: str = "connection"):
+        """ Per-IP token buckets, `rate` tokens per second up to `burst`, in a bounded LRU table.
+
+        Over-limit sources are slowed, sampled (a `sample_rate` fraction gets through) or dropped,
+        depending on `policy`. A rate of 0 disables the limiter. `name` labels its metrics.
+        """
+        if policy not in RATE_LIMIT_POLICIES:
+            raise ValueError(f"Unknown rate limit policy: {policy}")
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.policy = policy
+        self.max_entries = max_entries
+        self.sample_rate = sample_rate
+        self.name = name
+        self.__lock = threading.Lock()
+        # ip -> [tokens, last refill], least recently seen first.
+        self.__buckets = OrderedDict()
+        self.total_allowed = 0
+        self.total_limited = 0
+        self.total_evicted = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0
+
+    def admit(self, ip: str) -> str:
+        """ Take a token for `ip`. Returns "allow", or "slow" or "drop" for an over-limit source. """
+        if not self.enabled:
+            return "allow"
+        now = time.monotonic()
+        with self.__lock:
+            bucket = self.__buckets.get(ip)
+            if bucket is None:
+                bucket = self.__buckets[ip] = [self.burst, now]
+                # The least recently seen source is forgotten once the table is full.
+                if len(self.__buckets) > self.max_entries:
+                    self.__buckets.popitem(last=False)
+                    self.total_evicted += 1
+                    metrics.RATE_LIMIT_EVICTIONS.inc(self.name)
+            else:
+                self.__buckets.move_to_end(ip)
+                bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+                bucket[1] = now
+            if bucket[0] >= 1:
+                bucket[0] -= 1
+                self.total_allowed += 1
+                return "allow"
+            self.total_limited += 1
+
+        if self.policy == "sample":
+            decision = "allow" if random.random() < self.sample_rate else "drop"
+            metrics.RATE_LIMIT_DECISIONS.inc(self.name, "sampled" if decision == "allow" else "dropped")
+            return decision
+        metrics.RATE_LIMIT_DECISIONS.inc(self.name, "slowed" if self.policy == "slow" else "dropped")
+        return self.policy
+
+    def stats(self) -> dict:
+        with self.__lock:
+            return {
+                "tracked": len(self.__buckets),
+                "total_allowed": self.total_allowed,
+                "total_limited": self.total_limited,
+                "total_evicted": self.total_evicted,
+            }
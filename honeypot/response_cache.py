@@ -0,0 +1,58 @@
+import threading
+from collections import OrderedDict
+
+# How a command's response may be reused, as declared by the command.
+# pure: the same for the same arguments on the same host, like `uname -a`.
+# session: also depends on the logged in user, like `whoami`.
+# time: depends on the clock or the session, like `date`, never cached.
+CACHING_KINDS = ("pure", "session", "time")
+
+
+class ResponseCache:
+    def __init__(self, max_entries: int = 1024):
+        """ Responses of deterministic commands in a bounded LRU table. A size of 0 disables the cache. """
+        self.max_entries = max_entries
+        self.__lock = threading.Lock()
+        # key -> response, least recently used first.
+        self.__entries = OrderedDict()
+        self.total_hits = 0
+        self.total_misses = 0
+        self.total_evicted = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def get(self, key):
+        """ The cached response for `key`, or None. """
+        with self.__lock:
+            response = self.__entries.get(key)
+            if response is None:
+                self.total_misses += 1
+                return None
+            self.__entries.move_to_end(key)
+            self.total_hits += 1
+            return response
+
+    def put(self, key, response):
+        with self.__lock:
+            self.__entries[key] = response
+            self.__entries.move_to_end(key)
+            if len(self.__entries) > self.max_entries:
+                self.__entries.popitem(last=False)
+                self.total_evicted += 1
+
+    def clear(self):
+        with self.__lock:
+            self.__entries.clear()
+
+    def stats(self) -> dict:
+        with self.__lock:
+            lookups = self.total_hits + self.total_misses
+            return {
+                "entries": len(self.__entries),
+                "total_hits": self.total_hits,
+                "total_misses": self.total_misses,
+                "total_evicted": self.total_evicted,
+                "hit_rate": round(self.total_hits / lookups, 3) if lookups else 0.0,
+            }
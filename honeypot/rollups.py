@@ -0,0 +1,138 @@
+import json
+import os
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from honeypot.logger import server_logger
+
+# Dimensions counted per day at write time, next to the total.
+ROLLUP_DIMENSIONS = {
+    "connection": ("ip",),
+    "login": ("ip", "username", "successfull_login"),
+    "command": ("ip", "username"),
+}
+TOTAL = "total"
+PERIODS = ("day", "week", "month")
+
+
+def rollup_keys(event_type: str, record: dict) -> list:
+    """ (dimension, key) pairs a record is counted under, keys are JSON encoded. """
+    return [(TOTAL, "null")] + [(dimension, json.dumps(record.get(dimension))) for dimension in ROLLUP_DIMENSIONS[event_type]]
+
+
+def period_start(day: str, period: str) -> str:
+    """ First day of the week (Monday) or month (YYYY-MM) that `day` is in. """
+    if period == "day":
+        return day
+    if period == "week":
+        date = datetime.strptime(day, "%Y-%m-%d")
+        return (date - timedelta(days=date.weekday())).strftime("%Y-%m-%d")
+    if period == "month":
+        return day[:7]
+    raise ValueError(f"Unknown period: {period}")
+
+
+def period_counts(rows, period: str) -> list:
+    """ Sum daily (day, key, count) rows per week or month. """
+    counts = Counter()
+    for day, key, count in rows:
+        counts[(period_start(day, period), key)] += count
+    return sorted(((start, key, count) for (start, key), count in counts.items()), key=lambda item: (item[0], str(item[1])))
+
+
+class RollupStore:
+    def __init__(self, directory: str, save_interval: float = 30.0):
+        """ Daily counts per dimension for the journal, one JSON file per event type and day.
+
+        Each file also holds the journal offset it counts up to, so records committed to the
+        journal after the last save are folded in again when the rollups are loaded.
+        """
+        self.directory = directory
+        self.save_interval = save_interval
+        self.__lock = threading.Lock()
+        # (event_type, day) -> {"offset": int, "counts": {dimension: Counter of encoded keys}}
+        self.__days = {}
+        self.__dirty = set()
+        self.__last_save = float("-inf")
+
+    def path(self, event_type: str, day: str) -> str:
+        return os.path.join(self.directory, event_type, f"{day}.json")
+
+    def days(self, event_type: str) -> list:
+        """ Sorted list of days that have a saved rollup for `event_type`. """
+        directory = os.path.join(self.directory, event_type)
+        if not os.path.isdir(directory):
+            return []
+        return sorted(filename[:-5] for filename in os.listdir(directory) if filename.endswith(".json"))
+
+    def load(self, event_type: str, day: str) -> int:
+        """ Load the rollup of one day from disk, returns the journal offset it counts up to. """
+        try:
+            with open(self.path(event_type, day)) as rollup_file:
+                data = json.load(rollup_file)
+            entry = {"offset": data["offset"], "counts": {dimension: Counter(counts) for dimension, counts in data["counts"].items()}}
+        except FileNotFoundError:
+            entry = {"offset": 0, "counts": {}}
+        except (ValueError, KeyError) as error:
+            # Rollups can always be rebuilt from the journal.
+            server_logger.error(f"Exception - Could not load rollup {self.path(event_type, day)}, rebuilding it")
+            server_logger.error(error)
+            entry = {"offset": 0, "counts": {}}
+        with self.__lock:
+            self.__days[(event_type, day)] = entry
+        return entry["offset"]
+
+    def reset(self, event_type: str, day: str):
+        """ Drop the counts of one day, before it is counted again from the start of its partition. """
+        with self.__lock:
+            self.__days[(event_type, day)] = {"offset": 0, "counts": {}}
+            self.__dirty.add((event_type, day))
+
+    def add(self, event_type: str, record: dict):
+        day = record["timestamp"][:10]
+        with self.__lock:
+            entry = self.__days.setdefault((event_type, day), {"offset": 0, "counts": {}})
+            for dimension, key in rollup_keys(event_type, record):
+                entry["counts"].setdefault(dimension, Counter())[key] += 1
+            self.__dirty.add((event_type, day))
+
+    def set_offset(self, event_type: str, day: str, offset: int):
+        with self.__lock:
+            entry = self.__days.setdefault((event_type, day), {"offset": 0, "counts": {}})
+            entry["offset"] = offset
+            self.__dirty.add((event_type, day))
+
+    def dirty_days(self) -> list:
+        with self.__lock:
+            return list(self.__dirty)
+
+    def counts(self, event_type: str, dimension: str = TOTAL, start: str | None = None, end: str | None = None) -> list:
+        """ Sorted (day, key, count) rows of one dimension between `start` and `end` (inclusive, YYYY-MM-DD). """
+        rows = []
+        with self.__lock:
+            for (entry_type, day), entry in self.__days.items():
+                if entry_type != event_type or (start and day < start) or (end and day > end):
+                    continue
+                rows.extend((day, json.loads(key), count) for key, count in entry["counts"].get(dimension, {}).items())
+        return sorted(rows, key=lambda item: (item[0], str(item[1])))
+
+    def save(self, force: bool = False) -> bool:
+        """ Write the rollups changed since the last save, at most once per `save_interval` unless forced. """
+        now = time.monotonic()
+        with self.__lock:
+            if not self.__dirty or (not force and now - self.__last_save < self.save_interval):
+                return False
+            self.__last_save = now
+            entries = {key: {"offset": self.__days[key]["offset"], "counts": {dimension: dict(counts) for dimension, counts in self.__days[key]["counts"].items()}} for key in self.__dirty}
+            self.__dirty.clear()
+
+        for (event_type, day), entry in entries.items():
+            path = self.path(event_type, day)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write to a temporary file and rename it, so a crash never leaves a partial rollup.
+            temporary_path = f"{path}.tmp"
+            with open(temporary_path, "w") as rollup_file:
+                json.dump(entry, rollup_file, separators=(",", ":"))
+            os.replace(temporary_path, path)
+        return True
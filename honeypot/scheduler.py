@@ -0,0 +1,75 @@
+import heapq
+import itertools
+import threading
+import time
+from honeypot.logger import server_logger
+
+
+class DelayScheduler:
+    def __init__(self, name: str = "scheduler"):
+        """ Runs delayed callbacks on a single background thread. """
+        self.name = name
+        self.__queue = []
+        self.__counter = itertools.count()
+        self.__condition = threading.Condition()
+        self.__thread = None
+        self.running = False
+
+    def start(self):
+        with self.__condition:
+            if self.running:
+                return
+            self.running = True
+        self.__thread = threading.Thread(target=self.__run, daemon=True, name=self.name)
+        self.__thread.start()
+
+    def schedule(self, delay: float, callback, *args):
+        """ Schedule `callback(*args)` to run after `delay` seconds without blocking the caller. """
+        entry = [time.monotonic() + max(delay, 0), next(self.__counter), callback, args]
+        with self.__condition:
+            heapq.heappush(self.__queue, entry)
+            # Wake the worker if the new entry is due before the one it is waiting on.
+            if self.__queue[0] is entry:
+                self.__condition.notify()
+        return entry
+
+    def cancel(self, entry):
+        """ Cancel a scheduled entry, it will be skipped once it becomes due. """
+        with self.__condition:
+            entry[2] = None
+
+    @property
+    def pending(self) -> int:
+        with self.__condition:
+            return len(self.__queue)
+
+    def stop(self):
+        with self.__condition:
+            self.running = False
+            self.__condition.notify()
+        if self.__thread and self.__thread is not threading.current_thread():
+            self.__thread.join()
+
+    def __run(self):
+        while True:
+            with self.__condition:
+                while self.running:
+                    if not self.__queue:
+                        self.__condition.wait()
+                        continue
+                    timeout = self.__queue[0][0] - time.monotonic()
+                    if timeout <= 0:
+                        break
+                    self.__condition.wait(timeout)
+                if not self.running:
+                    return
+                _, _, callback, args = heapq.heappop(self.__queue)
+
+            if callback is None:
+                continue
+            # Callbacks run on the scheduler thread and must hand off any slow work.
+            try:
+                callback(*args)
+            except Exception as error:
+                server_logger.error(f"Exception - Scheduled callback {callback} failed")
+                server_logger.error(error)
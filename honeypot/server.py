@@ -1,16 +1,55 @@
+import copy
+import multiprocessing
+import queue
+import selectors
+import signal
 import socket
 import threading
 import time
+from functools import partial
+from ssh.dispatch import DISPATCHER
 from ssh.handlers import client_handle 
-from honeypot.logger import funnel_logger, server_logger
-from honeypot.objects import HoneypotSettings
+from ssh.transport import validate_algorithms
+from honeypot import metrics, profiling
+from honeypot.logger import forward_logs, funnel_logger, receive_logs, server_logger
+from honeypot.objects import Endpoint, HoneypotSettings
+from honeypot.scheduler import DelayScheduler
+from honeypot.session_pool import SessionPool
+from honeypot.tarpit import Tarpit
 import os
-import json
-from datetime import datetime, timedelta
+from honeypot.columnar import ColumnarStore, available as columnar_available
+from honeypot.counters import CounterStore
+from honeypot.persistence import PersistenceWriter
+from honeypot.rate_limiter import RateLimiter
+from honeypot.response_cache import ResponseCache
+from honeypot.storage import ForwardingStorage, JournalStorage, create_storage
 from honeypot.webserver import app
 
 class HoneypotServer:
-    def __init__(self, settings: HoneypotSettings| None = None):
+    def __init__(self, settings: HoneypotSettings| None = None, events=None, worker_id: int | None = None, listeners: list | None = None, commands=None):
+        """ With `workers` above one, this process only supervises worker processes listening on the same ports.
+
+        A worker is given the supervisor's `events` queue and sends its records, metrics and stage timings
+        there, reads requests from the supervisor, like starting a profile, from its own `commands` queue,
+        and accepts on the inherited `listeners`, one per endpoint, when the platform has no SO_REUSEPORT.
+        """
+        self.settings = settings
+        self.workers = settings.workers
+        self.worker_id = worker_id
+        self.events = events
+        self.commands = commands
+        self.source = f"worker-{worker_id}-{os.getpid()}" if events is not None else None
+        self.listeners = listeners
+        self.endpoints = [endpoint.resolve(settings) for endpoint in settings.endpoints or [Endpoint(settings.address, settings.port)]]
+        # One listening socket per endpoint, server_socket is the first of them.
+        self.server_sockets = []
+        self.worker_processes = []
+        # worker id -> commands queue of the running worker process
+        self.worker_commands = {}
+        self.worker_events = None
+        self.worker_logs = None
+        self.log_receiver = None
+        self.metrics_interval = 5
         self.address = settings.address
         self.port = settings.port
         self.username = settings.username
@@ -18,23 +57,70 @@ class HoneypotServer:
         self.hostname = settings.hostname
         self.concurrent_connections = settings.concurrent_connections
         self.server_socket = None
-        self.client_threads = []
-        self.client_sockets = []
+        self.client_sockets = set()
         self.running = True
         self.banner_enabled = settings.banner
         self.banner_delay = settings.delay
         self.logger = None
         self.banner_message = settings.banner_message
+        self.scheduler = DelayScheduler(name="banner-scheduler")
+        self.session_report_interval = 60
+        # Tarpit mode holds every connection, the "tarpit" overflow policy only those over the session limit, for at most tarpit_duration seconds.
+        self.tarpit_mode = settings.tarpit_mode
+        self.tarpit = None
+        if self.workers <= 1:
+            if settings.tarpit_mode:
+                self.tarpit = Tarpit(drip_interval=settings.tarpit_drip_interval, max_connections=settings.tarpit_max_connections, max_hold=settings.tarpit_max_hold)
+            elif settings.overflow_policy == "tarpit":
+                self.tarpit = Tarpit(drip_interval=settings.tarpit_drip_interval, max_connections=settings.max_queued_connections, max_hold=settings.tarpit_duration)
+        self.session_pool = SessionPool(max_sessions=settings.concurrent_connections, max_queued=settings.max_queued_connections, overflow_policy=settings.overflow_policy, tarpit=self.tarpit)
         self.env_directory = settings.env_directory
         self.json_env = "client_connections.json"
         self.connections_path = os.path.join(self.env_directory, "connections")
         self.json_path = os.path.join(self.connections_path, self.json_env)
+        # Workers forward their records, the supervisor is the only writer of the env directory.
+        self.storage = ForwardingStorage(events, self.source, settings.storage_backend) if events is not None else create_storage(settings.storage_backend, self.env_directory)
+        self.persistence = PersistenceWriter(self.storage, batch_size=settings.persistence_batch_size, flush_interval=settings.persistence_flush_interval)
+        # Per-IP and per-username totals live in memory and are snapshotted on an interval.
+        self.connection_counts = CounterStore(self.json_path)
+        self.username_counts = CounterStore(os.path.join(self.env_directory, "logins", "client_logins.json"))
+        self.counter_snapshot_interval = settings.counter_snapshot_interval
+        self.columnar = ColumnarStore(self.env_directory)
+        self.compaction_interval = settings.compaction_interval
+        # Daily counts of compacted days are read from their Parquet copies instead of the journal.
+        if columnar_available() and isinstance(self.storage, JournalStorage):
+            self.storage.columnar = self.columnar
+        self.compaction_thread = None
+        self.connection_limiter = RateLimiter(settings.connection_rate, settings.connection_burst, policy=settings.rate_limit_policy, max_entries=settings.rate_limit_entries, sample_rate=settings.rate_limit_sample, name="connection")
+        self.auth_limiter = RateLimiter(settings.auth_rate, settings.auth_burst, policy=settings.rate_limit_policy, max_entries=settings.rate_limit_entries, sample_rate=settings.rate_limit_sample, name="auth")
+        self.rate_limit_delay = settings.rate_limit_delay
+        self.profile_duration = settings.profile_duration
+        self.profile_directory = os.path.join(self.env_directory, "profiles")
+        profiling.PROFILER.interval = settings.profile_interval
+        # Shared by every session of this process, each worker has its own.
+        DISPATCHER.cache = ResponseCache(settings.response_cache_entries)
+        # Imported here, ssh.host_keys logs through honeypot.logger and importing it first would enter honeypot before ssh is initialized.
+        from ssh.host_keys import HostKeyCache
+        self.host_keys = HostKeyCache(key_directory=settings.host_key_directory, algorithms=settings.host_key_algorithms)
+        validate_algorithms(settings.kex_algorithms, settings.ciphers)
+        self.kex_algorithms = settings.kex_algorithms
+        self.ciphers = settings.ciphers
+        self.banner_timeout = settings.banner_timeout
+        self.auth_timeout = settings.auth_timeout
+        self.window_size = settings.window_size
+        self.max_packet_size = settings.max_packet_size
         self.webserver_enabled = settings.webserver_enabled
         self.webserver_port = settings.webserver_port
         self.webserver_address = settings.webserver_address
+        self.webserver_admin = settings.webserver_admin
         self.webserver_thread = None    
         self.server_logger = server_logger
         self.app = app
+        metrics.ACTIVE_SESSIONS.set_function(lambda: self.session_pool.active)
+        metrics.QUEUED_SESSIONS.set_function(lambda: self.session_pool.queued)
+        metrics.PERSISTENCE_QUEUE_DEPTH.set_function(lambda: self.persistence.queue_depth)
+        metrics.TARPIT_HELD.set_function(lambda: self.tarpit.held if self.tarpit is not None else 0)
+        metrics.RESPONSE_CACHE_ENTRIES.set_function(lambda: DISPATCHER.cache.stats()["entries"])
         os.makedirs(self.env_directory, exist_ok=True)
         
         if self.webserver_enabled:
@@ -46,11 +132,14 @@ class HoneypotServer:
 
     def start_webserver(self):
         from threading import Thread
-        from .webserver import app, set_env_directory
+        from .webserver import app, set_admin, set_env_directory, set_counters, set_storage
         from waitress import serve
         
         def run():
             set_env_directory(self.env_directory)
+            set_storage(self.storage)
+            set_counters(connection_counts=self.connection_counts, username_counts=self.username_counts)
+            set_admin(self.webserver_admin, start_profile=self.start_profile)
             self.server_logger.info(f"Webserver running on {self.webserver_address}:{self.webserver_port}")
             serve(self.app, host=self.webserver_address, port=self.webserver_port)
 
@@ -63,65 +152,319 @@ class HoneypotServer:
 
     def start(self):
         server_logger.info("Starting honeypot server.")
+        # Load or generate the host keys before the first connection can race to create them.
+        self.host_keys.load()
         
-        self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        self.server_socket.bind((self.address, self.port))
-        
-        self.server_socket.listen(self.concurrent_connections)
-        server_logger.info(f"Honeypot server is listening on {self.address}:{self.port}")
-        server_logger.info(f"Connection banner enabled: {self.banner_enabled}")
-        server_logger.info(f"Connection delay: {self.banner_delay} seconds")
+        self.server_sockets = self.listen()
+        self.server_socket = self.server_sockets[0]
+        for endpoint in self.endpoints:
+            server_logger.info(f"Honeypot server is listening on {endpoint}, hostname: {endpoint.hostname}, banner: {endpoint.banner}, delay: {endpoint.delay} seconds")
+            if endpoint.username:
+                server_logger.info(f"Permitted username on {endpoint}: {endpoint.username}")
+            if endpoint.password:
+                server_logger.info(f"Permitted password on {endpoint}: {endpoint.password}")
         server_logger.info(f"Concurrent connections allowed: {self.concurrent_connections}")
-        if self.username:
-            server_logger.info(f"Permitted username: {self.username}")
-        if self.password:
-            server_logger.info(f"Permitted password: {self.password}")
+        server_logger.info(f"Queued connections allowed: {self.session_pool.max_queued}, overflow policy: {self.session_pool.overflow_policy}")
+        server_logger.info(f"Rate limits per IP: {self.connection_limiter.rate} connections/s, {self.auth_limiter.rate} auth attempts/s, policy: {self.connection_limiter.policy}")
+        if self.tarpit is not None:
+            server_logger.info(f"{'Tarpit mode' if self.tarpit_mode else 'Overflow tarpit'}: holding up to {self.tarpit.max_connections} connections, one banner line every {self.tarpit.drip_interval} seconds")
+            self.tarpit.start()
+        self.scheduler.start()
+        self.persistence.start()
+        self.scheduler.schedule(self.session_report_interval, self.report_sessions)
+        if self.events is None:
+            self.scheduler.schedule(self.counter_snapshot_interval, self.snapshot_counters)
+        else:
+            self.scheduler.schedule(self.metrics_interval, self.publish_metrics)
+            self.scheduler.schedule(1, self.read_commands)
+        if self.compaction_interval and columnar_available():
+            self.scheduler.schedule(self.compaction_interval, self.compact_closed_days)
+        elif self.compaction_interval and self.events is None:
+            server_logger.warning("Columnar compaction is disabled, pyarrow is not installed: pip install pyarrow")
+        # `kill -USR1 <pid>` profiles the running server, signals can only be handled on the main thread.
+        if hasattr(signal, "SIGUSR1") and threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGUSR1, self.start_profile)
         
         try:
+            if self.workers > 1:
+                self.supervise()
+                return
+            # Every endpoint is accepted on this thread, the selector says which one has a connection waiting.
+            selector = selectors.DefaultSelector()
+            for endpoint, server_socket in zip(self.endpoints, self.server_sockets):
+                server_socket.setblocking(False)
+                selector.register(server_socket, selectors.EVENT_READ, endpoint)
             while self.running:
-                try:
-                    client_socket, addr = self.server_socket.accept()
-                    self.client_sockets.append(client_socket)
-                    server_logger.info(f"Incoming connection from {addr[0]}:{addr[1]}")
-                    self.add_connection(client_ip=addr[0], client_port=addr[1])                    
-                    if self.banner_enabled:
-                        server_logger.info(f"Sending banner to {addr[0]}:{addr[1]}")
-                        banner_message = "Connecting...\n"
-                        client_socket.send(banner_message.encode())
-                        time.sleep(self.banner_delay)
-                        
-                    client_thread = threading.Thread(target=self.handle_client, args=(client_socket, addr))
-                    client_thread.start()
-                    server_logger.info(f"Started new thread to handle client connection from {addr[0]}:{addr[1]}")
-                    self.client_threads.append(client_thread)
-                    
-                except Exception as error:
-                    server_logger.error("Exception - Could not open new client connection")
-                    server_logger.error(error)
+                for key, _ in selector.select(timeout=1):
+                    try:
+                        self.accept_client(key.fileobj, key.data)
+                    except Exception as error:
+                        server_logger.error("Exception - Could not open new client connection")
+                        server_logger.error(error)
                     
         except KeyboardInterrupt:
             server_logger.info("Server shutting down.")
             self.stop()
+
+    def accept_client(self, server_socket: socket.socket, endpoint: Endpoint):
+        try:
+            client_socket, addr = server_socket.accept()
+        except BlockingIOError:
+            # Another worker on the same port accepted it first.
+            return
+        accepted = time.perf_counter()
+        client_socket.setblocking(True)
+        # Over-limit sources are dropped before they cost a log line, a write or a handshake.
+        admission = self.connection_limiter.admit(addr[0])
+        if admission == "drop":
+            metrics.CONNECTIONS.inc("rate_limited")
+            client_socket.close()
+            return
+        server_logger.info(f"Incoming connection from {addr[0]}:{addr[1]} on {endpoint}")
+        self.add_connection(client_ip=addr[0], client_port=addr[1])
+        if self.tarpit_mode and self.tarpit is not None:
+            if self.tarpit.hold(client_socket, addr):
+                metrics.CONNECTIONS.inc("tarpit")
+            else:
+                metrics.CONNECTIONS.inc("tarpit_full")
+                client_socket.close()
+            return
+        self.client_sockets.add(client_socket)
+        metrics.CONNECTIONS.inc("slowed" if admission == "slow" else "accepted")
+        delay = endpoint.delay if endpoint.banner else 0
+        if admission == "slow":
+            delay += self.rate_limit_delay
+        if endpoint.banner:
+            server_logger.info(f"Sending banner to {addr[0]}:{addr[1]}")
+            banner_message = "Connecting...\n"
+            client_socket.send(banner_message.encode())
+        if delay:
+            # Hand the delay to the scheduler so the accept loop is never blocked by it.
+            self.scheduler.schedule(delay, self.dispatch_client, client_socket, addr, endpoint, accepted)
+        else:
+            self.dispatch_client(client_socket, addr, endpoint)
+        profiling.STAGE_TIMES.record("accept", time.perf_counter() - accepted)
+
+    def listen(self) -> list:
+        if self.listeners is not None:
+            return self.listeners
+        reuse_port = hasattr(socket, "SO_REUSEPORT") and (self.workers > 1 or self.events is not None)
+        server_sockets = []
+        for endpoint in self.endpoints:
+            # The address family follows the address, so IPv6 endpoints like `[::]:2222` bind too.
+            family, socket_type, protocol, _, socket_address = socket.getaddrinfo(endpoint.address, endpoint.port, type=socket.SOCK_STREAM, flags=socket.AI_PASSIVE)[0]
+            server_socket = socket.socket(family, socket_type, protocol)
+            server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            if reuse_port:
+                # Every worker has its own accept queue on the port and the kernel spreads connections over them.
+                server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+            server_socket.bind(socket_address)
+            # The supervisor only holds the port for its workers, a listening socket would take connections nobody accepts.
+            if self.workers <= 1 or not reuse_port:
+                server_socket.listen(self.concurrent_connections)
+            server_sockets.append(server_socket)
+        return server_sockets
+
+    def supervise(self):
+        """ Run the workers and write everything they send until the server is stopped. """
+        context = multiprocessing.get_context("spawn")
+        self.worker_events = context.Queue()
+        self.worker_logs = context.Queue()
+        self.log_receiver = receive_logs(self.worker_logs)
+        for worker_id in range(self.workers):
+            self.worker_processes.append(self.start_worker(context, worker_id))
+        server_logger.info(f"Started {self.workers} worker processes on {', '.join(str(endpoint) for endpoint in self.bound_endpoints())}")
+        while self.running:
+            self.collect_events(timeout=1)
+            for worker_id, process in enumerate(self.worker_processes):
+                if not process.is_alive() and self.running:
+                    server_logger.error(f"Worker {worker_id} exited with code {process.exitcode}, restarting it")
+                    self.worker_processes[worker_id] = self.start_worker(context, worker_id)
+
+    def start_worker(self, context, worker_id: int):
+        settings = copy.copy(self.settings)
+        settings.workers = 1
+        settings.endpoints = self.bound_endpoints()
+        # The webserver, compaction and counter snapshots stay with the supervisor.
+        settings.webserver_enabled = False
+        settings.compaction_interval = 0
+        # Budgets are split between the workers, so -n does not multiply the limits set for the whole server.
+        # The kernel spreads connections evenly, an IP's connections too, so per-IP rates are split the same way.
+        for name in ("connection_rate", "auth_rate"):
+            setattr(settings, name, getattr(settings, name) / self.workers)
+        for name in ("connection_burst", "auth_burst", "concurrent_connections", "max_queued_connections", "tarpit_max_connections"):
+            setattr(settings, name, max(getattr(settings, name) // self.workers, 1))
+        # Without SO_REUSEPORT the workers accept on the supervisor's socket.
+        listeners = None if hasattr(socket, "SO_REUSEPORT") else self.server_sockets
+        self.worker_commands[worker_id] = context.Queue()
+        process = context.Process(target=run_worker, args=(settings, worker_id, self.worker_events, self.worker_logs, listeners, self.worker_commands[worker_id]), name=f"honeypot-worker-{worker_id}")
+        process.start()
+        return process
+
+    def bound_endpoints(self) -> list:
+        """ The endpoints with the ports actually bound, port 0 picks a free one. """
+        endpoints = []
+        for endpoint, server_socket in zip(self.endpoints, self.server_sockets):
+            endpoint = copy.copy(endpoint)
+            endpoint.port = server_socket.getsockname()[1]
+            endpoints.append(endpoint)
+        return endpoints
+
+    def collect_events(self, timeout: float) -> bool:
+        """ Apply one message from the workers. Returns False when none arrived within `timeout` seconds. """
+        try:
+            kind, source, payload = self.worker_events.get(timeout=timeout)
+        except queue.Empty:
+            return False
+        if kind == "records":
+            for event_type, record in payload:
+                self.persistence.record(event_type, record)
+                if event_type == "connection":
+                    self.connection_counts.increment(record["ip"])
+                elif event_type == "login":
+                    self.username_counts.increment(record["username"])
+        elif kind == "metrics":
+            metrics.REGISTRY.update_remote(source, payload)
+        elif kind == "stages":
+            profiling.STAGE_TIMES.update_remote(source, payload)
+        elif kind == "stopped":
+            metrics.REGISTRY.retire_remote(source)
+            profiling.STAGE_TIMES.retire_remote(source)
+        return True
+
+    def stop_workers(self):
+        for process in self.worker_processes:
+            if process.is_alive():
+                process.terminate()
+        # Keep reading while the workers flush, a worker cannot exit with data left in a full queue.
+        while any(process.is_alive() for process in self.worker_processes):
+            self.collect_events(timeout=0.1)
+        while self.collect_events(timeout=0.1):
+            pass
+        for process in self.worker_processes:
+            process.join()
+        if self.log_receiver is not None:
+            self.log_receiver.stop()
+
+    def publish_metrics(self):
+        self.events.put(("metrics", self.source, metrics.REGISTRY.snapshot()))
+        self.events.put(("stages", self.source, profiling.STAGE_TIMES.snapshot()))
+        if self.running:
+            self.scheduler.schedule(self.metrics_interval, self.publish_metrics)
+
+    def dispatch_client(self, client_socket: socket.socket, addr, endpoint: Endpoint, accepted: float | None = None):
+        if accepted is not None:
+            profiling.STAGE_TIMES.record("banner_delay", time.perf_counter() - accepted)
+        if not self.running:
+            client_socket.close()
+            return
+        if self.session_pool.submit(client_socket, addr, partial(self.handle_client, endpoint=endpoint)):
+            server_logger.info(f"Submitted client connection from {addr[0]}:{addr[1]} to the session pool")
+        else:
+            self.client_sockets.discard(client_socket)
         
-    def handle_client(self, client_socket: socket.socket, addr):
+    def handle_client(self, client_socket: socket.socket, addr, endpoint: Endpoint):
         try:
-            client_handle(client_socket, addr, self)
+            client_handle(client_socket, addr, self, endpoint)
         finally:
             client_socket.close()
+            self.client_sockets.discard(client_socket)
             server_logger.info(f"Closed connection to {addr[0]}:{addr[1]}")
             
+    def report_sessions(self):
+        if self.worker_processes:
+            server_logger.info(f"Workers: {sum(process.is_alive() for process in self.worker_processes)} of {self.workers} running")
+        stats = self.session_pool.stats()
+        server_logger.info(f"Sessions: {stats['active']} active, {stats['queued']} queued, {stats['tarpitted']} tarpitted, {stats['total_rejected']} rejected in total")
+        for name, limiter in (("Connection", self.connection_limiter), ("Auth", self.auth_limiter)):
+            if limiter.enabled:
+                limiter_stats = limiter.stats()
+                server_logger.info(f"{name} rate limit: {limiter_stats['tracked']} sources tracked, {limiter_stats['total_limited']} limited and {limiter_stats['total_evicted']} evicted in total")
+        if DISPATCHER.cache.enabled and not self.worker_processes:
+            cache_stats = DISPATCHER.cache.stats()
+            server_logger.info(f"Response cache: {cache_stats['entries']} entries, {cache_stats['hit_rate']:.1%} hit rate, {cache_stats['total_hits']} hits and {cache_stats['total_evicted']} evicted in total")
+        if self.tarpit is not None:
+            tarpit_stats = self.tarpit.stats()
+            server_logger.info(f"Tarpit: {tarpit_stats['held']} held, {tarpit_stats['total_held']} in total, {tarpit_stats['bytes_dripped']} bytes dripped, {tarpit_stats['average_hold_seconds']} seconds held on average")
+        if self.running:
+            self.scheduler.schedule(self.session_report_interval, self.report_sessions)
+            
+    def start_profile(self, *_, seconds: float | None = None):
+        """ Sample every thread for `seconds` (`profile_duration` by default), the folded stacks go to the profiles directory.
+
+        The supervisor of a multi-process server forwards the request to every worker, each writes its own
+        `profile-worker-<id>-<time>.folded` next to the supervisor's profile.
+        """
+        seconds = seconds or self.profile_duration
+        name = "profile" if self.events is None else f"profile-worker-{self.worker_id}"
+        path = profiling.PROFILER.start(seconds, self.profile_directory, name=name)
+        if path is None:
+            server_logger.warning("A profile is already running.")
+            return None
+        for commands in self.worker_commands.values():
+            commands.put(("profile", seconds))
+        return path
+
+    def read_commands(self):
+        # Requests the supervisor sent to this worker.
+        while True:
+            try:
+                command, argument = self.commands.get_nowait()
+            except queue.Empty:
+                break
+            if command == "profile":
+                self.start_profile(seconds=argument)
+        if self.running:
+            self.scheduler.schedule(1, self.read_commands)
+
+    def snapshot_counters(self):
+        # Workers only count in memory, the supervisor snapshots the counts of every worker.
+        if self.events is not None:
+            return
+        # The snapshot itself runs on the persistence thread, the scheduler only triggers it.
+        self.persistence.call(self.connection_counts.snapshot)
+        self.persistence.call(self.username_counts.snapshot)
+        if self.running:
+            self.scheduler.schedule(self.counter_snapshot_interval, self.snapshot_counters)
+            
+    def compact_closed_days(self):
+        # Compaction reads whole days, it runs on its own thread so the scheduler is never held up.
+        if self.compaction_thread is None or not self.compaction_thread.is_alive():
+            self.compaction_thread = threading.Thread(target=self.run_compaction, daemon=True, name="compaction")
+            self.compaction_thread.start()
+        if self.running:
+            self.scheduler.schedule(self.compaction_interval, self.compact_closed_days)
+
+    def run_compaction(self):
+        try:
+            self.columnar.compact(self.storage)
+        except Exception as error:
+            server_logger.error("Exception - Could not compact closed days")
+            server_logger.error(error)
+
     def stop(self):
         self.running = False
-        for client_socket in self.client_sockets:
+        self.scheduler.stop()
+        if self.tarpit is not None:
+            self.tarpit.stop()
+        for client_socket in list(self.client_sockets):
             try:
                 client_socket.close()
             except Exception as e:
                 server_logger.error(f"Error closing client socket: {e}")
-        if self.server_socket:
-            self.server_socket.close()
-        for client_thread in self.client_threads:
-            client_thread.join()
+        for server_socket in self.server_sockets:
+            server_socket.close()
+        self.session_pool.shutdown()
+        profiling.PROFILER.stop()
+        if self.worker_processes:
+            self.stop_workers()
+        self.snapshot_counters()
+        self.persistence.stop()
+        self.storage.close()
+        if self.events is not None:
+            self.events.put(("metrics", self.source, metrics.REGISTRY.snapshot()))
+            self.events.put(("stages", self.source, profiling.STAGE_TIMES.snapshot()))
+            self.events.put(("stopped", self.source, None))
         
         if self.webserver_thread:
             self.server_logger.info("Webserver has been stopped.")
@@ -132,126 +475,23 @@ class HoneypotServer:
         server_logger.info("All connections have been closed.")
         
     def add_connection(self, client_ip, client_port):
-        self.__add_connection_count(client_ip=client_ip)
-        self.__update_daily_log(client_ip=client_ip, client_port=client_port)
-        self.__update_weekly_log(client_ip=client_ip, client_port=client_port)
-        self.__update_monthly_log(client_ip=client_ip, client_port=client_port)
-        
-    def __add_connection_count(self, client_ip):
-        # Check if self.env_directory exists and create it if not
-        os.makedirs(self.env_directory, exist_ok=True)
-        os.makedirs(self.connections_path, exist_ok=True)
-        
-        # Check if the JSON file exists, create a new one with initial data if not
-        if not os.path.exists(self.json_path):
-            clients = {
-                client_ip: 1
-            }
-            server_logger.info(f"Created new clients file with initial client: {client_ip}")
-        else:
-            # Load existing client data from JSON file
-            with open(self.json_path, 'r') as json_file:
-                clients = json.load(json_file)
-            
-            # Check if the client_ip already exists, and update the connection count
-            if client_ip in clients:
-                clients[client_ip] += 1
-                server_logger.info(f"Updated connection count for client: {client_ip}")
-            else:
-                clients[client_ip] = 1
-                server_logger.info(f"Added new client: {client_ip}")
-
-        # Write updated client data back to the JSON file
-        with open(self.json_path, 'w') as json_file:
-            json.dump(clients, json_file, indent=4)
-            server_logger.info(f"Saved updated clients data to {self.json_path}")
-
-    def __update_daily_log(self, client_ip, client_port):
-        # Get the current date
-        current_date = datetime.now().strftime("%Y-%m-%d")
-        os.makedirs(self.connections_path, exist_ok=True)
-        daily_log_filename = os.path.join(self.connections_path, f"connections_{current_date}.json")
+        self.connection_counts.increment(client_ip)
+        # Daily, weekly and monthly views are derived from the storage, written by the persistence thread.
+        self.persistence.record("connection", {"ip": client_ip, "port": client_port})
 
-        # Check if the daily log file exists, create it if not
-        if not os.path.exists(daily_log_filename):
-            daily_log = []
-            server_logger.info(f"Created new daily log file: {daily_log_filename}")
-        else:
-            # Load existing daily log data from JSON file
-            with open(daily_log_filename, 'r') as json_file:
-                daily_log = json.load(json_file)
-
-        # Add new connection entry with timestamp
-        connection_entry = {
-            "ip": client_ip,
-            "port": client_port,
-            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        }
-        daily_log.append(connection_entry)
-
-        # Write updated daily log data back to the JSON file
-        with open(daily_log_filename, 'w') as json_file:
-            json.dump(daily_log, json_file, indent=4)
-            server_logger.info(f"Updated daily log file: {daily_log_filename}")
-
-    def __update_weekly_log(self, client_ip, client_port):
-        # Get the start of the current week (Monday)
-        current_date = datetime.now()
-        start_of_week = (current_date - timedelta(days=current_date.weekday())).strftime("%Y-%m-%d")
-        os.makedirs(self.connections_path, exist_ok=True)
-        weekly_log_filename = os.path.join(self.connections_path, f"connections_week_{start_of_week}.json")
-
-        # Check if the weekly log file exists, create it if not
-        if not os.path.exists(weekly_log_filename):
-            weekly_log = []
-            server_logger.info(f"Created new weekly log file: {weekly_log_filename}")
-        else:
-            # Load existing weekly log data from JSON file
-            with open(weekly_log_filename, 'r') as json_file:
-                weekly_log = json.load(json_file)
-
-        # Add new connection entry with timestamp
-        connection_entry = {
-            "ip": client_ip,
-            "port": client_port,
-            "timestamp": current_date.strftime("%Y-%m-%d %H:%M:%S")
-        }
-        weekly_log.append(connection_entry)
-
-        # Write updated weekly log data back to the JSON file
-        with open(weekly_log_filename, 'w') as json_file:
-            json.dump(weekly_log, json_file, indent=4)
-            server_logger.info(f"Updated weekly log file: {weekly_log_filename}")
-
-
-    def __update_monthly_log(self, client_ip, client_port):
-        # Get the current date and month
-        current_date = datetime.now()
-        month = current_date.strftime("%Y-%m")
-        os.makedirs(self.connections_path, exist_ok=True)
-        monthly_log_filename = os.path.join(self.connections_path, f"connections_{month}.json")
-
-        # Check if the monthly log file exists, create it if not
-        if not os.path.exists(monthly_log_filename):
-            monthly_log = []
-            server_logger.info(f"Created new monthly log file: {monthly_log_filename}")
-        else:
-            # Load existing monthly log data from JSON file
-            with open(monthly_log_filename, 'r') as json_file:
-                monthly_log = json.load(json_file)
+def run_worker(settings: HoneypotSettings, worker_id: int, events, log_queue, listeners: list | None = None, commands=None):
+    """ Entry point of a worker process. """
+    forward_logs(log_queue)
 
-        # Add new connection entry with timestamp
-        connection_entry = {
-            "ip": client_ip,
-            "port": client_port,
-            "timestamp": current_date.strftime("%Y-%m-%d %H:%M:%S")
-        }
-        monthly_log.append(connection_entry)
+    def interrupt(*_):
+        # Stop once, Ctrl+C reaches the workers and the supervisor terminates them as well.
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGTERM, signal.SIG_IGN)
+        raise KeyboardInterrupt
 
-        # Write updated monthly log data back to the JSON file
-        with open(monthly_log_filename, 'w') as json_file:
-            json.dump(monthly_log, json_file, indent=4)
-            server_logger.info(f"Updated monthly log file: {monthly_log_filename}")
+    signal.signal(signal.SIGINT, interrupt)
+    signal.signal(signal.SIGTERM, interrupt)
+    HoneypotServer(settings, events=events, worker_id=worker_id, listeners=listeners, commands=commands).start()
 
 def honeypot(settings: HoneypotSettings):
     server = HoneypotServer(settings)
@@ -0,0 +1,87 @@
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from honeypot.logger import server_logger
+from honeypot.tarpit import Tarpit
+
+OVERFLOW_POLICIES = ("queue", "drop", "tarpit")
+
+
+class SessionPool:
+    def __init__(self, max_sessions: int = 100, max_queued: int = 100, overflow_policy: str = "queue", tarpit: Tarpit | None = None):
+        """ Runs client sessions on a bounded pool of worker threads and applies admission control.
+
+        With the "tarpit" policy, connections over the limit are handed to `tarpit`, the same one tarpit mode uses.
+        """
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy: {overflow_policy}")
+        self.max_sessions = max_sessions
+        self.max_queued = max_queued
+        self.overflow_policy = overflow_policy
+        self.tarpit = tarpit
+        self.executor = ThreadPoolExecutor(max_workers=max_sessions, thread_name_prefix="session")
+        self.__lock = threading.Lock()
+        self.in_flight = 0
+        self.active = 0
+        self.total_accepted = 0
+        self.total_rejected = 0
+        self.total_tarpitted = 0
+
+    @property
+    def queued(self) -> int:
+        return self.in_flight - self.active
+
+    @property
+    def tarpitted(self) -> int:
+        return self.tarpit.held if self.tarpit is not None and self.overflow_policy == "tarpit" else 0
+
+    def submit(self, client_socket: socket.socket, addr, handler) -> bool:
+        """ Run `handler(client_socket, addr)` on the pool, or apply the overflow policy when it is full. """
+        with self.__lock:
+            admitted = self.in_flight < self.max_sessions or (self.overflow_policy == "queue" and self.queued < self.max_queued)
+            if admitted:
+                self.in_flight += 1
+                self.total_accepted += 1
+
+        if not admitted:
+            # The tarpit owns the socket once it accepted it.
+            if self.overflow_policy == "tarpit" and self.tarpit is not None and self.tarpit.hold(client_socket, addr):
+                with self.__lock:
+                    self.total_tarpitted += 1
+                server_logger.warning(f"Tarpitting connection from {addr[0]}:{addr[1]}, session pool is full.")
+                return False
+            with self.__lock:
+                self.total_rejected += 1
+            client_socket.close()
+            server_logger.warning(f"Rejected connection from {addr[0]}:{addr[1]}, session pool is full ({self.active} active, {self.queued} queued, {self.total_rejected} rejected).")
+            return False
+
+        if self.queued > 0:
+            server_logger.info(f"Queued connection from {addr[0]}:{addr[1]}, queue depth: {self.queued}")
+        self.executor.submit(self.__run, handler, client_socket, addr)
+        return True
+
+    def stats(self) -> dict:
+        with self.__lock:
+            return {
+                "max_sessions": self.max_sessions,
+                "active": self.active,
+                "queued": self.queued,
+                "tarpitted": self.tarpitted,
+                "total_accepted": self.total_accepted,
+                "total_rejected": self.total_rejected,
+                "total_tarpitted": self.total_tarpitted,
+            }
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+    def __run(self, handler, client_socket: socket.socket, addr):
+        with self.__lock:
+            self.active += 1
+        try:
+            handler(client_socket, addr)
+        finally:
+            with self.__lock:
+                self.active -= 1
+                self.in_flight -= 1
@@ -0,0 +1,482 @@
+import heapq
+import json
+import os
+import re
+import sqlite3
+import threading
+from collections import Counter
+from honeypot.command_history import HISTORY_EXTENSIONS, InvalidCursor, parse_position, read_command_history, scan_command_history
+from honeypot.journal import EVENT_TYPES, EventJournal
+from honeypot.rollups import ROLLUP_DIMENSIONS, TOTAL, RollupStore, rollup_keys
+
+STORAGE_BACKENDS = ("journal", "sqlite")
+
+# Columns that records can be grouped on, per event type.
+GROUP_COLUMNS = {
+    "connection": ("ip", "port"),
+    "login": ("ip", "username", "password", "successfull_login"),
+    "command": ("ip", "username", "session"),
+}
+
+
+def count_daily(records, group_by: str | None = None) -> list:
+    """ Count records per day, and per `group_by` value when given. Returns sorted (day, key, count) tuples. """
+    counts = Counter((record["timestamp"][:10], record.get(group_by) if group_by else None) for record in records)
+    return sorted(((day, key, count) for (day, key), count in counts.items()), key=lambda item: (item[0], str(item[1])))
+
+
+def list_history_files(directory: str) -> list:
+    if not os.path.isdir(directory):
+        return []
+    return sorted(filename for filename in os.listdir(directory) if filename.endswith(HISTORY_EXTENSIONS))
+
+
+def matches(record: dict, ip: str | None = None, start: str | None = None, end: str | None = None, command: str | None = None, session: str | None = None) -> bool:
+    """ Whether a record passes the API filters. `start` and `end` are inclusive days (YYYY-MM-DD), `command` is a substring. """
+    day = record.get("timestamp", "")[:10]
+    return ((ip is None or record.get("ip") == ip)
+            and (start is None or day >= start)
+            and (end is None or day <= end)
+            and (command is None or command in (record.get("command") or ""))
+            and (session is None or record.get("session") == session))
+
+
+def scan_history_files(directory: str, cursor: str | None = None, ip: str | None = None):
+    """ Session history files after `cursor` in name order, only those of `ip` when given. """
+    prefix = f"command_history-{ip}-" if ip else ""
+    for filename in list_history_files(directory):
+        if (cursor is None or filename > cursor) and filename.startswith(prefix):
+            yield filename
+
+
+def scan_session_file(directory: str, session: str, cursor: str | None = None, start: str | None = None, end: str | None = None, command: str | None = None):
+    path = os.path.join(directory, session)
+    if not session.endswith(HISTORY_EXTENSIONS) or not os.path.exists(path):
+        return
+    for record, position in scan_command_history(path, cursor):
+        if matches(record, start=start, end=end, command=command):
+            yield record, position
+
+
+class JournalStorage(EventJournal):
+    # Command history is also kept in one file per session.
+    session_files = True
+
+    def __init__(self, env_directory: str):
+        """ Storage backed by the NDJSON event journal and per-session command history files. """
+        super().__init__(env_directory)
+        self.command_history_directory = os.path.join(env_directory, "command_history")
+        # Daily counts maintained as records are written, loaded on first use.
+        self.rollups = RollupStore(os.path.join(env_directory, "rollups"))
+        self.__rollup_lock = threading.RLock()
+        self.__rollups_loaded = False
+        # ColumnarStore with the Parquet copies of closed days, counted instead of their partitions when set.
+        self.columnar = None
+
+    def write(self, event_type: str, record: dict) -> dict:
+        with self.__rollup_lock:
+            self.__load_rollups()
+            record = super().write(event_type, record)
+            self.rollups.add(event_type, record)
+        return record
+
+    def commit(self):
+        with self.__rollup_lock:
+            super().commit()
+            # Everything in the partitions is now counted, the saved offsets let a restart fold in only what follows.
+            for event_type, day in self.rollups.dirty_days():
+                try:
+                    self.rollups.set_offset(event_type, day, os.path.getsize(self.partition_path(event_type, day)))
+                except FileNotFoundError:
+                    continue
+            self.rollups.save()
+
+    def close(self):
+        super().close()
+        self.rollups.save(force=True)
+
+    def rollup(self, event_type: str, dimension: str = TOTAL, start: str | None = None, end: str | None = None) -> list:
+        """ Daily (day, key, count) rows of one rollup dimension, without reading the journal. """
+        with self.__rollup_lock:
+            self.__load_rollups()
+        return self.rollups.counts(event_type, dimension, start, end)
+
+    def daily_counts(self, event_type: str, start: str | None = None, end: str | None = None, group_by: str | None = None) -> list:
+        rows = []
+        for day in self.days(event_type):
+            if (start and day < start) or (end and day > end):
+                continue
+            counts = self.compacted_daily_counts(event_type, day, group_by)
+            rows.extend(count_daily(self.read(event_type, day, day), group_by) if counts is None else counts)
+        return rows
+
+    def compacted_daily_counts(self, event_type: str, day: str, group_by: str | None) -> list | None:
+        """ Daily counts of one day from its Parquet copy, or None if it has no up to date copy. """
+        if self.columnar is None:
+            return None
+        counts = self.columnar.daily_counts(event_type, day, self.partition_path(event_type, day), group_by)
+        if counts is None:
+            return None
+        return sorted(((day, key, count) for (day, key), count in counts.items()), key=lambda item: (item[0], str(item[1])))
+
+    def fold_daily_counts(self, event_type: str, group_by: str | None, position: dict | None):
+        """ Daily counts of the records appended since `position`, a byte offset per day partition.
+
+        Returns the counts, the new position and the days whose partition shrank and must be counted again.
+        """
+        position = dict(position or {})
+        rows, reset_days = [], []
+        for day in self.days(event_type):
+            offset = position.get(day, 0)
+            try:
+                size = os.path.getsize(self.partition_path(event_type, day))
+            except FileNotFoundError:
+                continue
+            if size == offset:
+                continue
+            if size < offset:
+                # The partition was rewritten, count the whole day again.
+                reset_days.append(day)
+                offset = 0
+            # A closed day counted for the first time is read from its Parquet copy, a few columns instead of every line.
+            counts = self.compacted_daily_counts(event_type, day, group_by) if offset == 0 else None
+            if counts is not None:
+                rows.extend(counts)
+                position[day] = size
+                continue
+            records, position[day] = self.read_partition(event_type, day, offset)
+            rows.extend(count_daily(records, group_by))
+        return rows, position, reset_days
+
+    def scan(self, event_type: str, cursor: str | None = None, ip: str | None = None, start: str | None = None, end: str | None = None, command: str | None = None, session: str | None = None):
+        """ (record, cursor) pairs of `event_type` after `cursor`, oldest first. The cursor is `<day>:<byte offset>`. """
+        cursor_day, offset = None, 0
+        if cursor:
+            match = re.fullmatch(r"(\d{4}-\d{2}-\d{2}):(\d{1,18})", cursor)
+            if match is None:
+                raise InvalidCursor("Invalid cursor.")
+            cursor_day, offset = match.group(1), int(match.group(2))
+        for day in self.days(event_type):
+            if (cursor_day and day < cursor_day) or (start and day < start) or (end and day > end):
+                continue
+            position = offset if day == cursor_day else 0
+            try:
+                journal_file = open(self.partition_path(event_type, day), "rb")
+            except FileNotFoundError:
+                continue
+            with journal_file:
+                journal_file.seek(position)
+                for line in journal_file:
+                    # A partially written last line is left for the next page.
+                    if not line.endswith(b"\n"):
+                        break
+                    position += len(line)
+                    record = json.loads(line)
+                    if matches(record, ip, start, end, command, session):
+                        yield record, f"{day}:{position}"
+
+    def sessions(self) -> list:
+        return list_history_files(self.command_history_directory)
+
+    def scan_sessions(self, cursor: str | None = None, ip: str | None = None):
+        """ Session names after `cursor` in name order. """
+        return scan_history_files(self.command_history_directory, cursor, ip)
+
+    def scan_session(self, session: str, cursor: str | None = None, start: str | None = None, end: str | None = None, command: str | None = None):
+        """ (record, cursor) pairs of one session's commands after `cursor`. """
+        return scan_session_file(self.command_history_directory, session, cursor, start, end, command)
+
+    def __load_rollups(self):
+        if self.__rollups_loaded:
+            return
+        for event_type in EVENT_TYPES:
+            for day in sorted(set(self.days(event_type)) | set(self.rollups.days(event_type))):
+                offset = self.rollups.load(event_type, day)
+                try:
+                    size = os.path.getsize(self.partition_path(event_type, day))
+                except FileNotFoundError:
+                    continue
+                if size == offset:
+                    continue
+                if size < offset:
+                    self.rollups.reset(event_type, day)
+                    offset = 0
+                # Fold in what was committed to the journal after the rollup was last saved.
+                records, offset = self.read_partition(event_type, day, offset)
+                for record in records:
+                    self.rollups.add(event_type, record)
+                self.rollups.set_offset(event_type, day, offset)
+        self.__rollups_loaded = True
+
+    def session_history(self, session: str) -> list:
+        path = os.path.join(self.command_history_directory, session)
+        if not session.endswith(HISTORY_EXTENSIONS) or not os.path.exists(path):
+            return []
+        return list(read_command_history(path))
+
+
+class SQLiteStorage:
+    # Command history is stored in the commands table.
+    session_files = False
+
+    TABLES = {
+        "connection": ("connections", ("timestamp", "ip", "port")),
+        "login": ("logins", ("timestamp", "ip", "username", "password", "successfull_login")),
+        "command": ("commands", ("timestamp", "ip", "username", "session", "command")),
+    }
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS connections (id INTEGER PRIMARY KEY, timestamp TEXT NOT NULL, ip TEXT, port INTEGER);
+        CREATE INDEX IF NOT EXISTS connections_timestamp ON connections (timestamp);
+        CREATE INDEX IF NOT EXISTS connections_ip ON connections (ip);
+        CREATE TABLE IF NOT EXISTS logins (id INTEGER PRIMARY KEY, timestamp TEXT NOT NULL, ip TEXT, username TEXT, password TEXT, successfull_login INTEGER);
+        CREATE INDEX IF NOT EXISTS logins_timestamp ON logins (timestamp);
+        CREATE INDEX IF NOT EXISTS logins_ip ON logins (ip);
+        CREATE INDEX IF NOT EXISTS logins_username ON logins (username);
+        CREATE TABLE IF NOT EXISTS commands (id INTEGER PRIMARY KEY, timestamp TEXT NOT NULL, ip TEXT, username TEXT, session TEXT, command TEXT);
+        CREATE INDEX IF NOT EXISTS commands_timestamp ON commands (timestamp);
+        CREATE INDEX IF NOT EXISTS commands_ip ON commands (ip);
+        CREATE INDEX IF NOT EXISTS commands_username ON commands (username);
+        CREATE INDEX IF NOT EXISTS commands_session ON commands (session);
+        CREATE TABLE IF NOT EXISTS rollups (event_type TEXT NOT NULL, day TEXT NOT NULL, dimension TEXT NOT NULL, key TEXT NOT NULL, count INTEGER NOT NULL, PRIMARY KEY (event_type, dimension, day, key)) WITHOUT ROWID;
+    """
+
+    def __init__(self, env_directory: str, path: str | None = None):
+        """ Embedded SQLite storage in WAL mode, written in batches by the persistence writer. """
+        os.makedirs(env_directory, exist_ok=True)
+        self.path = path or os.path.join(env_directory, "honeypot.db")
+        self.command_history_directory = os.path.join(env_directory, "command_history")
+        self.__local = threading.local()
+        self.__lock = threading.Lock()
+        self.__pending = {event_type: [] for event_type in self.TABLES}
+        self.__pending_rollups = Counter()
+        self.__connection().executescript(self.SCHEMA)
+        self.__backfill_rollups()
+
+    def write(self, event_type: str, record: dict) -> dict:
+        """ Buffer one record, it is inserted with the rest of the batch on the next `commit`. """
+        _, columns = self.TABLES[event_type]
+        day = record["timestamp"][:10]
+        with self.__lock:
+            self.__pending[event_type].append(tuple(record.get(column) for column in columns))
+            for dimension, key in rollup_keys(event_type, record):
+                self.__pending_rollups[(event_type, day, dimension, key)] += 1
+        return record
+
+    def append(self, event_type: str, record: dict) -> dict:
+        self.write(event_type, record)
+        self.commit()
+        return record
+
+    def commit(self):
+        with self.__lock:
+            pending = {event_type: rows for event_type, rows in self.__pending.items() if rows}
+            pending_rollups = self.__pending_rollups
+            self.__pending = {event_type: [] for event_type in self.TABLES}
+            self.__pending_rollups = Counter()
+        if not pending:
+            return
+        connection = self.__connection()
+        # All tables, rollups included, are written in a single transaction.
+        with connection:
+            for event_type, rows in pending.items():
+                table, columns = self.TABLES[event_type]
+                connection.executemany(f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})", rows)
+            self.__add_rollups(connection, pending_rollups)
+
+    def close(self):
+        self.commit()
+        connection = getattr(self.__local, "connection", None)
+        if connection is not None:
+            connection.close()
+            self.__local.connection = None
+
+    def read(self, event_type: str, start: str | None = None, end: str | None = None):
+        table, columns = self.TABLES[event_type]
+        where, parameters = self.__time_range(start, end)
+        cursor = self.__connection().execute(f"SELECT {', '.join(columns)} FROM {table}{where} ORDER BY id", parameters)
+        for row in cursor:
+            yield self.__record(columns, row)
+
+    def daily_counts(self, event_type: str, start: str | None = None, end: str | None = None, group_by: str | None = None) -> list:
+        table, _ = self.TABLES[event_type]
+        if group_by is not None and group_by not in GROUP_COLUMNS[event_type]:
+            raise ValueError(f"Cannot group {event_type} records by {group_by}")
+        key = group_by or "NULL"
+        where, parameters = self.__time_range(start, end)
+        rows = self.__connection().execute(f"SELECT substr(timestamp, 1, 10) AS day, {key} AS key, COUNT(*) FROM {table}{where} GROUP BY day, key ORDER BY day", parameters).fetchall()
+        if group_by == "successfull_login":
+            rows = [(day, bool(key), count) for day, key, count in rows]
+        return rows
+
+    def rollup(self, event_type: str, dimension: str = TOTAL, start: str | None = None, end: str | None = None) -> list:
+        """ Daily (day, key, count) rows of one rollup dimension, read from the rollups table. """
+        conditions, parameters = ["event_type = ?", "dimension = ?"], [event_type, dimension]
+        if start:
+            conditions.append("day >= ?")
+            parameters.append(start)
+        if end:
+            conditions.append("day <= ?")
+            parameters.append(end)
+        rows = self.__connection().execute(f"SELECT day, key, count FROM rollups WHERE {' AND '.join(conditions)} ORDER BY day", parameters).fetchall()
+        return sorted(((day, json.loads(key), count) for day, key, count in rows), key=lambda item: (item[0], str(item[1])))
+
+    def fold_daily_counts(self, event_type: str, group_by: str | None, position: int | None):
+        """ Daily counts of the rows inserted since `position`, the last row id that was counted.
+
+        Returns the counts, the new position and the days that must be counted again, always none here.
+        """
+        table, _ = self.TABLES[event_type]
+        if group_by is not None and group_by not in GROUP_COLUMNS[event_type]:
+            raise ValueError(f"Cannot group {event_type} records by {group_by}")
+        position = position or 0
+        connection = self.__connection()
+        last_id = connection.execute(f"SELECT MAX(id) FROM {table}").fetchone()[0] or 0
+        if last_id <= position:
+            return [], position, []
+        key = group_by or "NULL"
+        rows = connection.execute(f"SELECT substr(timestamp, 1, 10) AS day, {key} AS key, COUNT(*) FROM {table} WHERE id > ? AND id <= ? GROUP BY day, key", (position, last_id)).fetchall()
+        if group_by == "successfull_login":
+            rows = [(day, bool(key), count) for day, key, count in rows]
+        return rows, last_id, []
+
+    def scan(self, event_type: str, cursor: str | None = None, ip: str | None = None, start: str | None = None, end: str | None = None, command: str | None = None, session: str | None = None):
+        """ (record, cursor) pairs of `event_type` after `cursor`, oldest first. The cursor is the row id. """
+        table, columns = self.TABLES[event_type]
+        conditions, parameters = ["id > ?"], [parse_position(cursor)]
+        if ip is not None:
+            conditions.append("ip = ?")
+            parameters.append(ip)
+        if start:
+            conditions.append("timestamp >= ?")
+            parameters.append(start)
+        if end:
+            conditions.append("timestamp <= ?")
+            parameters.append(f"{end} 23:59:59")
+        for column, value in (("command", command), ("session", session)):
+            if value is None:
+                continue
+            if column not in columns:
+                return
+            conditions.append("instr(command, ?) > 0" if column == "command" else "session = ?")
+            parameters.append(value)
+        rows = self.__connection().execute(f"SELECT id, {', '.join(columns)} FROM {table} WHERE {' AND '.join(conditions)} ORDER BY id", parameters)
+        for row in rows:
+            yield self.__record(columns, row[1:]), str(row[0])
+
+    def scan_sessions(self, cursor: str | None = None, ip: str | None = None):
+        """ Session names after `cursor` in name order, including legacy history files. """
+        conditions, parameters = ["session IS NOT NULL", "session > ?"], [cursor or ""]
+        if ip is not None:
+            conditions.append("ip = ?")
+            parameters.append(ip)
+        rows = self.__connection().execute(f"SELECT DISTINCT session FROM commands WHERE {' AND '.join(conditions)} ORDER BY session", parameters)
+        previous = None
+        for session in heapq.merge((row[0] for row in rows), scan_history_files(self.command_history_directory, cursor, ip)):
+            if session != previous:
+                yield session
+            previous = session
+
+    def scan_session(self, session: str, cursor: str | None = None, start: str | None = None, end: str | None = None, command: str | None = None):
+        """ (record, cursor) pairs of one session's commands after `cursor`. """
+        if os.path.exists(os.path.join(self.command_history_directory, session)):
+            yield from scan_session_file(self.command_history_directory, session, cursor, start, end, command)
+            return
+        yield from self.scan("command", cursor, start=start, end=end, command=command, session=session)
+
+    def sessions(self) -> list:
+        sessions = {row[0] for row in self.__connection().execute("SELECT DISTINCT session FROM commands WHERE session IS NOT NULL")}
+        # Histories written before the SQLite backend was enabled are still files.
+        sessions.update(list_history_files(self.command_history_directory))
+        return sorted(sessions)
+
+    def session_history(self, session: str) -> list:
+        rows = self.__connection().execute("SELECT timestamp, command FROM commands WHERE session = ? ORDER BY id", (session,)).fetchall()
+        if rows:
+            return [{"timestamp": timestamp, "command": command} for timestamp, command in rows]
+        path = os.path.join(self.command_history_directory, session)
+        if session.endswith(HISTORY_EXTENSIONS) and os.path.exists(path):
+            return list(read_command_history(path))
+        return []
+
+    def __add_rollups(self, connection: sqlite3.Connection, rollups: Counter):
+        connection.executemany(
+            "INSERT INTO rollups (event_type, day, dimension, key, count) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT (event_type, dimension, day, key) DO UPDATE SET count = count + excluded.count",
+            [(event_type, day, dimension, key, count) for (event_type, day, dimension, key), count in rollups.items()])
+
+    def __backfill_rollups(self):
+        # Databases written before rollups existed are counted once.
+        connection = self.__connection()
+        if connection.execute("SELECT 1 FROM rollups LIMIT 1").fetchone() is not None:
+            return
+        rollups = Counter()
+        for event_type, dimensions in ROLLUP_DIMENSIONS.items():
+            for dimension in (TOTAL,) + dimensions:
+                for day, key, count in self.daily_counts(event_type, group_by=None if dimension == TOTAL else dimension):
+                    rollups[(event_type, day, dimension, json.dumps(key))] += count
+        if rollups:
+            with connection:
+                self.__add_rollups(connection, rollups)
+
+    def __connection(self) -> sqlite3.Connection:
+        # SQLite connections are per thread, WAL lets the webserver read while the writer commits.
+        connection = getattr(self.__local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self.__local.connection = connection
+        return connection
+
+    def __time_range(self, start: str | None, end: str | None):
+        conditions, parameters = [], []
+        if start:
+            conditions.append("timestamp >= ?")
+            parameters.append(start)
+        if end:
+            conditions.append("timestamp <= ?")
+            parameters.append(f"{end} 23:59:59")
+        return (" WHERE " + " AND ".join(conditions) if conditions else ""), parameters
+
+    def __record(self, columns, row) -> dict:
+        record = dict(zip(columns, row))
+        if "successfull_login" in record and record["successfull_login"] is not None:
+            record["successfull_login"] = bool(record["successfull_login"])
+        return record
+
+
+class ForwardingStorage:
+    def __init__(self, events, source: str, backend: str = "journal"):
+        """ Storage of a worker process: every committed batch is sent to the supervisor, which writes it.
+
+        `events` is a multiprocessing queue, a batch costs one put however many records it holds.
+        Session files are written by the worker itself when the supervisor's `backend` keeps them.
+        """
+        self.events = events
+        self.source = source
+        self.session_files = {"journal": JournalStorage, "sqlite": SQLiteStorage}[backend].session_files
+        self.__lock = threading.Lock()
+        self.__pending = []
+
+    def write(self, event_type: str, record: dict) -> dict:
+        with self.__lock:
+            self.__pending.append((event_type, record))
+        return record
+
+    def commit(self):
+        with self.__lock:
+            pending, self.__pending = self.__pending, []
+        if pending:
+            self.events.put(("records", self.source, pending))
+
+    def close(self):
+        self.commit()
+
+
+def create_storage(backend: str, env_directory: str):
+    if backend == "journal":
+        return JournalStorage(env_directory)
+    if backend == "sqlite":
+        return SQLiteStorage(env_directory)
+    raise ValueError(f"Unknown storage backend: {backend}")
@@ -0,0 +1,181 @@
+import heapq
+import itertools
+import random
+import selectors
+import socket
+import threading
+import time
+from honeypot import metrics
+from honeypot.logger import server_logger
+
+
+class Tarpit:
+    def __init__(self, drip_interval: float = 10.0, line_length: int = 32, max_connections: int = 10000, max_hold: float = 0):
+        """ Holds connections open by dripping a never-ending pre-handshake banner, all on one thread.
+
+        SSH clients read lines until one starts with `SSH-`, so every `drip_interval` seconds each
+        connection gets one more random line. Connections are closed when the client gives up, or
+        after `max_hold` seconds when it is set.
+        """
+        self.drip_interval = drip_interval
+        self.line_length = line_length
+        self.max_connections = max_connections
+        self.max_hold = max_hold
+        self.__selector = selectors.DefaultSelector()
+        self.__wakeup_reader, self.__wakeup_writer = socket.socketpair()
+        self.__wakeup_reader.setblocking(False)
+        self.__wakeup_writer.setblocking(False)
+        self.__lock = threading.Lock()
+        self.__incoming = []
+        # (due, counter, socket) of the next line per connection.
+        self.__due = []
+        self.__counter = itertools.count()
+        # socket -> [address, hold start]
+        self.__held = {}
+        self.__thread = None
+        self.running = False
+        self.total_held = 0
+        self.total_rejected = 0
+        self.bytes_dripped = 0
+        self.total_hold_seconds = 0.0
+        self.longest_hold_seconds = 0.0
+
+    @property
+    def held(self) -> int:
+        return len(self.__held)
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self.__selector.register(self.__wakeup_reader, selectors.EVENT_READ)
+        self.__thread = threading.Thread(target=self.__run, daemon=True, name="tarpit")
+        self.__thread.start()
+
+    def hold(self, client_socket: socket.socket, addr) -> bool:
+        """ Hand a connection to the tarpit. Returns False when it is full, the caller still owns the socket then. """
+        with self.__lock:
+            if not self.running or len(self.__held) + len(self.__incoming) >= self.max_connections:
+                self.total_rejected += 1
+                return False
+            self.__incoming.append((client_socket, addr))
+        self.__wake()
+        return True
+
+    def stop(self):
+        if not self.running:
+            return
+        self.running = False
+        self.__wake()
+        self.__thread.join()
+
+    def stats(self) -> dict:
+        with self.__lock:
+            held = len(self.__held)
+            hold_seconds = self.total_hold_seconds + sum(time.monotonic() - started for _, started in self.__held.values())
+            return {
+                "held": held,
+                "total_held": self.total_held,
+                "total_rejected": self.total_rejected,
+                "bytes_dripped": self.bytes_dripped,
+                "total_hold_seconds": round(hold_seconds, 3),
+                "average_hold_seconds": round(hold_seconds / self.total_held, 3) if self.total_held else 0.0,
+                "longest_hold_seconds": round(self.longest_hold_seconds, 3),
+            }
+
+    def __wake(self):
+        try:
+            self.__wakeup_writer.send(b"\0")
+        except BlockingIOError:
+            # A wakeup is already pending.
+            pass
+
+    def __run(self):
+        while self.running:
+            timeout = max(self.__due[0][0] - time.monotonic(), 0) if self.__due else None
+            for key, _ in self.__selector.select(timeout):
+                if key.fileobj is self.__wakeup_reader:
+                    self.__accept_incoming()
+                else:
+                    self.__read(key.fileobj)
+
+            now = time.monotonic()
+            while self.__due and self.__due[0][0] <= now:
+                _, _, client_socket = heapq.heappop(self.__due)
+                # Closed connections leave stale entries behind.
+                if client_socket in self.__held:
+                    self.__drip(client_socket, now)
+
+        for client_socket in list(self.__held):
+            self.__release(client_socket)
+        with self.__lock:
+            incoming, self.__incoming = self.__incoming, []
+        for client_socket, _ in incoming:
+            client_socket.close()
+        self.__selector.close()
+
+    def __accept_incoming(self):
+        try:
+            while self.__wakeup_reader.recv(4096):
+                pass
+        except BlockingIOError:
+            pass
+        with self.__lock:
+            incoming, self.__incoming = self.__incoming, []
+        now = time.monotonic()
+        for client_socket, addr in incoming:
+            try:
+                client_socket.setblocking(False)
+                self.__selector.register(client_socket, selectors.EVENT_READ)
+            except (OSError, ValueError):
+                client_socket.close()
+                continue
+            with self.__lock:
+                self.__held[client_socket] = [addr, now]
+                self.total_held += 1
+            self.__drip(client_socket, now)
+
+    def __read(self, client_socket: socket.socket):
+        # Whatever the client sends is discarded, an empty read means it gave up.
+        try:
+            data = client_socket.recv(4096)
+        except BlockingIOError:
+            return
+        except OSError:
+            data = b""
+        if not data:
+            self.__release(client_socket)
+
+    def __drip(self, client_socket: socket.socket, now: float):
+        _, started = self.__held[client_socket]
+        if self.max_hold and now - started >= self.max_hold:
+            self.__release(client_socket)
+            return
+        # A banner line must not start with "SSH-", hex digits never do.
+        line = f"{random.getrandbits(self.line_length * 4):0{self.line_length}x}\r\n".encode()
+        try:
+            sent = client_socket.send(line)
+        except BlockingIOError:
+            # The client is not reading, its buffer is full. Keep holding it.
+            sent = 0
+        except OSError:
+            self.__release(client_socket)
+            return
+        with self.__lock:
+            self.bytes_dripped += sent
+        metrics.TARPIT_BYTES_DRIPPED.inc(amount=sent)
+        heapq.heappush(self.__due, (now + self.drip_interval, next(self.__counter), client_socket))
+
+    def __release(self, client_socket: socket.socket):
+        with self.__lock:
+            addr, started = self.__held.pop(client_socket)
+            hold_seconds = time.monotonic() - started
+            self.total_hold_seconds += hold_seconds
+            self.longest_hold_seconds = max(self.longest_hold_seconds, hold_seconds)
+        metrics.TARPIT_HOLD_SECONDS.observe(hold_seconds)
+        try:
+            self.__selector.unregister(client_socket)
+        except (KeyError, ValueError):
+            pass
+        client_socket.close()
+        server_logger.info(f"Released {addr[0]}:{addr[1]} from the tarpit after {hold_seconds:.0f} seconds")
@@ -1,13 +1,24 @@
-from flask import Flask, render_template, jsonify, request
+from flask import Flask, Response, g, render_template, jsonify, request, stream_with_context
 from flask.logging import default_handler
 import logging.config
 import plotly.graph_objects as go
 import os
 import json
 import pandas as pd
-import plotly.express as px
+import functools
+import itertools
 import re
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from honeypot.aggregates import AggregateCache
+from honeypot.command_history import InvalidCursor
+from honeypot import metrics, profiling
+from honeypot.counters import CounterStore
 from honeypot.logger import web_logger
+from honeypot.rollups import PERIODS, ROLLUP_DIMENSIONS, TOTAL, period_counts
+from honeypot.storage import JournalStorage, create_storage
 
 app = Flask(__name__)
 
@@ -15,14 +26,66 @@ app = Flask(__name__)
 LOGINS_DIR = './env/logins/'
 CONNECTIONS_DIR = './env/connections/'
 COMMAND_HISTORY_DIR = './env/command_history/'
-
-def set_env_directory(directory):
+PROFILES_DIR = './env/profiles/'
+STORAGE = JournalStorage('./env')
+AGGREGATES = AggregateCache(STORAGE)
+# Rendered graphs per page, reused while the counts behind them are unchanged.
+GRAPH_CACHE = {}
+GRAPH_CACHE_LOCK = threading.Lock()
+# Page sizes of the JSON API.
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+# Live counters shared by the honeypot server, None when the webserver runs on its own.
+CONNECTION_COUNTS = None
+USERNAME_COUNTS = None
+# The /admin endpoints start the profiler and show internals, off unless enabled and only for local clients.
+ADMIN_ENABLED = False
+LOCAL_ADDRESSES = ("127.0.0.1", "::1")
+# Starts a profile of the honeypot server, its workers included, None when the webserver runs on its own.
+START_PROFILE = None
+
+def set_env_directory(directory, storage_backend="journal"):
     global LOGINS_DIR
     global CONNECTIONS_DIR
     global COMMAND_HISTORY_DIR
+    global PROFILES_DIR
     LOGINS_DIR = os.path.join(directory, 'logins')
     CONNECTIONS_DIR = os.path.join(directory, 'connections')
     COMMAND_HISTORY_DIR = os.path.join(directory, 'command_history')
+    PROFILES_DIR = os.path.join(directory, 'profiles')
+    set_storage(create_storage(storage_backend, directory))
+
+def set_storage(storage):
+    """ Share the storage of the honeypot server, so the webserver reads what the writer commits. """
+    global STORAGE
+    global AGGREGATES
+    STORAGE = storage
+    AGGREGATES = AggregateCache(storage)
+    with GRAPH_CACHE_LOCK:
+        GRAPH_CACHE.clear()
+
+def set_counters(connection_counts, username_counts):
+    global CONNECTION_COUNTS
+    global USERNAME_COUNTS
+    CONNECTION_COUNTS = connection_counts
+    USERNAME_COUNTS = username_counts
+
+def set_admin(enabled, start_profile=None):
+    global ADMIN_ENABLED
+    global START_PROFILE
+    ADMIN_ENABLED = enabled
+    START_PROFILE = start_profile
+
+def admin_only(view):
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if not ADMIN_ENABLED:
+            return "Not found.", 404
+        if request.remote_addr not in LOCAL_ADDRESSES:
+            web_logger.warning(f"{request.remote_addr} Was refused access to {request.path}.")
+            return "Forbidden.", 403
+        return view(*args, **kwargs)
+    return wrapper
 
 def load_json_files(directory):
     data = []
@@ -32,6 +95,99 @@ def load_json_files(directory):
                 data.append(json.load(file))
     return data
 
+def daily_counts(event_type, directory, pattern, start=None, end=None, group_by=None):
+    """ Daily counts of `event_type` from the storage and from legacy JSON files, keyed on (day, group).
+
+    Both come from the aggregate cache, which only reads what was written since the last request.
+    """
+    counts = AGGREGATES.daily_counts(event_type, group_by=group_by)
+    counts.update(AGGREGATES.legacy_daily_counts(directory, pattern, group_by=group_by))
+    if start is None and end is None:
+        return counts
+    return Counter({(day, key): count for (day, key), count in counts.items()
+                    if (start is None or day >= start) and (end is None or day <= end)})
+
+def cached_graph(name, counts, build):
+    """ Return the graph JSON of page `name`, built again by `build()` only when `counts` changed. """
+    with GRAPH_CACHE_LOCK:
+        cached = GRAPH_CACHE.get(name)
+    if cached is not None and cached[0] == counts:
+        return cached[1]
+    graphJSON = build()
+    with GRAPH_CACHE_LOCK:
+        GRAPH_CACHE[name] = (counts, graphJSON)
+    return graphJSON
+
+def daily_series(counts):
+    """ Turn daily counts into one (days, values) series per group, with days without events set to zero. """
+    if not counts:
+        return {}
+    first = datetime.strptime(min(day for day, _ in counts), "%Y-%m-%d")
+    last = datetime.strptime(max(day for day, _ in counts), "%Y-%m-%d")
+    days = [(first + timedelta(days=offset)).strftime("%Y-%m-%d") for offset in range((last - first).days + 1)]
+    series = {}
+    for key in sorted({key for _, key in counts}, key=str):
+        series[key] = (days, [counts.get((day, key), 0) for day in days])
+    return series
+
+def page_size():
+    return min(max(request.args.get('limit', DEFAULT_PAGE_SIZE, type=int), 1), MAX_PAGE_SIZE)
+
+class InvalidFilter(ValueError):
+    pass
+
+def record_filters():
+    """ Filters shared by the JSON API: ip, start and end (YYYY-MM-DD, inclusive) and a command substring. """
+    filters = {name: request.args.get(name) for name in ('ip', 'start', 'end', 'command')}
+    for name in ('start', 'end'):
+        if filters[name] is not None and not re.fullmatch(r'\d{4}-\d{2}-\d{2}', filters[name]):
+            raise InvalidFilter(f"Invalid {name}, expected YYYY-MM-DD.")
+    return filters
+
+def stream_page(pairs, limit):
+    """ Stream up to `limit` (item, cursor) pairs as {"items": [...], "next_cursor": ...}.
+
+    Items are written out as they are read, so a page is never held in memory. The next cursor
+    is null once the last page was returned.
+    """
+    pairs = iter(pairs)
+    # Read the first item before the response starts, so an invalid cursor is still a 400.
+    first = list(itertools.islice(pairs, 1))
+
+    def generate():
+        yield '{"items":['
+        count, next_cursor = 0, None
+        for item, cursor in itertools.islice(itertools.chain(first, pairs), limit):
+            yield ("," if count else "") + json.dumps(item)
+            count += 1
+            next_cursor = cursor
+        yield '],"next_cursor":' + json.dumps(next_cursor if count == limit else None) + '}'
+
+    return Response(stream_with_context(generate()), mimetype='application/json')
+
+def api_page(scan):
+    """ Stream one page of `scan(cursor, filters)`, with client errors as 400 responses.
+
+    Only fixed messages are returned, a bad cursor never shows how it was decoded.
+    """
+    try:
+        return stream_page(scan(request.args.get('cursor'), record_filters()), page_size())
+    except InvalidFilter as error:
+        return jsonify({"error": str(error)}), 400
+    except InvalidCursor:
+        return jsonify({"error": "Invalid cursor."}), 400
+
+@app.before_request
+def start_render_timer():
+    g.render_started = time.perf_counter()
+
+@app.after_request
+def observe_render_time(response):
+    # Streamed bodies are produced after this point, only the time to the first byte is measured for them.
+    if 'render_started' in g:
+        metrics.WEBSERVER_RENDER_SECONDS.observe(time.perf_counter() - g.render_started, request.endpoint or "unknown")
+    return response
+
 @app.route('/')
 def index():
     web_logger.info(f"{request.remote_addr} Accessed the index page.")
@@ -41,191 +197,210 @@ def index():
 @app.route('/logins')
 def logins():
     web_logger.info(f"{request.remote_addr} Accessed the logins page.")
-    logins_data = []
     
-    # Regex pattern to match daily files
+    # Regex pattern to match legacy daily files
     pattern = re.compile(r'logins_(\d{4}-\d{2}-\d{2})\.json')
+    total_counts = daily_counts("login", LOGINS_DIR, pattern)
 
-    # Load JSON files with specific pattern
-    for filename in os.listdir(LOGINS_DIR):
-        match = pattern.match(filename)
-        if match:
-            with open(os.path.join(LOGINS_DIR, filename)) as file:
-                data = json.load(file)
-                if isinstance(data, list):
-                    logins_data.extend([item for item in data if isinstance(item, dict)])
-
-    if not logins_data:
+    if not total_counts:
         return "No valid login data found.", 404
 
-    # Convert to DataFrame
-    df = pd.DataFrame(logins_data)
-
-    # Convert timestamp to datetime
-    df['timestamp'] = pd.to_datetime(df['timestamp'])
-
-    # Set timestamp as the index for resampling
-    df.set_index('timestamp', inplace=True)
-
-    # Add a count column (if needed, for clarity)
-    df['count'] = 1
-
-    # Resample by day and sum the counts for overall logins
-    daily_counts = df.resample('D').agg({'count': 'sum'}).reset_index()
-
-    # Resample by day and sum the counts for each IP address
-    ip_daily_counts = df.groupby(['ip']).resample('D').agg({'count': 'sum'}).reset_index()
-
-    # Initialize the figure
-    fig = go.Figure()
-
-    # Add overall daily counts line
-    fig.add_trace(go.Scatter(x=daily_counts['timestamp'], y=daily_counts['count'],
-                             mode='lines', name='Total Daily Count'))
-
-    # Add lines for each IP address
-    for ip, group in ip_daily_counts.groupby('ip'):
-        fig.add_trace(go.Scatter(x=group['timestamp'], y=group['count'],
-                                 mode='lines', name=f'IP: {ip}'))
-
-    # Add traces for successful and unsuccessful logins
-    successful_logins = df[df['successfull_login'] == True].resample('D').agg({'count': 'sum'}).reset_index()
-    unsuccessful_logins = df[df['successfull_login'] == False].resample('D').agg({'count': 'sum'}).reset_index()
-
-    fig.add_trace(go.Scatter(x=successful_logins['timestamp'], y=successful_logins['count'],
-                             mode='lines', line=dict(dash='dash'), name='Successful Logins',
-                             marker_color='green'))
-
-    fig.add_trace(go.Scatter(x=unsuccessful_logins['timestamp'], y=unsuccessful_logins['count'],
-                             mode='lines', line=dict(dash='dot'), name='Unsuccessful Logins',
-                             marker_color='red'))
-
-    # Update layout
-    fig.update_layout(
-        title='Daily Login Count',
-        xaxis_title='Date',
-        yaxis_title='Count',
-        legend_title='Legend'
-    )
-
-    # Convert plot to JSON
-    graphJSON = fig.to_json()
+    ip_counts = daily_counts("login", LOGINS_DIR, pattern, group_by="ip")
+    outcome_counts = daily_counts("login", LOGINS_DIR, pattern, group_by="successfull_login")
+
+    def build():
+        # Initialize the figure
+        fig = go.Figure()
+
+        # Add overall daily counts line
+        for days, values in daily_series(total_counts).values():
+            fig.add_trace(go.Scatter(x=days, y=values, mode='lines', name='Total Daily Count'))
+
+        # Add lines for each IP address
+        for ip, (days, values) in daily_series(ip_counts).items():
+            fig.add_trace(go.Scatter(x=days, y=values, mode='lines', name=f'IP: {ip}'))
+
+        # Add traces for successful and unsuccessful logins
+        outcome_series = daily_series(outcome_counts)
+        if True in outcome_series:
+            days, values = outcome_series[True]
+            fig.add_trace(go.Scatter(x=days, y=values,
+                                     mode='lines', line=dict(dash='dash'), name='Successful Logins',
+                                     marker_color='green'))
+        if False in outcome_series:
+            days, values = outcome_series[False]
+            fig.add_trace(go.Scatter(x=days, y=values,
+                                     mode='lines', line=dict(dash='dot'), name='Unsuccessful Logins',
+                                     marker_color='red'))
+
+        # Update layout
+        fig.update_layout(
+            title='Daily Login Count',
+            xaxis_title='Date',
+            yaxis_title='Count',
+            legend_title='Legend'
+        )
+
+        # Convert plot to JSON
+        return fig.to_json()
+
+    graphJSON = cached_graph('logins', (total_counts, ip_counts, outcome_counts), build)
 
     return render_template('graph.html', graphJSON=graphJSON)
 
 @app.route('/connections/monthly')
 def monthly_connections():
     web_logger.info(f"{request.remote_addr} Accessed the monthly connections page.")
-    connections_data = []
+    month = request.args.get('month', datetime.now().strftime("%Y-%m"))
+    if not re.fullmatch(r'\d{4}-\d{2}', month):
+        return "Invalid month, expected YYYY-MM.", 400
     
-    # Regex pattern to match daily files
-    pattern = re.compile(r'connections_(\d{4}-\d{2}\.json')
-
-    # Load JSON files with specific pattern
-    for filename in os.listdir(CONNECTIONS_DIR):
-        match = pattern.match(filename)
-        if match:
-            with open(os.path.join(CONNECTIONS_DIR, filename)) as file:
-                data = json.load(file)
-                if isinstance(data, list):
-                    connections_data.extend([item for item in data if isinstance(item, dict)])
-
-    if not connections_data:
-        return "No valid connection data found.", 404
-
-    # Convert to DataFrame
-    df = pd.DataFrame(connections_data)
+    # Regex pattern to match the legacy monthly file
+    pattern = re.compile(rf'connections_{month}\.json')
+    total_counts = daily_counts("connection", CONNECTIONS_DIR, pattern, start=f"{month}-01", end=f"{month}-31")
 
-    # Convert timestamp to datetime
-    df['timestamp'] = pd.to_datetime(df['timestamp'])
-
-    # Set timestamp as the index for resampling
-    df.set_index('timestamp', inplace=True)
-
-    # Add a count column (if needed, for clarity)
-    df['count'] = 1
+    if not total_counts:
+        return "No valid connection data found.", 404
 
-    # Resample by day and sum the counts
-    daily_counts = df.resample('D').agg({'count': 'sum'}).reset_index()
-    # df['cumulative_count'] = df.groupby(['ip', 'port', 'timestamp']).cumcount() + 1
+    def build():
+        # Create a Plotly line graph
+        fig = go.Figure()
+        for days, values in daily_series(total_counts).values():
+            fig.add_trace(go.Scatter(x=days, y=values, mode='lines', name='Daily Count'))
+        fig.update_layout(title='Daily Connection Count', xaxis_title='Date', yaxis_title='Daily Count')
 
-    # Create a Plotly line graph
-    fig = px.line(daily_counts, x='timestamp', y='count',
-                  title='Daily Connection Count',
-                  labels={'count': 'Daily Count', 'timestamp': 'Date'})
+        # Convert plot to JSON
+        return fig.to_json()
 
-    # Return the plot as HTML
-    # Convert plot to JSON
-    graphJSON = fig.to_json()
+    graphJSON = cached_graph(f'connections/{month}', total_counts, build)
 
     return render_template('graph.html', graphJSON=graphJSON)
 
 @app.route('/connections')
 def connections():
     web_logger.info(f"{request.remote_addr} Accessed the connections page.")
-    connections_data = []
     
-    # Regex pattern to match daily files
+    # Regex pattern to match legacy daily files
     pattern = re.compile(r'connections_(\d{4}-\d{2}-\d{2})\.json')
+    total_counts = daily_counts("connection", CONNECTIONS_DIR, pattern)
 
-    # Load JSON files with specific pattern
-    for filename in os.listdir(CONNECTIONS_DIR):
-        match = pattern.match(filename)
-        if match:
-            with open(os.path.join(CONNECTIONS_DIR, filename)) as file:
-                data = json.load(file)
-                if isinstance(data, list):
-                    connections_data.extend([item for item in data if isinstance(item, dict)])
-
-    if not connections_data:
+    if not total_counts:
         return "No valid connection data found.", 404
 
-    # Convert to DataFrame
-    df = pd.DataFrame(connections_data)
-
-    # Convert timestamp to datetime
-    df['timestamp'] = pd.to_datetime(df['timestamp'])
-
-    # Set timestamp as the index for resampling
-    df.set_index('timestamp', inplace=True)
+    ip_counts = daily_counts("connection", CONNECTIONS_DIR, pattern, group_by="ip")
 
-    # Add a count column (if needed, for clarity)
-    df['count'] = 1
+    def build():
+        # Create a Plotly line graph
+        fig = go.Figure()
+        for days, values in daily_series(total_counts).values():
+            fig.add_trace(go.Scatter(x=days, y=values, mode='lines', name='Daily Count'))
+        fig.update_layout(title='Daily Connection Count', xaxis_title='Date', yaxis_title='Daily Count')
 
-    # Resample by day and sum the counts for overall connections
-    daily_counts = df.resample('D').agg({'count': 'sum'}).reset_index()
+        # Add lines for each IP address
+        for ip, (days, values) in daily_series(ip_counts).items():
+            fig.add_trace(go.Scatter(x=days, y=values, mode='lines', name=ip))
 
-    # Resample by day and sum the counts for each IP address
-    ip_daily_counts = df.groupby(['ip']).resample('D').agg({'count': 'sum'}).reset_index()
+        # Convert plot to JSON
+        return fig.to_json()
 
-    # Create a Plotly line graph
-    fig = px.line(daily_counts, x='timestamp', y='count',
-                  title='Daily Connection Count',
-                  labels={'count': 'Daily Count', 'timestamp': 'Date'})
-
-    # Add lines for each IP address
-    fig.add_traces(px.line(ip_daily_counts, x='timestamp', y='count', color='ip').data)
-
-    # Convert plot to JSON
-    graphJSON = fig.to_json()
+    graphJSON = cached_graph('connections', (total_counts, ip_counts), build)
 
     return render_template('graph.html', graphJSON=graphJSON)
 
+@app.route('/connections/counts')
+def connection_counts():
+    web_logger.info(f"{request.remote_addr} Accessed the connection counts.")
+    # Fall back to the last snapshot when no live counters are shared with the webserver.
+    counts = CONNECTION_COUNTS if CONNECTION_COUNTS is not None else CounterStore(os.path.join(CONNECTIONS_DIR, 'client_connections.json'))
+    return jsonify([{"ip": ip, "count": count} for ip, count in counts.most_common(request.args.get('limit', type=int))])
+
+@app.route('/logins/counts')
+def username_counts():
+    web_logger.info(f"{request.remote_addr} Accessed the username counts.")
+    # Fall back to the last snapshot when no live counters are shared with the webserver.
+    counts = USERNAME_COUNTS if USERNAME_COUNTS is not None else CounterStore(os.path.join(LOGINS_DIR, 'client_logins.json'))
+    return jsonify([{"username": username, "count": count} for username, count in counts.most_common(request.args.get('limit', type=int))])
+
+@app.route('/rollups/<event_type>')
+def rollups(event_type):
+    web_logger.info(f"{request.remote_addr} Accessed the {event_type} rollups.")
+    if event_type not in ROLLUP_DIMENSIONS:
+        return "Unknown event type.", 404
+    dimension = request.args.get('dimension', TOTAL)
+    period = request.args.get('period', 'day')
+    if dimension != TOTAL and dimension not in ROLLUP_DIMENSIONS[event_type]:
+        return f"Unknown dimension, expected one of: {', '.join((TOTAL,) + ROLLUP_DIMENSIONS[event_type])}.", 400
+    if period not in PERIODS:
+        return f"Unknown period, expected one of: {', '.join(PERIODS)}.", 400
+    # Weekly and monthly counts are summed from the daily rollups.
+    rows = STORAGE.rollup(event_type, dimension, start=request.args.get('start'), end=request.args.get('end'))
+    return jsonify([{"period": start, "key": key, "count": count} for start, key, count in period_counts(rows, period)])
+
+@app.route('/metrics')
+def prometheus_metrics():
+    return Response(metrics.REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/admin/stages')
+@admin_only
+def admin_stages():
+    web_logger.info(f"{request.remote_addr} Accessed the stage timings.")
+    return jsonify(profiling.STAGE_TIMES.percentiles())
+
+@app.route('/admin/profile', methods=['GET', 'POST'])
+@admin_only
+def admin_profile():
+    if request.method == 'GET':
+        return jsonify({"running": profiling.PROFILER.running, "last_profile": profiling.PROFILER.last_profile})
+    seconds = request.args.get('seconds', 30, type=float)
+    if not 0 < seconds <= 600:
+        return "The profile length must be between 0 and 600 seconds.", 400
+    web_logger.info(f"{request.remote_addr} Started a {seconds} second profile.")
+    path = START_PROFILE(seconds=seconds) if START_PROFILE is not None else profiling.PROFILER.start(seconds, PROFILES_DIR)
+    if path is None:
+        return jsonify({"error": "A profile is already running."}), 409
+    return jsonify({"profile": path, "seconds": seconds}), 202
+
+@app.route('/api/logins')
+def api_logins():
+    web_logger.info(f"{request.remote_addr} Accessed the logins API.")
+    return api_page(lambda cursor, filters: STORAGE.scan("login", cursor, **filters))
+
+@app.route('/api/commands')
+def api_commands():
+    web_logger.info(f"{request.remote_addr} Accessed the commands API.")
+    return api_page(lambda cursor, filters: STORAGE.scan("command", cursor, **filters))
+
+@app.route('/api/sessions')
+def api_sessions():
+    web_logger.info(f"{request.remote_addr} Accessed the sessions API.")
+    # Session names are their own cursor.
+    return api_page(lambda cursor, filters: (({"session": session}, session) for session in STORAGE.scan_sessions(cursor, ip=filters['ip'])))
+
+@app.route('/api/sessions/<session>')
+def api_session(session):
+    web_logger.info(f"{request.remote_addr} Accessed the session API: {session}.")
+    return api_page(lambda cursor, filters: STORAGE.scan_session(session, cursor, start=filters['start'], end=filters['end'], command=filters['command']))
+
 @app.route('/command_history')
 def command_history():
     web_logger.info(f"{request.remote_addr} Accessed the command history page.")
-    command_files = os.listdir(COMMAND_HISTORY_DIR)
-    return render_template('command_history.html', files=command_files)
+    limit = page_size()
+    command_files = list(itertools.islice(STORAGE.scan_sessions(request.args.get('cursor')), limit))
+    next_cursor = command_files[-1] if len(command_files) == limit else None
+    return render_template('command_history.html', files=command_files, next_cursor=next_cursor)
 
 @app.route('/command_history/<filename>')
 def command_history_file(filename):
     web_logger.info(f"{request.remote_addr} Accessed the command history file: {filename}.")
-    filepath = os.path.join(COMMAND_HISTORY_DIR, filename)
-    if os.path.exists(filepath):
-        with open(filepath) as file:
-            data = json.load(file)
-            df = pd.DataFrame(data)
-            tableHTML = df.to_html(classes='table table-striped')
-            return render_template('table.html', tableHTML=tableHTML)
+    limit = page_size()
+    try:
+        page = list(itertools.islice(STORAGE.scan_session(filename, request.args.get('cursor')), limit))
+    except InvalidCursor:
+        return "Invalid cursor.", 400
+    if page or request.args.get('cursor'):
+        df = pd.DataFrame([record for record, _ in page])
+        tableHTML = df.to_html(classes='table table-striped')
+        next_cursor = page[-1][1] if len(page) == limit else None
+        return render_template('table.html', tableHTML=tableHTML, next_cursor=next_cursor)
     else:
         return "File not found", 404
@@ -21,9 +21,53 @@ honeypot_settings = honeypot.objects.HoneypotSettings(
     banner_message="Welcome to the SSH session\r\n\r\n",
     webserver_enabled=True,
     webserver_port=5000,
-    webserver_address="127.0.0.1"
+    webserver_address="127.0.0.1",
+    max_queued_connections=100,
+    overflow_policy="queue",
+    tarpit_duration=30,
+    persistence_batch_size=500,
+    persistence_flush_interval=1.0,
+    counter_snapshot_interval=30,
+    host_key_directory=".",
+    host_key_algorithms=["ed25519", "rsa"],
+    kex_algorithms=None,
+    ciphers=None,
+    banner_timeout=15,
+    auth_timeout=30,
+    window_size=None,
+    max_packet_size=None,
+    log_max_bytes=10485760,
+    log_backup_count=5,
+    log_json=False,
+    storage_backend="journal",
+    compaction_interval=3600,
+    rate_limit_policy="slow",
+    connection_rate=0,
+    connection_burst=20,
+    auth_rate=0,
+    auth_burst=20,
+    rate_limit_entries=10000,
+    rate_limit_delay=5,
+    rate_limit_sample=0.1,
+    tarpit_mode=False,
+    tarpit_drip_interval=10,
+    tarpit_max_connections=10000,
+    tarpit_max_hold=0,
+    profile_duration=30,
+    profile_interval=0.005,
+    workers=1,
+    endpoints=None,
+    response_cache_entries=1024,
+    webserver_admin=False
 )
 
+def parse_endpoint(spec: str) -> honeypot.objects.Endpoint:
+    # argparse only shows the message of an ArgumentTypeError.
+    try:
+        return honeypot.objects.Endpoint.parse(spec)
+    except ValueError as error:
+        raise argparse.ArgumentTypeError(str(error))
+
 if __name__ == "__main__":
     # Create parser
     parser = argparse.ArgumentParser() 
@@ -34,6 +78,15 @@ if __name__ == "__main__":
     parser.add_argument('-c', '--concurrent_connections', type=int, default=100)
     parser.add_argument('-b', '--banner', action='store_true')
     parser.add_argument('-d', '--delay', type=int, default=5)
+    parser.add_argument('-q', '--max_queued_connections', type=int, default=100)
+    parser.add_argument('-o', '--overflow_policy', type=str, choices=["queue", "drop", "tarpit"], default="queue")
+    parser.add_argument('-t', '--tarpit_duration', type=int, default=30)
+    parser.add_argument('-s', '--storage', type=str, choices=["journal", "sqlite"], default="journal")
+    parser.add_argument('-k', '--host_key_algorithms', type=str, nargs='+', choices=["rsa", "ecdsa", "ed25519"], default=["ed25519", "rsa"])
+    parser.add_argument('-r', '--rate_limit_policy', type=str, choices=["slow", "sample", "drop"], default="slow")
+    parser.add_argument('-T', '--tarpit', action='store_true')
+    parser.add_argument('-n', '--workers', type=int, default=1, help="Listener processes. -c, -q, rate limits and tarpit capacity are split between them.")
+    parser.add_argument('-e', '--endpoint', type=parse_endpoint, action='append', help="address:port[,setting=value...], settings: username, password, hostname, banner, delay, banner_message. Values cannot contain commas.")
     
     args = parser.parse_args()
     
@@ -53,7 +106,44 @@ if __name__ == "__main__":
         banner_message=honeypot_settings.banner_message,
         webserver_enabled=honeypot_settings.webserver_enabled,
         webserver_address=honeypot_settings.webserver_address,
-        webserver_port=honeypot_settings.webserver_port
+        webserver_port=honeypot_settings.webserver_port,
+        max_queued_connections=args.max_queued_connections,
+        overflow_policy=args.overflow_policy,
+        tarpit_duration=args.tarpit_duration,
+        persistence_batch_size=honeypot_settings.persistence_batch_size,
+        persistence_flush_interval=honeypot_settings.persistence_flush_interval,
+        counter_snapshot_interval=honeypot_settings.counter_snapshot_interval,
+        host_key_directory=honeypot_settings.host_key_directory,
+        host_key_algorithms=args.host_key_algorithms,
+        kex_algorithms=honeypot_settings.kex_algorithms,
+        ciphers=honeypot_settings.ciphers,
+        banner_timeout=honeypot_settings.banner_timeout,
+        auth_timeout=honeypot_settings.auth_timeout,
+        window_size=honeypot_settings.window_size,
+        max_packet_size=honeypot_settings.max_packet_size,
+        log_max_bytes=honeypot_settings.log_max_bytes,
+        log_backup_count=honeypot_settings.log_backup_count,
+        log_json=honeypot_settings.log_json,
+        storage_backend=args.storage,
+        compaction_interval=honeypot_settings.compaction_interval,
+        rate_limit_policy=args.rate_limit_policy,
+        connection_rate=honeypot_settings.connection_rate,
+        connection_burst=honeypot_settings.connection_burst,
+        auth_rate=honeypot_settings.auth_rate,
+        auth_burst=honeypot_settings.auth_burst,
+        rate_limit_entries=honeypot_settings.rate_limit_entries,
+        rate_limit_delay=honeypot_settings.rate_limit_delay,
+        rate_limit_sample=honeypot_settings.rate_limit_sample,
+        tarpit_mode=args.tarpit,
+        tarpit_drip_interval=honeypot_settings.tarpit_drip_interval,
+        tarpit_max_connections=honeypot_settings.tarpit_max_connections,
+        tarpit_max_hold=honeypot_settings.tarpit_max_hold,
+        profile_duration=honeypot_settings.profile_duration,
+        profile_interval=honeypot_settings.profile_interval,
+        workers=args.workers,
+        endpoints=args.endpoint,
+        response_cache_entries=honeypot_settings.response_cache_entries,
+        webserver_admin=honeypot_settings.webserver_admin
     )
     
     # Start the honeypot
@@ -1 +1,2 @@
+from .host_keys import HostKeyCache
 from .server import Server
\ No newline at end of file
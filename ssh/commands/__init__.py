@@ -3,6 +3,8 @@ import importlib
 
 # Basic dictionary to store the command name and the function to call
 command_registry = {}
+# How each command's response may be cached, see honeypot.response_cache. Commands that do not declare it are never cached.
+command_caching = {}
 
 def load_commands():
     """Load all the commands in the commands directory."""
@@ -15,6 +17,7 @@ def load_commands():
             module = importlib.import_module(module_name)
             # Add the module to the command registry
             command_registry[module_name.split('.')[-1]] = (module.handle, module.description)
+            command_caching[module_name.split('.')[-1]] = getattr(module, "caching", None)
 
 # Load all the commands
 load_commands()
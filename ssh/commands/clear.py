@@ -1,4 +1,5 @@
 def handle(server, command):
     return b"\033[2J\033[H"
 
-description = "Clear the terminal screen."
\ No newline at end of file
+description = "Clear the terminal screen."
+caching = "pure"
\ No newline at end of file
@@ -10,3 +10,4 @@ def handle(server, command):
     return f"{time_str}\r\n".encode('utf-8')
 
 description = "Get the current date and time."
+caching = "time"
@@ -6,3 +6,4 @@ def handle(server, command):
     return f"{disk_usage}".encode('utf-8')
 
 description = "Check disk space usage."
+caching = "pure"
@@ -0,0 +1,26 @@
+import re
+
+def handle(server, command, stdin=b""):
+    args = command.split(" ")[1:]
+    options = "".join(arg[1:] for arg in args if arg.startswith("-") and len(arg) > 1)
+    words = [arg for arg in args if arg and not (arg.startswith("-") and len(arg) > 1)]
+    if not words:
+        return b"Usage: grep [OPTION]... PATTERNS [FILE]...\r\n", 2
+    if len(words) > 1:
+        # Only piped input can be searched, there are no files.
+        return f"grep: {words[1]}: No such file or directory\r\n".encode('utf-8'), 2
+
+    flags = re.IGNORECASE if "i" in options else 0
+    try:
+        pattern = re.compile(words[0].encode('utf-8'), flags)
+    except re.error:
+        pattern = re.compile(re.escape(words[0].encode('utf-8')), flags)
+    invert = "v" in options
+
+    matches = [line for line in stdin.replace(b"\r\n", b"\n").split(b"\n") if line and bool(pattern.search(line)) != invert]
+    status = 0 if matches else 1
+    if "c" in options:
+        return f"{len(matches)}\r\n".encode('utf-8'), status
+    return b"".join(line + b"\r\n" for line in matches), status
+
+description = "Print lines of the input that match a pattern."
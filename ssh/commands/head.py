@@ -0,0 +1,20 @@
+def handle(server, command, stdin=b""):
+    args = command.split(" ")[1:]
+    count = "10"
+    # Accepts `-n 5`, `-n5` and `-5`.
+    for index, arg in enumerate(args):
+        if arg == "-n" and index + 1 < len(args):
+            count = args[index + 1]
+        elif arg.startswith("-n"):
+            count = arg[2:]
+        elif arg.startswith("-"):
+            count = arg[1:]
+    if not count.isdigit():
+        return f"head: invalid number of lines: '{count}'\r\n".encode('utf-8'), 1
+
+    lines = stdin.replace(b"\r\n", b"\n").split(b"\n")
+    if lines and lines[-1] == b"":
+        lines.pop()
+    return b"".join(line + b"\r\n" for line in lines[:int(count)])
+
+description = "Print the first lines of the input."
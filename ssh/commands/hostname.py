@@ -1,4 +1,5 @@
 def handle(server, command):
     return f"{server.hostname}\r\n\r\n".encode('utf-8')
 
-description = "Get the hostname of the current machine."
\ No newline at end of file
+description = "Get the hostname of the current machine."
+caching = "pure"
\ No newline at end of file
@@ -23,3 +23,4 @@ def handle(server, command):
     return f"{process_list}".encode('utf-8')
 
 description = "List currently running processes."
+caching = "time"
@@ -2,3 +2,4 @@ def handle(server, command):
     return b"/usr/local\r\n\r\n"
 
 description = "Print working directory."
+caching = "pure"
@@ -42,3 +42,4 @@ def handle(server, command):
     return result + b"\r\n\r\n"
 
 description = "Print system information."
+caching = "pure"
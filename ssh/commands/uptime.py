@@ -8,3 +8,4 @@ def handle(server, command):
 
     return f"System has been running for {uptime.days} days, {uptime.seconds // 3600} hours, {uptime.seconds // 60 % 60} minutes, {uptime.seconds % 60} seconds.\r\n".encode('utf-8')
 description = "Check how long the system has been running."
+caching = "time"
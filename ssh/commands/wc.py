@@ -0,0 +1,12 @@
+def handle(server, command, stdin=b""):
+    options = "".join(arg[1:] for arg in command.split(" ")[1:] if arg.startswith("-"))
+    # Line endings are counted as a terminal would send them, without the carriage returns.
+    stdin = stdin.replace(b"\r\n", b"\n")
+    counts = {"l": stdin.count(b"\n"), "w": len(stdin.split()), "c": len(stdin)}
+    selected = [counts[option] for option in "lwc" if option in options] or list(counts.values())
+
+    if len(selected) == 1:
+        return f"{selected[0]}\r\n".encode('utf-8')
+    return (" ".join(f"{count:>7}" for count in selected) + "\r\n").encode('utf-8')
+
+description = "Count lines, words and bytes of the input."
@@ -12,3 +12,4 @@ def handle(server, command):
     return response
 
 description = "See current logged in users."
+caching = "time"
@@ -0,0 +1,154 @@
+import inspect
+import time
+from honeypot import metrics, profiling
+from honeypot.logger import funnel_logger, server_logger
+from honeypot.response_cache import ResponseCache
+from ssh.commands import command_caching, command_registry
+from ssh.parser import ParseError, parse
+from ssh.variables import variable_caching, variable_registry
+
+# Exit statuses, as a shell would set $? after a command.
+SUCCESS = 0
+NOT_FOUND = 127
+
+GOODBYE = b"\n Goodbye!\r\n"
+NOT_FOUND_RESPONSE = b"Command not found.\r\n"
+
+
+def reads_stdin(handle) -> bool:
+    """ Whether a handler takes the output of the previous command in a pipeline. """
+    return "stdin" in inspect.signature(handle).parameters
+
+
+class Dispatcher:
+    def __init__(self, commands: dict, variables: dict, command_caching: dict | None = None, variable_caching: dict | None = None, cache: ResponseCache | None = None):
+        """ Runs parsed command lines against the command and variable registries.
+
+        The dispatch table is compiled once, command name -> (handler, whether it reads stdin),
+        so a command costs one dictionary lookup however many are chained on a line.
+
+        Responses of commands and variables declared "pure" or "session" are kept in `cache`, keyed on
+        the command's words and the hostname, and the username for "session". Handlers reading stdin are never cached.
+        """
+        self.variables = variables
+        self.table = {name: (handle, reads_stdin(handle)) for name, (handle, _) in commands.items()}
+        self.table["help"] = (self.help, False)
+        self.caching = {name: kind for name, kind in (command_caching or {}).items() if not self.table[name][1]}
+        self.caching.update({f"${name}": kind for name, kind in (variable_caching or {}).items()})
+        self.caching["help"] = "pure"
+        self.cache = cache if cache is not None else ResponseCache(0)
+        self.help_response = b"Available commands:\r\n" + b"".join(
+            "{:<8} - {:<10}\r\n".format(name, description).encode('utf-8') for name, (_, description) in commands.items()
+        ) + b"\r\n"
+
+    def help(self, server, command: str) -> bytes:
+        return self.help_response
+
+    def run(self, server, line: str) -> tuple:
+        """ Run every command of a line. Returns the output for the terminal and whether the session exits. """
+        try:
+            sequence = parse(line)
+        except ParseError as error:
+            funnel_logger.error(f"Session for {server.client_user}@{server.client_ip} sent an invalid command line: {line}")
+            return f"-bash: {error}\r\n".encode('utf-8'), False
+
+        output = []
+        status = SUCCESS
+        for operator, pipeline in sequence:
+            # A skipped pipeline leaves the status as it was, so `a && b || c` runs c when a fails.
+            if operator == "&&" and status != SUCCESS or operator == "||" and status == SUCCESS:
+                continue
+            stdin = b""
+            last = len(pipeline) - 1
+            for position, command in enumerate(pipeline):
+                if command.name == "exit":
+                    funnel_logger.info(f'Command {command.text}' + " executed by " f'{server.client_user}@{server.client_ip}')
+                    server_logger.info(f"Session for {server.client_user}@{server.client_ip} exited.")
+                    self.record("exit", 0.0)
+                    output.append(GOODBYE)
+                    return b"".join(output), True
+
+                response, status = self.execute(server, command, stdin)
+                if command.redirects_output:
+                    response = b""
+                # Errors go to the terminal, everything else to the next command of the pipeline.
+                if status == NOT_FOUND or position == last:
+                    output.append(response)
+                    stdin = b""
+                else:
+                    stdin = response
+        return b"".join(output), False
+
+    def execute(self, server, command, stdin: bytes) -> tuple:
+        """ Run one simple command with the output of the previous one as its input. Returns (response, status). """
+        name = command.name
+        if not name:
+            # Only redirections, like `> file`.
+            return b"", SUCCESS
+
+        started = time.perf_counter()
+        status = SUCCESS
+        entry = self.table.get(name)
+        key = self.cache_key(server, command) if self.cache.enabled else None
+        cached = self.cache.get(key) if key is not None else None
+        if cached is not None:
+            # Logged and counted like any other run, only the handler is skipped.
+            response, status = cached
+            if entry is None:
+                funnel_logger.info(f'Variable {command.text}' + " requested by " f'{server.client_user}@{server.client_ip}')
+            else:
+                funnel_logger.info(f'Command {command.text}' + " executed by " f'{server.client_user}@{server.client_ip}')
+            label = name
+
+        elif entry is not None:
+            handle, takes_stdin = entry
+            response = handle(server, command.text, stdin=stdin) if takes_stdin else handle(server, command.text)
+            # Commands that can fail return their exit status along with the response.
+            if isinstance(response, tuple):
+                response, status = response
+            funnel_logger.info(f'Command {command.text}' + " executed by " f'{server.client_user}@{server.client_ip}')
+            label = name
+
+        # Variables, like `$PATH`, print their value.
+        elif name.startswith("$") and name[1:] in self.variables:
+            response = f"{name[1:]}={self.variables[name[1:]][0](server, name[1:])}\r\n".encode('utf-8')
+            funnel_logger.info(f'Variable {command.text}' + " requested by " f'{server.client_user}@{server.client_ip}')
+            label = name
+
+        # Unknown commands and variables share one label, so bots cannot grow the metrics without bound.
+        elif name.startswith("$"):
+            response = b""
+            label = "unknown"
+        else:
+            funnel_logger.error(f"Session for {server.client_user}@{server.client_ip} executed unknown command: {command.text}")
+            response = NOT_FOUND_RESPONSE
+            status = NOT_FOUND
+            label = "unknown"
+
+        if key is not None and cached is None:
+            self.cache.put(key, (response, status))
+            metrics.RESPONSE_CACHE.inc("miss")
+        elif cached is not None:
+            metrics.RESPONSE_CACHE.inc("hit")
+        self.record(label, time.perf_counter() - started)
+        return response, status
+
+    def cache_key(self, server, command) -> tuple | None:
+        """ What the response of `command` depends on, or None if it cannot be cached. """
+        kind = self.caching.get(command.name)
+        # The argv, not the joined text, so `echo "a  b"` and `echo a b` are different keys.
+        if kind == "pure":
+            return tuple(command.argv), server.hostname
+        if kind == "session":
+            return tuple(command.argv), server.hostname, server.client_user
+        return None
+
+    @staticmethod
+    def record(label: str, seconds: float):
+        metrics.COMMANDS.inc(label)
+        metrics.COMMAND_SECONDS.observe(seconds)
+        profiling.STAGE_TIMES.record(f"{profiling.COMMAND_STAGE_PREFIX}{label}", seconds)
+
+
+# Compiled once, shared by every session of this process.
+DISPATCHER = Dispatcher(command_registry, variable_registry, command_caching, variable_caching)
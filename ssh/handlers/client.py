@@ -1,30 +1,51 @@
-import paramiko
 import ssh
+import time
+from honeypot import metrics, profiling
+from ssh.transport import create_transport
 from honeypot.logger import funnel_logger, server_logger
 
-def client_handle(client, addr, honeypot_server) -> None: 
+def client_handle(client, addr, honeypot_server, endpoint) -> None: 
     """Handle the client connection."""
     client_ip = addr[0]
-    username = honeypot_server.username 
-    password = honeypot_server.password 
-    hostname = honeypot_server.hostname 
+    # Credentials, hostname and banner are those of the endpoint the client connected to.
+    username = endpoint.username 
+    password = endpoint.password 
+    hostname = endpoint.hostname 
     env_directory = honeypot_server.env_directory
-    banner_message = honeypot_server.banner_message
+    banner_message = endpoint.banner_message
     
     try:
-        transport = paramiko.Transport(client)  
-        transport.local_version = "SSH-2.0-MySSHServer_1.0"
+        # Add the host keys, loaded once per process, and the configured algorithms to the transport.
+        transport = create_transport(
+            client,
+            honeypot_server.host_keys.keys(),
+            kex_algorithms=honeypot_server.kex_algorithms,
+            ciphers=honeypot_server.ciphers,
+            banner_timeout=honeypot_server.banner_timeout,
+            auth_timeout=honeypot_server.auth_timeout,
+            window_size=honeypot_server.window_size,
+            max_packet_size=honeypot_server.max_packet_size
+        )
         
         # Create a new instance of the Server class.
-        server = ssh.Server(client_ip=client_ip, input_username=username, input_password=password, hostname=hostname, env_directory=env_directory)
+        server = ssh.Server(client_ip=client_ip, input_username=username, input_password=password, hostname=hostname, env_directory=env_directory, persistence=honeypot_server.persistence, username_counts=honeypot_server.username_counts, auth_limiter=honeypot_server.auth_limiter, transport=transport)
         
-        # Add the host key to the server.
-        transport.add_server_key(server.host_key)
-        transport.start_server(server=server)
+        started = time.perf_counter()
+        try:
+            transport.start_server(server=server)
+        except Exception:
+            metrics.HANDSHAKE_FAILURES.inc()
+            raise
+        handshake_seconds = time.perf_counter() - started
+        metrics.HANDSHAKE_SECONDS.observe(handshake_seconds)
+        profiling.STAGE_TIMES.record("handshake", handshake_seconds)
         
-        # Establish the connection.
-        channel = transport.accept(100)
+        # Establish the connection, authentication happens while waiting for the channel.
+        with profiling.STAGE_TIMES.time("channel_open"):
+            channel = transport.accept(100)
         
+        if channel is None and server.rate_limited:
+            return
         if channel is None:
             funnel_logger.error(f"Client {client_ip} failed to open a channel.")
             server_logger.error(f"Client {client_ip} failed to open a channel.")
@@ -38,10 +59,12 @@ def client_handle(client, addr, honeypot_server) -> None:
             server_logger.info(f"Client {client_ip} disconnected from server.")
             
         except Exception as error:
-            print(error)
+            server_logger.error(f"Exception - Session for {client_ip} failed")
+            server_logger.error(error)
             
     except Exception as error:
-        print(error)
+        server_logger.error(f"Exception - Connection from {client_ip} failed")
+        server_logger.error(error)
 
     finally:
         try:
@@ -0,0 +1,77 @@
+import io
+import os
+import threading
+import paramiko
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ed25519
+from honeypot.logger import server_logger
+
+# Key file per algorithm, RSA keeps the original `server.key` name.
+KEY_FILES = {
+    "rsa": "server.key",
+    "ecdsa": "server_ecdsa.key",
+    "ed25519": "server_ed25519.key",
+}
+
+
+class HostKeyCache:
+    def __init__(self, key_directory: str = ".", algorithms: list | tuple = ("rsa",)):
+        """ Process-wide SSH host keys, loaded or generated once and shared by every transport. """
+        for algorithm in algorithms:
+            if algorithm not in KEY_FILES:
+                raise ValueError(f"Unsupported host key algorithm: {algorithm}")
+        self.key_directory = key_directory
+        self.algorithms = tuple(algorithms)
+        self.__keys = None
+        self.__lock = threading.Lock()
+
+    def keys(self) -> list:
+        """ Host keys in order of preference, loaded on first use. """
+        if self.__keys is None:
+            self.load()
+        return self.__keys
+
+    def load(self):
+        with self.__lock:
+            if self.__keys is not None:
+                return
+            os.makedirs(self.key_directory, exist_ok=True)
+            self.__keys = [self.__load_or_generate(algorithm) for algorithm in self.algorithms]
+
+    def __load_or_generate(self, algorithm: str) -> paramiko.PKey:
+        path = os.path.join(self.key_directory, KEY_FILES[algorithm])
+        try:
+            server_logger.info(f"Loading {algorithm} server key.")
+            key = self.__load(algorithm, path)
+            server_logger.info(f"{algorithm} server key loaded.")
+            return key
+        except FileNotFoundError:
+            pass
+
+        server_logger.info(f"Creating {algorithm} server key.")
+        if algorithm == "rsa":
+            key = paramiko.RSAKey.generate(2048)
+        elif algorithm == "ecdsa":
+            key = paramiko.ECDSAKey.generate(bits=256)
+        else:
+            # Paramiko cannot generate Ed25519 keys, so the key is created with cryptography directly.
+            key_data = ed25519.Ed25519PrivateKey.generate().private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.OpenSSH, serialization.NoEncryption()).decode()
+            key = paramiko.Ed25519Key(file_obj=io.StringIO(key_data))
+
+        # Write to a temporary file and rename it so a partially written key is never loaded.
+        temporary_path = f"{path}.tmp"
+        if algorithm == "ed25519":
+            with os.fdopen(os.open(temporary_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), "w") as key_file:
+                key_file.write(key_data)
+        else:
+            key.write_private_key_file(temporary_path)
+        os.replace(temporary_path, path)
+        server_logger.info(f"{algorithm} server key created.")
+        return key
+
+    def __load(self, algorithm: str, path: str) -> paramiko.PKey:
+        if algorithm == "rsa":
+            return paramiko.RSAKey(filename=path)
+        if algorithm == "ecdsa":
+            return paramiko.ECDSAKey(filename=path)
+        return paramiko.Ed25519Key(filename=path)
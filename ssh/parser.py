@@ -0,0 +1,117 @@
+import re
+
+# One alternative per token kind, tried in order at every position of the line.
+TOKEN_PATTERN = re.compile(r"""
+    (?P<space>[ \t\r\n]+)
+  | (?P<operator>&&|\|\||;|\||&(?!>))
+  | (?P<redirect>&>>?|\d*>>|\d*>&\d*|\d*>|\d*<)
+  | (?P<comment>\#.*)
+  | (?P<word>(?:[^\s'"\\;&|<>]|\\.|'[^']*'|"(?:[^"\\]|\\.)*")+)
+  | (?P<unterminated>['"\\].*)
+""", re.VERBOSE | re.DOTALL)
+
+# Redirections to another descriptor, `2>&1`, carry their target.
+DUPLICATE_PATTERN = re.compile(r">&\d+$")
+# Quoted parts and escapes inside a word, for words that have any.
+QUOTE_PATTERN = re.compile(r"""'([^']*)'|"((?:[^"\\]|\\.)*)"|\\(.)""", re.DOTALL)
+ESCAPE_PATTERN = re.compile(r"""\\([\\"$`])""")
+
+# Operators between pipelines, `&` runs in the background and is sequenced like `;`.
+SEQUENCE_OPERATORS = {";": ";", "&": ";", "&&": "&&", "||": "||"}
+
+
+class ParseError(ValueError):
+    pass
+
+
+class SimpleCommand:
+    __slots__ = ("argv", "redirects")
+
+    def __init__(self, argv: list, redirects: list):
+        """ Words of one command, unquoted, and its redirections as (operator, target) pairs. """
+        self.argv = argv
+        self.redirects = redirects
+
+    @property
+    def name(self) -> str:
+        return self.argv[0] if self.argv else ""
+
+    @property
+    def text(self) -> str:
+        return " ".join(self.argv)
+
+    @property
+    def redirects_output(self) -> bool:
+        """ Whether standard output goes to a file instead of the terminal. """
+        # `>`, `1>>`, `&>` and `>& file` do, `2>` and `>&2` do not.
+        return any(operator.startswith("&>") or ">" in operator and operator.lstrip("1")[0] in ">&" and target is not None for operator, target in self.redirects)
+
+    def __repr__(self) -> str:
+        return f"SimpleCommand({self.argv!r}, {self.redirects!r})"
+
+
+def unquote(word: str) -> str:
+    if "'" not in word and '"' not in word and "\\" not in word:
+        return word
+    return QUOTE_PATTERN.sub(lambda match: match.group(1) if match.group(1) is not None else ESCAPE_PATTERN.sub(r"\1", match.group(2)) if match.group(2) is not None else match.group(3), word)
+
+
+def tokenize(line: str) -> list:
+    """ Split a command line into (kind, value) tokens: word, operator and redirect. """
+    tokens = []
+    for match in TOKEN_PATTERN.finditer(line):
+        kind = match.lastgroup
+        if kind == "word":
+            tokens.append(("word", unquote(match.group())))
+        elif kind == "operator" or kind == "redirect":
+            tokens.append((kind, match.group()))
+        elif kind == "unterminated":
+            # A shell would wait for the closing quote, the rest of the line is taken as one word.
+            tokens.append(("word", match.group()[1:]))
+        elif kind == "comment":
+            break
+    return tokens
+
+
+def parse(line: str) -> list:
+    """ Parse a command line into a list of (operator, pipeline) pairs, a pipeline being a list of SimpleCommand.
+
+    The operator joins the pipeline to the one before it: ";", "&&" or "||", None for the first one.
+    """
+    sequence = []
+    pipeline = []
+    argv, redirects = [], []
+    operator = None
+    tokens = tokenize(line)
+    index = 0
+    while index < len(tokens):
+        kind, value = tokens[index]
+        index += 1
+        if kind == "word":
+            argv.append(value)
+        elif kind == "redirect":
+            # `2>&1` and `>&2` carry their target, every other redirection takes the next word.
+            if DUPLICATE_PATTERN.search(value):
+                redirects.append((value, None))
+            elif index < len(tokens) and tokens[index][0] == "word":
+                redirects.append((value, tokens[index][1]))
+                index += 1
+            else:
+                raise ParseError(f"syntax error near unexpected token `{tokens[index][1] if index < len(tokens) else 'newline'}'")
+        else:
+            if not argv and not redirects:
+                raise ParseError(f"syntax error near unexpected token `{value}'")
+            pipeline.append(SimpleCommand(argv, redirects))
+            argv, redirects = [], []
+            if value != "|":
+                sequence.append((operator, pipeline))
+                pipeline = []
+                operator = SEQUENCE_OPERATORS[value]
+
+    if argv or redirects:
+        pipeline.append(SimpleCommand(argv, redirects))
+        sequence.append((operator, pipeline))
+    elif pipeline or operator in ("&&", "||"):
+        # A line may end in `;` or `&`, not in the middle of a pipeline or a condition.
+        raise ParseError("syntax error: unexpected end of file")
+    return sequence
@@ -0,0 +1,42 @@
+import paramiko
+
+# Version string sent to clients.
+LOCAL_VERSION = "SSH-2.0-MySSHServer_1.0"
+
+
+def create_transport(client, host_keys: list, kex_algorithms: list | None = None, ciphers: list | None = None, banner_timeout: float | None = None, auth_timeout: float | None = None, window_size: int | None = None, max_packet_size: int | None = None) -> paramiko.Transport:
+    """Create a server transport for `client` with the given host keys and algorithm preferences.
+
+    Unset options keep paramiko's defaults. Algorithm lists are in order of preference and
+    must only contain algorithms paramiko supports.
+    """
+    options = {}
+    if window_size:
+        options["default_window_size"] = window_size
+    if max_packet_size:
+        options["default_max_packet_size"] = max_packet_size
+    transport = paramiko.Transport(client, **options)
+    transport.local_version = LOCAL_VERSION
+
+    if banner_timeout:
+        transport.banner_timeout = banner_timeout
+    if auth_timeout:
+        transport.auth_timeout = auth_timeout
+
+    security_options = transport.get_security_options()
+    if kex_algorithms:
+        security_options.kex = tuple(kex_algorithms)
+    if ciphers:
+        security_options.ciphers = tuple(ciphers)
+
+    for host_key in host_keys:
+        transport.add_server_key(host_key)
+    return transport
+
+
+def validate_algorithms(kex_algorithms: list | None = None, ciphers: list | None = None):
+    """ Raise a ValueError at startup for algorithms paramiko does not support, instead of on every connection. """
+    unsupported = [kex for kex in kex_algorithms or [] if kex not in paramiko.Transport._kex_info]
+    unsupported += [cipher for cipher in ciphers or [] if cipher not in paramiko.Transport._cipher_info]
+    if unsupported:
+        raise ValueError(f"Unsupported SSH algorithms: {', '.join(unsupported)}")
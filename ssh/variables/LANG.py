@@ -1,4 +1,5 @@
 def handle(server, command):
     return "en_US.UTF-8\r\n"
 
-description = "Get the current language setting"
\ No newline at end of file
+description = "Get the current language setting"
+caching = "pure"
\ No newline at end of file
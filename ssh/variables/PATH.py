@@ -2,3 +2,4 @@ def handle(server, command):
     return "/usr/local/sbin:/usr/local/bin:/usr/sbin:/usr/bin:/sbin:/bin\r\n"
 
 description = "Get the system path variable"
+caching = "pure"
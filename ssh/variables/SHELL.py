@@ -1,4 +1,5 @@
 def handle(server, command):
     return "/bin/zsh\r\n"
 
-description = "Get the shell of the user"
\ No newline at end of file
+description = "Get the shell of the user"
+caching = "pure"
\ No newline at end of file
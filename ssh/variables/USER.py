@@ -2,3 +2,4 @@ def handle(server, command):
     return f"{server.client_user}\r\n\r\n"
 
 description = "Print the user name."
+caching = "session"
@@ -3,6 +3,8 @@ import importlib
 
 # Basic dictionary to store the command name and the function to call
 variable_registry = {}
+# How each variable's response may be cached, see honeypot.response_cache. Variables that do not declare it are never cached.
+variable_caching = {}
 
 def load_variables():
     """Load all the commands in the commands directory."""
@@ -15,6 +17,7 @@ def load_variables():
             module = importlib.import_module(module_name)
             # Add the module to the command registry
             variable_registry[module_name.split('.')[-1]] = (module.handle, module.description)
+            variable_caching[module_name.split('.')[-1]] = getattr(module, "caching", None)
 
 # Load all the commands
 load_variables()
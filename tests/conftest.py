@@ -0,0 +1,6 @@
+import os
+import sys
+
+# Tests import the packages from the repository root, honeypot first as main.py does.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import honeypot  # noqa: E402,F401
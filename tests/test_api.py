@@ -0,0 +1,84 @@
+import json
+import os
+import pytest
+from honeypot import webserver
+from honeypot.storage import create_storage
+
+LOGINS = [
+    {"timestamp": f"2024-01-0{1 + index // 3} 10:00:0{index % 3}", "ip": f"198.51.100.{index % 2}", "username": "root", "password": f"password{index}", "successfull_login": False}
+    for index in range(7)
+]
+SESSION = "198.51.100.1_2024-01-01_10-00-00.ndjson"
+SESSION_COMMANDS = [{"timestamp": f"2024-01-01 10:00:0{index}", "command": f"echo {index}"} for index in range(5)]
+
+
+@pytest.fixture(params=["journal", "sqlite"])
+def client(request, tmp_path):
+    storage = create_storage(request.param, str(tmp_path))
+    for record in LOGINS:
+        storage.write("login", record)
+    storage.commit()
+    os.makedirs(storage.command_history_directory, exist_ok=True)
+    with open(os.path.join(storage.command_history_directory, SESSION), "w") as history_file:
+        history_file.writelines(json.dumps(record) + "\n" for record in SESSION_COMMANDS)
+
+    webserver.set_storage(storage)
+    client = webserver.app.test_client()
+    client.backend = request.param
+    yield client
+    storage.close()
+
+
+def pages(client, path: str, **arguments) -> list:
+    """ Every page of an API endpoint, following next_cursor until it is null. """
+    result, cursor = [], None
+    while True:
+        query = {**arguments, **({"cursor": cursor} if cursor is not None else {})}
+        response = client.get(path, query_string=query)
+        assert response.status_code == 200, response.get_json()
+        page = response.get_json()
+        result.append(page["items"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return result
+
+
+@pytest.mark.parametrize("limit", [1, 2, 3, 7, 100])
+def test_cursor_round_trip(client, limit):
+    result = pages(client, "/api/logins", limit=limit)
+    assert [item["password"] for page in result for item in page] == [record["password"] for record in LOGINS]
+    assert all(len(page) == limit for page in result[:-1])
+
+
+def test_cursor_round_trip_with_filters(client):
+    result = pages(client, "/api/logins", limit=2, ip="198.51.100.1", start="2024-01-02")
+    assert [item["password"] for page in result for item in page] == ["password3", "password5"]
+
+
+def test_session_cursor_round_trip(client):
+    result = pages(client, f"/api/sessions/{SESSION}", limit=2)
+    assert [item["command"] for page in result for item in page] == [record["command"] for record in SESSION_COMMANDS]
+    assert [len(page) for page in result] == [2, 2, 1]
+
+
+@pytest.mark.parametrize("cursor", ["abc", "1:2:3", "-1", "2024-01-01:x", "9" * 30, "2024-01-01:" + "9" * 30, "../../etc/passwd", "1e3"])
+def test_malformed_cursor_is_rejected(client, cursor):
+    for path in ("/api/logins", "/api/commands", f"/api/sessions/{SESSION}"):
+        response = client.get(path, query_string={"cursor": cursor})
+        assert response.status_code == 400, path
+        assert response.get_json() == {"error": "Invalid cursor."}
+
+
+def test_cursor_of_the_other_backend_is_rejected(client):
+    # A journal cursor is `<day>:<offset>`, an SQLite cursor is a row id.
+    cursor = "5" if client.backend == "journal" else "2024-01-01:0"
+    response = client.get("/api/logins", query_string={"cursor": cursor})
+    assert response.status_code == 400
+    assert response.get_json() == {"error": "Invalid cursor."}
+
+
+@pytest.mark.parametrize("name", ["start", "end"])
+def test_malformed_date_filter_is_rejected(client, name):
+    response = client.get("/api/logins", query_string={name: "yesterday"})
+    assert response.status_code == 400
+    assert response.get_json() == {"error": f"Invalid {name}, expected YYYY-MM-DD."}
@@ -0,0 +1,70 @@
+import os
+import pytest
+from honeypot.columnar import ColumnarStore
+from honeypot.storage import count_daily, create_storage
+
+pytest.importorskip("pyarrow")
+
+
+def login(index: int, day: str) -> dict:
+    return {"timestamp": f"{day} 10:00:{index % 60:02d}", "ip": f"198.51.100.{index % 3}", "username": "root", "password": f"password{index % 4}", "successfull_login": False}
+
+
+def write(storage, records: list):
+    for record in records:
+        storage.write("login", record)
+    storage.commit()
+
+
+@pytest.mark.parametrize("backend", ["journal", "sqlite"])
+def test_closed_days_are_compacted_once(tmp_path, backend):
+    storage = create_storage(backend, str(tmp_path))
+    write(storage, [login(index, "2024-01-01") for index in range(5)] + [login(index, "2024-01-02") for index in range(3)])
+    store = ColumnarStore(str(tmp_path))
+
+    assert store.compact(storage, before="2024-01-02") == 1
+    assert store.days("login") == ["2024-01-01"]
+    assert store.rows("login", "2024-01-01") == 5
+    assert store.compact(storage, before="2024-01-02") == 0
+    storage.close()
+
+
+@pytest.mark.parametrize("backend", ["journal", "sqlite"])
+def test_late_writes_to_a_compacted_day_are_compacted_again(tmp_path, backend):
+    storage = create_storage(backend, str(tmp_path))
+    records = [login(index, "2024-01-01") for index in range(5)]
+    write(storage, records)
+    store = ColumnarStore(str(tmp_path))
+    store.compact(storage, before="2024-01-02")
+
+    late = [login(index, "2024-01-01") for index in range(5, 7)]
+    write(storage, late)
+    assert store.compact(storage, before="2024-01-02") == 1
+    assert store.rows("login", "2024-01-01") == 7
+    assert sorted(store.read("login", columns=["password"]).column("password").to_pylist()) == sorted(record["password"] for record in records + late)
+    storage.close()
+
+
+def test_journal_counts_use_up_to_date_copies_only(tmp_path):
+    storage = create_storage("journal", str(tmp_path))
+    records = [login(index, "2024-01-01") for index in range(6)]
+    write(storage, records)
+    store = ColumnarStore(str(tmp_path))
+    store.compact(storage, before="2024-01-02")
+    storage.columnar = store
+    partition = storage.partition_path("login", "2024-01-01")
+    path = store.path("login", "2024-01-01")
+    assert store.daily_counts("login", "2024-01-01", partition, "password") is not None
+    assert storage.daily_counts("login", group_by="password") == count_daily(records, "password")
+
+    # A late write makes the copy stale, the day is counted from the journal until it is compacted again.
+    late = [login(6, "2024-01-01")]
+    write(storage, late)
+    os.utime(path, (os.path.getmtime(partition) - 10,) * 2)
+    assert store.daily_counts("login", "2024-01-01", partition, "password") is None
+    assert storage.daily_counts("login", group_by="password") == count_daily(records + late, "password")
+
+    store.compact(storage, before="2024-01-02")
+    assert store.daily_counts("login", "2024-01-01", partition, "password") is not None
+    assert storage.daily_counts("login", group_by="password") == count_daily(records + late, "password")
+    storage.close()
@@ -0,0 +1,113 @@
+from types import SimpleNamespace
+import pytest
+from honeypot.response_cache import ResponseCache
+from ssh.commands import command_caching, command_registry
+from ssh.dispatch import GOODBYE, NOT_FOUND_RESPONSE, Dispatcher
+from ssh.parser import parse
+from ssh.variables import variable_caching, variable_registry
+
+
+@pytest.fixture
+def server():
+    return SimpleNamespace(client_user="root", client_ip="203.0.113.7", hostname="honeypot")
+
+
+@pytest.fixture
+def dispatcher():
+    return Dispatcher(command_registry, variable_registry, command_caching, variable_caching)
+
+
+def parse_one(line: str) -> tuple:
+    [(_, [command])] = parse(line)
+    return (command,)
+
+
+def run(dispatcher, server, line: str) -> bytes:
+    output, closing = dispatcher.run(server, line)
+    assert not closing
+    return output
+
+
+@pytest.mark.parametrize("line, output", [
+    ("echo a && echo b", b"a\r\nb\r\n"),
+    ("echo a || echo b", b"a\r\n"),
+    ("nope && echo b", NOT_FOUND_RESPONSE),
+    ("nope || echo b", NOT_FOUND_RESPONSE + b"b\r\n"),
+    ("nope; echo b", NOT_FOUND_RESPONSE + b"b\r\n"),
+    # A skipped pipeline keeps the status of the last one that ran.
+    ("nope && echo b || echo c", NOT_FOUND_RESPONSE + b"c\r\n"),
+    ("echo a || echo b && echo c", b"a\r\nc\r\n"),
+    ("echo a | grep b && echo found || echo missing", b"missing\r\n"),
+    ("echo ab | grep b && echo found || echo missing", b"ab\r\nfound\r\n"),
+])
+def test_and_or_short_circuit(dispatcher, server, line, output):
+    assert run(dispatcher, server, line) == output
+
+
+@pytest.mark.parametrize("line, output", [
+    ("echo a > /tmp/out", b""),
+    ("echo a >> /tmp/out; echo b", b"b\r\n"),
+    ("echo a &> /dev/null", b""),
+    ("echo a 2> /dev/null", b"a\r\n"),
+    ("echo a >&2", b"a\r\n"),
+    ("> /tmp/out", b""),
+    # The status is kept, the redirected command still succeeded.
+    ("echo a > /tmp/out && echo b", b"b\r\n"),
+])
+def test_redirect_suppresses_output(dispatcher, server, line, output):
+    assert run(dispatcher, server, line) == output
+
+
+@pytest.mark.parametrize("line, output", [
+    ("echo one | wc -l", b"1\r\n"),
+    ("echo one two | wc -w", b"2\r\n"),
+    ("echo one two | wc", b"      1       2       8\r\n"),
+    ("echo Root | grep -i root", b"Root\r\n"),
+    ("echo root | grep -v root", b""),
+    ("echo root | grep -c o", b"1\r\n"),
+    ("echo root | grep x | wc -l", b"0\r\n"),
+    ("echo a | head -n 1", b"a\r\n"),
+    ("echo a | head -0", b""),
+    ("echo a | head -n x", b"head: invalid number of lines: 'x'\r\n"),
+    # Commands that do not read stdin ignore it, as `echo a | echo b` prints b.
+    ("echo a | echo b", b"b\r\n"),
+])
+def test_pipe_stdin(dispatcher, server, line, output):
+    assert run(dispatcher, server, line) == output
+
+
+def test_unknown_command_in_pipeline_goes_to_the_terminal(dispatcher, server):
+    assert run(dispatcher, server, "nope | wc -l") == NOT_FOUND_RESPONSE + b"0\r\n"
+
+
+def test_grep_status(dispatcher, server):
+    assert dispatcher.execute(server, *parse_one("grep a"), b"a\r\n")[1] == 0
+    assert dispatcher.execute(server, *parse_one("grep b"), b"a\r\n")[1] == 1
+    assert dispatcher.execute(server, *parse_one("grep"), b"")[1] == 2
+    assert dispatcher.execute(server, *parse_one("grep a /etc/passwd"), b"")[1] == 2
+
+
+def test_unknown_command_status(dispatcher, server):
+    assert dispatcher.execute(server, *parse_one("nope"), b"") == (NOT_FOUND_RESPONSE, 127)
+
+
+def test_variables(dispatcher, server):
+    assert run(dispatcher, server, "$USER").startswith(b"USER=")
+    assert run(dispatcher, server, "$NOPE") == b""
+
+
+def test_exit_closes_the_session(dispatcher, server):
+    assert dispatcher.run(server, "echo a; exit; echo b") == (b"a\r\n" + GOODBYE, True)
+    assert dispatcher.run(server, "nope || exit") == (NOT_FOUND_RESPONSE + GOODBYE, True)
+    assert dispatcher.run(server, "echo a || exit") == (b"a\r\n", False)
+
+
+def test_parse_error_is_reported(dispatcher, server):
+    assert dispatcher.run(server, "echo a &&") == (b"-bash: syntax error: unexpected end of file\r\n", False)
+
+
+def test_cached_responses_match(server):
+    dispatcher = Dispatcher(command_registry, variable_registry, command_caching, variable_caching, cache=ResponseCache(16))
+    first = run(dispatcher, server, "hostname; pwd")
+    assert run(dispatcher, server, "hostname; pwd") == first
+    assert dispatcher.cache.total_hits == 2
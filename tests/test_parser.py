@@ -0,0 +1,98 @@
+import pytest
+from ssh.parser import ParseError, parse, tokenize
+
+
+def commands(line: str) -> list:
+    """ (operator, [argv of each command of the pipeline]) pairs of a parsed line. """
+    return [(operator, [command.argv for command in pipeline]) for operator, pipeline in parse(line)]
+
+
+def test_words_are_split_on_whitespace():
+    assert commands("uname  -a\t-r") == [(None, [["uname", "-a", "-r"]])]
+
+
+@pytest.mark.parametrize("line, argv", [
+    ("echo 'a  b'", ["echo", "a  b"]),
+    ('echo "a  b"', ["echo", "a  b"]),
+    ("echo a\\ b", ["echo", "a b"]),
+    ('echo "say \\"hi\\""', ["echo", 'say "hi"']),
+    ("echo 'it''s'", ["echo", "its"]),
+    ('echo pre"mid"\'end\'', ["echo", "premidend"]),
+    ("echo '&& ; |'", ["echo", "&& ; |"]),
+    ('echo "\\n"', ["echo", "\\n"]),
+])
+def test_quotes_and_escapes(line, argv):
+    assert commands(line) == [(None, [argv])]
+
+
+def test_unterminated_quote_takes_the_rest_of_the_line():
+    assert commands("echo 'a b; c") == [(None, [["echo", "a b; c"]])]
+
+
+def test_comment_ends_the_line():
+    assert commands("whoami # && reboot") == [(None, [["whoami"]])]
+    assert commands("echo '#' x") == [(None, [["echo", "#", "x"]])]
+
+
+def test_sequence_operators():
+    assert commands("a; b && c || d & e") == [
+        (None, [["a"]]),
+        (";", [["b"]]),
+        ("&&", [["c"]]),
+        ("||", [["d"]]),
+        (";", [["e"]]),
+    ]
+
+
+def test_pipelines():
+    assert commands("ps | grep ssh | wc -l && whoami") == [(None, [["ps"], ["grep", "ssh"], ["wc", "-l"]]), ("&&", [["whoami"]])]
+
+
+def test_trailing_separator_is_allowed():
+    assert commands("whoami;") == [(None, [["whoami"]])]
+    assert commands("whoami &") == [(None, [["whoami"]])]
+    assert commands("") == []
+
+
+@pytest.mark.parametrize("line", ["&& whoami", "whoami &&", "whoami ||", "whoami |", "a | | b", "; a", "echo >", "echo > ;"])
+def test_syntax_errors(line):
+    with pytest.raises(ParseError):
+        parse(line)
+
+
+@pytest.mark.parametrize("line, redirects", [
+    ("echo a > out", [(">", "out")]),
+    ("echo a>>out", [(">>", "out")]),
+    ("echo a 2> err", [("2>", "err")]),
+    ("echo a 2>&1", [("2>&1", None)]),
+    ("echo a &> all", [("&>", "all")]),
+    ("cat < in", [("<", "in")]),
+])
+def test_redirections_take_their_target(line, redirects):
+    [(_, [command])] = parse(line)
+    assert command.redirects == redirects
+    assert command.name == line.split()[0]
+
+
+@pytest.mark.parametrize("line, redirected", [
+    ("echo a > out", True),
+    ("echo a 1> out", True),
+    ("echo a >> out", True),
+    ("echo a 1>> out", True),
+    ("echo a &> out", True),
+    ("echo a &>> out", True),
+    ("echo a >& out", True),
+    ("echo a 2> err", False),
+    ("echo a 2>> err", False),
+    ("echo a >&2", False),
+    ("echo a 2>&1", False),
+    ("echo a < in", False),
+    ("echo '>' out", False),
+])
+def test_redirects_output(line, redirected):
+    [(_, [command])] = parse(line)
+    assert command.redirects_output is redirected
+
+
+def test_tokenize_keeps_operators_and_redirects():
+    assert tokenize("a>b&&c") == [("word", "a"), ("redirect", ">"), ("word", "b"), ("operator", "&&"), ("word", "c")]
@@ -0,0 +1,41 @@
+from honeypot.profiling import StageTimes
+
+
+def test_stages_are_listed_in_connection_order_then_commands():
+    times = StageTimes()
+    for stage in ("command:uname", "auth", "accept", "command:ls", "handshake"):
+        times.record(stage, 0.1)
+    assert list(times.percentiles()) == ["accept", "handshake", "auth", "command:ls", "command:uname"]
+
+
+def test_worker_snapshots_are_merged():
+    supervisor, worker = StageTimes(), StageTimes()
+    supervisor.record("persistence", 0.5)
+    for seconds in (0.1, 0.2, 0.3):
+        worker.record("handshake", seconds)
+    supervisor.update_remote("worker-0-100", worker.snapshot())
+    supervisor.update_remote("worker-1-101", {"handshake": (1, [0.9]), "auth": (1, [0.01])})
+
+    percentiles = supervisor.percentiles()
+    assert percentiles["handshake"]["count"] == 4
+    assert percentiles["handshake"]["max"] == 0.9
+    assert percentiles["handshake"]["p50"] == 0.3
+    assert percentiles["persistence"]["count"] == 1
+    assert percentiles["auth"]["count"] == 1
+
+    # A newer snapshot of a worker replaces its previous one.
+    worker.record("handshake", 0.4)
+    supervisor.update_remote("worker-0-100", worker.snapshot())
+    assert supervisor.percentiles()["handshake"]["count"] == 5
+
+    supervisor.retire_remote("worker-1-101")
+    assert "auth" not in supervisor.percentiles()
+    assert supervisor.percentiles()["handshake"]["count"] == 4
+
+
+def test_window_keeps_the_latest_durations():
+    times = StageTimes(window=3)
+    for seconds in (5.0, 1.0, 2.0, 3.0):
+        times.record("accept", seconds)
+    assert times.snapshot() == {"accept": (4, [1.0, 2.0, 3.0])}
+    assert times.percentiles()["accept"]["max"] == 3.0
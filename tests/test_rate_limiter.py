@@ -0,0 +1,89 @@
+from types import SimpleNamespace
+import pytest
+from honeypot import metrics, rate_limiter
+from honeypot.rate_limiter import RateLimiter
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """ A monotonic clock that only moves when the test advances it. """
+    now = SimpleNamespace(value=1000.0)
+    monkeypatch.setattr(rate_limiter, "time", SimpleNamespace(monotonic=lambda: now.value))
+    return now
+
+
+def admit_all(limiter: RateLimiter, ip: str, attempts: int) -> list:
+    return [limiter.admit(ip) for _ in range(attempts)]
+
+
+def test_zero_rate_disables_the_limiter(clock):
+    limiter = RateLimiter(0, 1)
+    assert not limiter.enabled
+    assert admit_all(limiter, "198.51.100.1", 100) == ["allow"] * 100
+    assert limiter.stats()["tracked"] == 0
+
+
+def test_burst_then_limited(clock):
+    limiter = RateLimiter(1, 3, policy="drop")
+    assert admit_all(limiter, "198.51.100.1", 5) == ["allow", "allow", "allow", "drop", "drop"]
+    assert limiter.stats()["total_allowed"] == 3
+    assert limiter.stats()["total_limited"] == 2
+
+
+def test_tokens_refill_at_the_rate(clock):
+    limiter = RateLimiter(2, 2, policy="drop")
+    admit_all(limiter, "198.51.100.1", 2)
+    clock.value += 0.25
+    assert limiter.admit("198.51.100.1") == "drop"
+    # Half a token from the first quarter second, half from the second.
+    clock.value += 0.25
+    assert limiter.admit("198.51.100.1") == "allow"
+    assert limiter.admit("198.51.100.1") == "drop"
+
+
+def test_refill_is_capped_at_the_burst(clock):
+    limiter = RateLimiter(1, 2, policy="drop")
+    admit_all(limiter, "198.51.100.1", 2)
+    clock.value += 3600
+    assert admit_all(limiter, "198.51.100.1", 3) == ["allow", "allow", "drop"]
+
+
+def test_sources_have_their_own_bucket(clock):
+    limiter = RateLimiter(1, 1, policy="drop")
+    assert limiter.admit("198.51.100.1") == "allow"
+    assert limiter.admit("198.51.100.1") == "drop"
+    assert limiter.admit("198.51.100.2") == "allow"
+
+
+@pytest.mark.parametrize("policy, sample_rate, decision, label", [
+    ("slow", 0.1, "slow", "slowed"),
+    ("drop", 0.1, "drop", "dropped"),
+    ("sample", 1.0, "allow", "sampled"),
+    ("sample", 0.0, "drop", "dropped"),
+])
+def test_policies(clock, policy, sample_rate, decision, label):
+    limiter = RateLimiter(1, 1, policy=policy, sample_rate=sample_rate, name=f"test_{policy}_{sample_rate}")
+    limiter.admit("198.51.100.1")
+    before = metrics.RATE_LIMIT_DECISIONS.value(limiter.name, label)
+    assert limiter.admit("198.51.100.1") == decision
+    assert metrics.RATE_LIMIT_DECISIONS.value(limiter.name, label) == before + 1
+
+
+def test_unknown_policy():
+    with pytest.raises(ValueError):
+        RateLimiter(1, 1, policy="ban")
+
+
+def test_least_recently_seen_source_is_evicted(clock):
+    limiter = RateLimiter(1, 1, policy="drop", max_entries=2, name="test_eviction")
+    admit_all(limiter, "198.51.100.1", 2)
+    admit_all(limiter, "198.51.100.2", 2)
+    # Seeing .1 again makes .2 the least recently seen.
+    assert limiter.admit("198.51.100.1") == "drop"
+    assert limiter.admit("198.51.100.3") == "allow"
+
+    assert limiter.stats() == {"tracked": 2, "total_allowed": 3, "total_limited": 3, "total_evicted": 1}
+    assert metrics.RATE_LIMIT_EVICTIONS.value("test_eviction") == 1
+    # .1 kept its empty bucket, .2 was forgotten and starts again with a full one.
+    assert limiter.admit("198.51.100.1") == "drop"
+    assert limiter.admit("198.51.100.2") == "allow"
@@ -0,0 +1,152 @@
+import os
+import sqlite3
+from collections import Counter
+import pytest
+from honeypot.aggregates import AggregateCache
+from honeypot.rollups import TOTAL
+from honeypot.storage import JournalStorage, SQLiteStorage, count_daily, create_storage
+
+
+def login(index: int, day: str = "2024-01-01") -> dict:
+    return {"timestamp": f"{day} 10:{index // 60 % 60:02d}:{index % 60:02d}", "ip": f"198.51.100.{index % 3}", "username": f"user{index % 2}", "password": f"password{index % 4}", "successfull_login": index % 5 == 0}
+
+
+def write(storage, records: list):
+    for record in records:
+        storage.write("login", record)
+    storage.commit()
+
+
+def expected(records: list, dimension: str = TOTAL) -> list:
+    counts = Counter((record["timestamp"][:10], None if dimension == TOTAL else record[dimension]) for record in records)
+    return sorted(((day, key, count) for (day, key), count in counts.items()), key=lambda item: (item[0], str(item[1])))
+
+
+def truncate_partition(storage: JournalStorage, day: str, lines: int):
+    """ Rewrite a day partition with only its first `lines` records, as a restore from an older copy would. """
+    path = storage.partition_path("login", day)
+    with open(path) as partition:
+        kept = partition.readlines()[:lines]
+    with open(path, "w") as partition:
+        partition.writelines(kept)
+
+
+def assert_rollups(storage, records: list):
+    for dimension in (TOTAL, "ip", "username", "successfull_login"):
+        assert storage.rollup("login", dimension) == expected(records, dimension), dimension
+
+
+# Journal: the rollups are saved with the journal offset they count up to.
+
+def test_journal_rollups_resume_after_a_clean_restart(tmp_path):
+    records = [login(index) for index in range(20)] + [login(index, "2024-01-02") for index in range(5)]
+    storage = JournalStorage(str(tmp_path))
+    write(storage, records)
+    storage.close()
+
+    restarted = JournalStorage(str(tmp_path))
+    assert_rollups(restarted, records)
+    # The saved offset is the end of the partition, nothing had to be read again.
+    assert restarted.rollups.load("login", "2024-01-01") == os.path.getsize(restarted.partition_path("login", "2024-01-01"))
+
+
+def test_journal_rollups_fold_in_records_committed_after_the_last_save(tmp_path):
+    saved = [login(index) for index in range(10)]
+    unsaved = [login(index) for index in range(10, 16)] + [login(index, "2024-01-02") for index in range(3)]
+    storage = JournalStorage(str(tmp_path))
+    write(storage, saved)
+    # Rollups are saved at most every 30 seconds, this commit reaches the journal only.
+    write(storage, unsaved)
+    assert storage.rollups.load("login", "2024-01-01") < os.path.getsize(storage.partition_path("login", "2024-01-01"))
+
+    # Restarted without closing, as after a crash: each record is counted exactly once.
+    restarted = JournalStorage(str(tmp_path))
+    assert_rollups(restarted, saved + unsaved)
+    restarted.close()
+    assert_rollups(JournalStorage(str(tmp_path)), saved + unsaved)
+
+
+def test_journal_rollups_are_rebuilt_when_missing_or_corrupt(tmp_path):
+    records = [login(index) for index in range(12)]
+    storage = JournalStorage(str(tmp_path))
+    write(storage, records)
+    storage.close()
+
+    with open(storage.rollups.path("login", "2024-01-01"), "w") as rollup_file:
+        rollup_file.write("{not json")
+    assert_rollups(JournalStorage(str(tmp_path)), records)
+
+    os.remove(storage.rollups.path("login", "2024-01-01"))
+    assert_rollups(JournalStorage(str(tmp_path)), records)
+
+
+def test_journal_rollups_recount_a_partition_that_shrank(tmp_path):
+    storage = JournalStorage(str(tmp_path))
+    write(storage, [login(index) for index in range(12)])
+    storage.close()
+
+    # The partition now holds fewer records than the saved offset covers.
+    truncate_partition(storage, "2024-01-01", 3)
+    assert_rollups(JournalStorage(str(tmp_path)), [login(index) for index in range(3)])
+
+
+# SQLite: rollups are a table written in the same transaction as the records.
+
+def test_sqlite_rollups_resume_after_a_restart(tmp_path):
+    first = [login(index) for index in range(20)]
+    storage = SQLiteStorage(str(tmp_path))
+    write(storage, first)
+    storage.close()
+
+    second = [login(index, "2024-01-02") for index in range(7)]
+    restarted = SQLiteStorage(str(tmp_path))
+    assert_rollups(restarted, first)
+    write(restarted, second)
+    restarted.close()
+    assert_rollups(SQLiteStorage(str(tmp_path)), first + second)
+
+
+def test_sqlite_rollups_are_backfilled_once(tmp_path):
+    records = [login(index) for index in range(15)]
+    storage = SQLiteStorage(str(tmp_path))
+    write(storage, records)
+    storage.close()
+
+    # A database written before rollups existed has records and no rollups.
+    with sqlite3.connect(storage.path) as connection:
+        connection.execute("DELETE FROM rollups")
+    connection.close()
+    assert_rollups(SQLiteStorage(str(tmp_path)), records)
+    assert_rollups(SQLiteStorage(str(tmp_path)), records)
+
+
+# AggregateCache: groupings without rollups are folded in from the last storage position.
+
+@pytest.mark.parametrize("backend", ["journal", "sqlite"])
+def test_aggregate_cache_folds_in_new_records_once(tmp_path, backend):
+    storage = create_storage(backend, str(tmp_path))
+    cache = AggregateCache(storage)
+    records = [login(index) for index in range(10)]
+    write(storage, records)
+    assert cache.daily_counts("login", "password") == Counter({(day, key): count for day, key, count in count_daily(records, "password")})
+
+    more = [login(index) for index in range(10, 14)] + [login(index, "2024-01-02") for index in range(4)]
+    write(storage, more)
+    # Counted twice without a new write, the counts do not change.
+    cache.daily_counts("login", "password")
+    assert cache.daily_counts("login", "password") == Counter({(day, key): count for day, key, count in count_daily(records + more, "password")})
+    assert cache.daily_counts("login") == Counter({(day, key): count for day, key, count in expected(records + more)})
+    storage.close()
+
+
+def test_aggregate_cache_recounts_a_journal_partition_that_shrank(tmp_path):
+    storage = JournalStorage(str(tmp_path))
+    cache = AggregateCache(storage)
+    write(storage, [login(index) for index in range(10)] + [login(index, "2024-01-02") for index in range(2)])
+    cache.daily_counts("login", "password")
+
+    truncate_partition(storage, "2024-01-01", 3)
+    # The shrunken day is dropped and counted again, the other day is kept as it was.
+    remaining = [login(index) for index in range(3)] + [login(index, "2024-01-02") for index in range(2)]
+    assert cache.daily_counts("login", "password") == Counter({(day, key): count for day, key, count in count_daily(remaining, "password")})
+    storage.close()
@@ -0,0 +1,120 @@
+import socket
+import time
+import pytest
+from honeypot.tarpit import Tarpit
+
+ADDRESS = ("198.51.100.1", 40000)
+
+
+def wait_for(condition, timeout: float = 5.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return condition()
+
+
+def read_lines(client: socket.socket, count: int, timeout: float = 5.0) -> list:
+    client.settimeout(timeout)
+    data = b""
+    while data.count(b"\r\n") < count:
+        chunk = client.recv(4096)
+        if not chunk:
+            break
+        data += chunk
+    return data.split(b"\r\n")[:count]
+
+
+@pytest.fixture
+def tarpit():
+    tarpits = []
+
+    def create(**settings) -> Tarpit:
+        tarpit = Tarpit(**{"drip_interval": 0.05, **settings})
+        tarpit.start()
+        tarpits.append(tarpit)
+        return tarpit
+
+    yield create
+    for tarpit in tarpits:
+        tarpit.stop()
+
+
+def test_held_connection_gets_banner_lines(tarpit):
+    tarpit = tarpit(line_length=16)
+    server, client = socket.socketpair()
+    assert tarpit.hold(server, ADDRESS)
+    lines = read_lines(client, 3)
+
+    assert len(lines) == 3
+    for line in lines:
+        # Clients wait for a line starting with "SSH-", these never do.
+        assert len(line) == 16 and not line.startswith(b"SSH-")
+        int(line, 16)
+    assert wait_for(lambda: tarpit.stats()["bytes_dripped"] >= 3 * 18)
+    assert tarpit.stats()["held"] == 1 and tarpit.stats()["total_held"] == 1
+    client.close()
+
+
+def test_full_tarpit_rejects_and_leaves_the_socket_to_the_caller(tarpit):
+    tarpit = tarpit(max_connections=2)
+    pairs = [socket.socketpair() for _ in range(3)]
+    assert tarpit.hold(pairs[0][0], ADDRESS)
+    assert tarpit.hold(pairs[1][0], ADDRESS)
+    assert not tarpit.hold(pairs[2][0], ADDRESS)
+
+    assert wait_for(lambda: tarpit.held == 2)
+    assert tarpit.stats()["total_rejected"] == 1
+    # The rejected socket is still open, the caller decides what to do with it.
+    pairs[2][0].send(b"x")
+    assert pairs[2][1].recv(1) == b"x"
+    for pair in pairs:
+        for end in pair:
+            end.close()
+
+
+def test_stopped_tarpit_rejects():
+    tarpit = Tarpit()
+    server, client = socket.socketpair()
+    assert not tarpit.hold(server, ADDRESS)
+    server.close()
+    client.close()
+
+
+def test_client_hanging_up_is_released(tarpit):
+    tarpit = tarpit()
+    server, client = socket.socketpair()
+    tarpit.hold(server, ADDRESS)
+    assert wait_for(lambda: tarpit.held == 1)
+    client.close()
+    assert wait_for(lambda: tarpit.held == 0)
+    assert server.fileno() == -1
+
+
+def test_connections_are_released_after_max_hold(tarpit):
+    tarpit = tarpit(max_hold=0.2)
+    server, client = socket.socketpair()
+    tarpit.hold(server, ADDRESS)
+    assert wait_for(lambda: tarpit.held == 1)
+    assert wait_for(lambda: tarpit.held == 0)
+
+    # The client sees the connection closed after the lines it was sent.
+    client.settimeout(5)
+    while client.recv(4096):
+        pass
+    stats = tarpit.stats()
+    assert stats["total_held"] == 1
+    assert stats["longest_hold_seconds"] >= 0.2
+    client.close()
+
+
+def test_stop_closes_held_connections(tarpit):
+    held = tarpit()
+    server, client = socket.socketpair()
+    held.hold(server, ADDRESS)
+    assert wait_for(lambda: held.held == 1)
+    held.stop()
+    assert held.held == 0
+    assert server.fileno() == -1
+    client.close()